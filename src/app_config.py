@@ -4,18 +4,132 @@ naming convention is that of a .properties file
 """
 from pathlib import Path
 
-output_path = Path.cwd().joinpath("output\output_stream.txt")
+output_path = Path.cwd().joinpath("output", "output_stream.txt")
+
+# outputs are encoded on the event loop and written from a background thread to 'stdout' or to a 'file' at path,
+# as json lines in 'jsonl' or 'compact' (no spaces) format or as length prefixed 'binary' frames (see
+# src/io/output_codecs.py). Files are rotated once they reach rotate_size bytes or rotate_interval seconds, None
+# never rotates
+writer = {
+    "type": "stdout",
+    "format": "jsonl",
+    "path": output_path,
+    "rotate_size": 256 * 1024 * 1024,
+    "rotate_interval": 3600,
+    "flush_interval": 1
+}
+
+# with enabled the outputs are also published to local websocket clients on ws://host:port/ws, each client
+# subscribes to products and a depth and gets the latest book state conflated when it falls behind
+publisher = {
+    "enabled": False,
+    "host": "127.0.0.1",
+    "port": 8765,
+    "heartbeat": 30
+}
 
 num_output_levels = 25
 
+# 'l3' outputs every order in the top levels, 'l2' outputs [price, total_size, num_orders] per level,
+# 'l2_delta' outputs a full l2 frame then only the levels that changed
+output_mode = 'l3'
+
+# in 'l2_delta' mode a full frame is sent after this many delta frames, 0 only sends them on rebuild/request
+full_frame_interval = 100
+
+# per product output conflation, e.g. {"BTC-USD": {"min_interval": 0.05, "max_pending": 100}} publishes the
+# latest BTC-USD book at most every 50ms or once 100 updates are waiting. Pending updates are always flushed
+conflation = {}
+
 error_threshold = 10
 
+# above 1 a book takes up to this many already queued events at a time and decides on output once per batch
+# instead of once per event, batch sizes are logged when the book closes
+consume_batch_size = 1
+
+# above 0 a book holds up to max_size events that arrive ahead of its next sequence number and releases them in
+# order once the missing events arrive, a gap still open after max_wait seconds or max_size held events is
+# escalated to the book as a sequence jump. A max_wait of 0 only escalates on max_size
+reorder = {
+    "max_size": 0,
+    "max_wait": 0.2
+}
+
+# 'reload' replaces a book with the rebuilt snapshot, 'reconcile' only applies the orders that differ from it
+rebuild_mode = 'reload'
+
+# products listed here keep prices and sizes as integer ticks instead of strings, increments are named as in
+# the /products metadata e.g. {"BTC-USD": {"quote_increment": "0.01", "base_increment": "0.00000001"}}
+fixed_point_products = {}
+
+# bounds of the queue between the feed and each book (events) and between the books and the writer (outputs), a
+# max_size of 0 is unbounded. When full 'block' makes the producer wait, nothing is lost. 'drop_oldest' drops the
+# oldest output and has its book send a full frame next, 'rebuild' drops the queued events and rebuilds the book
+# from a snapshot, both lose data and are opt in e.g. {"max_size": 100000, "overflow_policy": "rebuild"}
+pipelines = {
+    "events": {"max_size": 0, "overflow_policy": "block"},
+    "outputs": {"max_size": 0, "overflow_policy": "block"}
+}
+
+# with enabled the feed and dispatcher stamp every event so the latency of each stage, receive, dispatch, queue,
+# process, output and write, is recorded per product in HDR style histograms. They are logged every dump_interval
+# seconds (0 only on demand) and on kill -USR1 <pid>, each shard process logs its own books
+latency = {
+    "enabled": False,
+    "dump_interval": 60
+}
+
+# with enabled the books, pipelines, snapshot scheduler and latencies are served as prometheus metrics on
+# http://host:port/metrics. With sharding only the output pipeline and this process's latencies are served
+metrics = {
+    "enabled": False,
+    "host": "127.0.0.1",
+    "port": 9108
+}
+
+# with more than 1 shard the books run in this many worker processes and the feed is routed to them in batches
+# of up to shard_batch_size events, 0 or 1 runs every book on the main event loop
+num_shards = 0
+shard_batch_size = 100
+
+# with enabled every raw feed message is appended to length prefixed segment files in directory, a new segment
+# is started every segment_size bytes and its index keeps the offset of every index_interval'th message per product
+journal = {
+    "enabled": False,
+    "directory": "journal",
+    "segment_size": 64 * 1024 * 1024,
+    "index_interval": 1000
+}
+
+# with enabled every book is saved to <directory>/<product_id>.json every interval seconds and on shutdown, on start
+# a book is loaded from its checkpoint (plus the journal after it if the journal is enabled) and only downloads a
+# snapshot if the first feed event is not the next sequence
+checkpoint = {
+    "enabled": False,
+    "directory": "checkpoints",
+    "interval": 60
+}
+
+# stream_snapshots parses snapshot bodies as they download straight into the book loader instead of buffering
+# the body and building json lists first
 http = {
     "attempts": 5,
     "timeout": 30,
+    "stream_snapshots": True,
     "snapshot_endpoint": "https://api.gdax.com/products/{}/book?level=3"
 }
 
+# every book's snapshot requests go through one scheduler: at most max_concurrent in flight, rate requests per
+# second with bursts of burst, failed attempts retried up to http attempts with jittered backoff growing from
+# backoff_base up to backoff_max seconds. With sharding each worker process has its own scheduler
+snapshot_scheduler = {
+    "max_concurrent": 2,
+    "rate": 2,
+    "burst": 3,
+    "backoff_base": 0.5,
+    "backoff_max": 30
+}
+
 ws = {
     "attempts": 1,
     "endpoint": "wss://ws-feed.gdax.com"
@@ -10,6 +10,10 @@ class EventKeys:
     MAKER_ID = "maker_order_id"
     TAKE_ID = "taker_order_id"
     PRODUCT_ID = "product_id"
+    TIME = "time"
+    # perf_counter_ns stamps added when latencies are tracked
+    RECEIVED_AT = "received_ns"
+    DISPATCHED_AT = "dispatched_ns"
 
 
 class EventOrderTypes:
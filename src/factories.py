@@ -0,0 +1,78 @@
+"""
+Builds the books, pipelines and snapshot clients of the app from app_config, shared by the single loop app,
+the shard workers and the replay tool
+"""
+import asyncio
+import signal
+
+from src import app_config
+from src.event.metadata import EventKeys
+from src.io.io_interfaces import Pipeline, SnapshotHttpClient
+from src.io.snapshot_scheduler import SnapshotScheduler
+from src.metrics import LatencyTracker, dump_latencies, log_latencies
+from src.orderbook.checkpoint import BookCheckpointer
+from src.orderbook.orderbook import Orderbook
+from src.orderbook.price_formats import get_price_format
+
+
+def create_orderbook(product, event_reader, l2_writer, http_client, checkpointer=None, latency_tracker=None):
+    conflation = app_config.conflation.get(product, {})
+    return Orderbook(event_reader, l2_writer, http_client, product,
+                     app_config.num_output_levels, app_config.error_threshold,
+                     get_price_format(product, app_config.fixed_point_products),
+                     app_config.output_mode, app_config.full_frame_interval,
+                     conflation.get('min_interval'), conflation.get('max_pending'),
+                     app_config.rebuild_mode, checkpointer, app_config.consume_batch_size,
+                     latency_tracker.for_product(product) if latency_tracker is not None else None,
+                     app_config.reorder.get('max_size'), app_config.reorder.get('max_wait'))
+
+
+def create_pipeline(pipeline_config, on_drop=None, overflow_policy=None):
+    return Pipeline(asyncio.Queue(pipeline_config.get('max_size') or 0),
+                    overflow_policy or pipeline_config.get('overflow_policy'), on_drop)
+
+
+def request_full_frame(orderbooks, output):
+    # after a dropped output the writer is behind, the book's next frame has to be a full one
+    orderbook = orderbooks.get(output.get(EventKeys.PRODUCT_ID)) if isinstance(output, dict) else None
+    if orderbook is not None:
+        orderbook.request_full_frame()
+
+
+def create_snapshot_client(session):
+    scheduler_config = app_config.snapshot_scheduler
+    return SnapshotScheduler(SnapshotHttpClient(session), scheduler_config.get('max_concurrent'),
+                             scheduler_config.get('rate'), scheduler_config.get('burst'),
+                             app_config.http.get('attempts'), scheduler_config.get('backoff_base'),
+                             scheduler_config.get('backoff_max'))
+
+
+def create_latency_tracker():
+    return LatencyTracker() if app_config.latency.get('enabled') else None
+
+
+def start_latency_dumps(latency_tracker):
+    # latencies are logged every dump_interval seconds and on demand with kill -USR1 <pid>
+    if latency_tracker is None:
+        return None
+    asyncio.get_event_loop().add_signal_handler(signal.SIGUSR1, dump_latencies, latency_tracker)
+    if not app_config.latency.get('dump_interval'):
+        return None
+    return asyncio.ensure_future(log_latencies(latency_tracker, app_config.latency.get('dump_interval')))
+
+
+def stop_latency_dumps(latency_tracker, dump_task):
+    if latency_tracker is None:
+        return
+    asyncio.get_event_loop().remove_signal_handler(signal.SIGUSR1)
+    if dump_task is not None:
+        dump_task.cancel()
+    dump_latencies(latency_tracker)
+
+
+def get_checkpointer(product):
+    if not app_config.checkpoint.get('enabled'):
+        return None
+    journal_directory = app_config.journal.get('directory') if app_config.journal.get('enabled') else None
+    return BookCheckpointer(product, app_config.checkpoint.get('directory'), app_config.checkpoint.get('interval'),
+                            journal_directory)
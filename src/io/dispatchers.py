@@ -1,20 +1,29 @@
 import logging
+import time
 
 from src.event.metadata import EventKeys
 from src.io.io_interfaces import Pipeline
+from src.metrics import Stages
 
 
 class EventDispatcher:
-    def __init__(self, pipelines):
+    def __init__(self, pipelines, latency_tracker=None):
         self.pipelines = pipelines or {}
+        self.latency_tracker = latency_tracker
 
     async def dispatch(self, event):
         pipeline = self.pipelines.get(event.get(EventKeys.PRODUCT_ID))
         if pipeline is not None:
             if pipeline.state == Pipeline.states.NOT_STARTED:
                 pipeline.state = Pipeline.states.STARTED
-                await pipeline.pipe.put(Pipeline.states.STARTED)
+                await pipeline.put(Pipeline.states.STARTED)
             if pipeline.state is not Pipeline.states.STOP_SENDING:
-                await pipeline.pipe.put(event)
+                if self.latency_tracker is None:
+                    await pipeline.put(event)
+                    return
+                dispatched_at = event[EventKeys.DISPATCHED_AT] = time.perf_counter_ns()
+                await pipeline.put(event)
+                self.latency_tracker.record(Stages.DISPATCH, event.get(EventKeys.PRODUCT_ID),
+                                            time.perf_counter_ns() - dispatched_at)
         else:
             logging.error("Pipe doesn't exist for {}".format(event))
\ No newline at end of file
@@ -1,6 +1,7 @@
 import concurrent
 import logging
 import json
+import time
 import aiohttp
 
 from enum import Enum, auto
@@ -8,12 +9,15 @@ from enum import Enum, auto
 from tenacity import retry, retry_if_exception_type, stop_after_attempt
 
 from src import app_config
-from src.exceptions import SnapshotHttpException, SocketException
+from src.event.metadata import EventKeys
+from src.exceptions import SnapshotException, SnapshotHttpException, SocketException
+from src.io.snapshot_stream import STREAM_CHUNK_SIZE, load_snapshot_stream
+from src.metrics import Stages
 
 
 # @retry(retry=retry_if_exception_type(SocketException),
 #        stop=stop_after_attempt(LocalConfig.ws.get('attempts')))
-async def get_full_feed(session, dispatcher, sub_msg):
+async def get_full_feed(session, dispatcher, sub_msg, recorder=None, latency_tracker=None):
     if not dispatcher or not sub_msg or not session:
         raise ValueError('full feed requires params (session, output_pipes and sub_msg')
     async with session.ws_connect(app_config.ws.get('endpoint')) as ws:
@@ -24,7 +28,15 @@ async def get_full_feed(session, dispatcher, sub_msg):
             raise SocketException('error get subscriptions {}'.format(sub_confirmation))
         if sub_confirmation.get('type') == 'subscriptions' and sub_msg['channels'] == sub_confirmation['channels']:
             async for feed in ws:
-                await dispatcher.dispatch(json.loads(feed.data))
+                received_at = time.perf_counter_ns() if latency_tracker is not None else None
+                event = json.loads(feed.data)
+                if recorder is not None:
+                    recorder.record(feed.data, event.get(EventKeys.PRODUCT_ID), event.get(EventKeys.SEQ))
+                if received_at is not None and event.get(EventKeys.PRODUCT_ID) is not None:
+                    event[EventKeys.RECEIVED_AT] = received_at
+                    latency_tracker.record(Stages.RECEIVE, event.get(EventKeys.PRODUCT_ID),
+                                           time.perf_counter_ns() - received_at)
+                await dispatcher.dispatch(event)
         else:
             raise SocketException('Unable to subscribe to full channels')
 
@@ -35,39 +47,126 @@ class SnapshotHttpClient:
 
     @retry(retry=retry_if_exception_type(SnapshotHttpException),
            stop=stop_after_attempt(app_config.http.get('attempts')))
-    async def get_orderbook_snapshot(self, product_id, http_timeout):
+    async def get_orderbook_snapshot(self, product_id, http_timeout, price_format=None):
+        return await self.fetch_orderbook_snapshot(product_id, http_timeout, price_format)
+
+    async def fetch_orderbook_snapshot(self, product_id, http_timeout, price_format=None):
+        # a single attempt, callers that schedule their own retries use this. Given the book's price format the
+        # body is parsed while it downloads straight into a SnapshotLoader instead of into json lists
         url = app_config.http.get('snapshot_endpoint').format(product_id)
         try:
             async with self.session.get(url, timeout=http_timeout) as resp:
                 assert resp.status == 200
-                return await resp.json()
-        except (concurrent.futures.TimeoutError, aiohttp.ClientError, AssertionError) as e:
+                if price_format is None or not app_config.http.get('stream_snapshots'):
+                    return await resp.json()
+                return await load_snapshot_stream(resp.content.iter_chunked(STREAM_CHUNK_SIZE), price_format)
+        except (concurrent.futures.TimeoutError, aiohttp.ClientError, AssertionError, ValueError) as e:
             raise SnapshotHttpException(e)
 
 
+class StaticSnapshotClient:
+    """
+    Serves snapshots that are already in memory, for books driven from recorded data instead of the live api
+    """
+    def __init__(self, snapshots):
+        self.snapshots = snapshots or {}
+
+    async def get_orderbook_snapshot(self, product_id, http_timeout, price_format=None):
+        book_snapshot = self.snapshots.get(product_id)
+        if book_snapshot is None:
+            raise SnapshotException('no snapshot for product {}'.format(product_id))
+        return book_snapshot
+
+
+class OverflowPolicies:
+    BLOCK = 'block'
+    DROP_OLDEST = 'drop_oldest'
+    REBUILD = 'rebuild'
+
+
 class Pipeline:
+    """
+    A queue between a producer and a consumer. Producers put through put() so a bounded queue's overflow policy
+    applies: block waits for room, drop_oldest drops the oldest item and tells on_drop about it, rebuild drops
+    every queued event and queues OVERFLOWED so the consuming book rebuilds from a snapshot. States are never
+    dropped. Depth, high water mark and drops are kept for monitoring
+    """
     class states(Enum):
         NOT_STARTED = auto()
         STARTED = auto()
         STOP_SENDING = auto()
         CLOSING_PIPE = auto()
+        OVERFLOWED = auto()
 
-    def __init__(self, pipe):
+    def __init__(self, pipe, overflow_policy=None, on_drop=None):
         self.pipe = pipe
         self.state = self.states.NOT_STARTED
+        self.overflow_policy = overflow_policy or OverflowPolicies.BLOCK
+        self.on_drop = on_drop
+        self.high_water_mark = 0
+        self.dropped = 0
+        self.overflows = 0
+        self.is_overflowing = False
+
+    @property
+    def depth(self):
+        return self.pipe.qsize()
+
+    async def put(self, item):
+        pipe = self.pipe
+        if pipe.full():
+            if not self.is_overflowing:
+                self.is_overflowing = True
+                self.overflows += 1
+                logging.warning('Pipeline full at {} items, {} policy'.format(pipe.qsize(), self.overflow_policy))
+            if not isinstance(item, Pipeline.states):
+                if self.overflow_policy == OverflowPolicies.DROP_OLDEST:
+                    self.drop_oldest()
+                elif self.overflow_policy == OverflowPolicies.REBUILD:
+                    self.drop_events()
+        elif self.is_overflowing:
+            self.is_overflowing = False
+        await pipe.put(item)
+        depth = pipe.qsize()
+        if depth > self.high_water_mark:
+            self.high_water_mark = depth
+
+    def drop_oldest(self):
+        oldest = self.pipe.get_nowait()
+        if isinstance(oldest, Pipeline.states):
+            # only happens if a state is at the front of a full pipe, keep it and drop the next item instead
+            items = [oldest]
+            while not self.pipe.empty():
+                items.append(self.pipe.get_nowait())
+            index = next((index for index, item in enumerate(items) if not isinstance(item, Pipeline.states)),
+                         None)
+            oldest = None if index is None else items.pop(index)
+            for item in items:
+                self.pipe.put_nowait(item)
+            if oldest is None:
+                return
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop(oldest)
 
+    def drop_events(self):
+        kept = []
+        while not self.pipe.empty():
+            item = self.pipe.get_nowait()
+            if isinstance(item, Pipeline.states):
+                if item != Pipeline.states.OVERFLOWED:
+                    kept.append(item)
+            else:
+                self.dropped += 1
+        for item in kept:
+            self.pipe.put_nowait(item)
+        self.pipe.put_nowait(Pipeline.states.OVERFLOWED)
 
-async def write_to_stdout(pipeline):
-    while True:
-        output = await pipeline.pipe.get()
-        print(output)
-
-# async def write_to_file(pipeline, file_path):
-#     while True:
-#         try:
-#             async with aiofiles.open(file_path, 'w') as output_file:
-#                 output = await pipeline.pipe.get()
-#                 await output_file.write(output)
-#                 await output_file.flush()
-#         except Exception as e:
-#             logging.error(e)
+    def metrics(self):
+        return {
+            "depth": self.depth,
+            "max_size": self.pipe.maxsize,
+            "high_water_mark": self.high_water_mark,
+            "dropped": self.dropped,
+            "overflows": self.overflows
+        }
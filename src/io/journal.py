@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+from pathlib import Path
+
+# record length, receive time in ns, sequence (-1 when the message has none), product id length
+RECORD_HEADER = struct.Struct('>IqqH')
+SEGMENT_PREFIX = 'journal-'
+SEGMENT_SUFFIX = '.bin'
+INDEX_SUFFIX = '.idx'
+
+
+class JournalRecord:
+    __slots__ = ('receive_time', 'product_id', 'sequence', 'message')
+
+    def __init__(self, receive_time, product_id, sequence, message):
+        self.receive_time = receive_time
+        self.product_id = product_id
+        self.sequence = sequence
+        self.message = message
+
+
+class SegmentIndex:
+    """
+    First and last sequence of every product in a segment, with the offset of every index_interval'th record
+    of the product so a reader can seek close to a sequence instead of scanning the segment
+    """
+    def __init__(self, index_interval):
+        self.index_interval = index_interval
+        self.products = {}
+
+    def add(self, product_id, sequence, offset):
+        product_index = self.products.get(product_id)
+        if product_index is None:
+            product_index = self.products[product_id] = {"first_seq": sequence, "last_seq": sequence,
+                                                         "count": 0, "offsets": []}
+        if product_index["count"] % self.index_interval == 0:
+            product_index["offsets"].append([sequence, offset])
+        product_index["count"] += 1
+        product_index["last_seq"] = sequence
+
+    def to_dict(self):
+        return {"products": self.products}
+
+
+class JournalWriter:
+    """
+    Appends raw feed messages to rotating, length prefixed segment files. record() only puts the message on a
+    queue, a background thread writes whatever has queued up in one write per batch so the dispatch loop never
+    waits on the disk. A segment is rotated once it reaches segment_size bytes and its index is written next to it
+    """
+    def __init__(self, directory, segment_size=None, index_interval=None, flush_interval=None):
+        self.directory = Path(directory)
+        self.segment_size = segment_size or 64 * 1024 * 1024
+        self.index_interval = index_interval or 1000
+        self.flush_interval = flush_interval or 1
+        self.records = queue.SimpleQueue()
+        self.thread = None
+        self.segment_file = None
+        self.segment_path = None
+        self.segment_index = None
+        self.segment_offset = 0
+        self.num_records = 0
+        self.num_batches = 0
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.thread = threading.Thread(target=self.write_records, name='journal-writer', daemon=True)
+        self.thread.start()
+
+    def record(self, message, product_id, sequence, receive_time=None):
+        self.records.put((receive_time or time.time_ns(), product_id, sequence, message))
+
+    def close(self):
+        if self.thread is not None:
+            self.records.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def write_records(self):
+        is_closing = False
+        while not is_closing:
+            try:
+                batch = [self.records.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                if self.segment_file is not None:
+                    self.segment_file.flush()
+                continue
+            while True:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                is_closing = True
+                batch.pop()
+            try:
+                self.write_batch(batch)
+            except OSError as e:
+                logging.error('Unable to write {} feed messages to the journal, {}'.format(len(batch), e))
+        self.close_segment()
+
+    def write_batch(self, batch):
+        chunks = []
+        for receive_time, product_id, sequence, message in batch:
+            if self.segment_file is None or self.segment_offset >= self.segment_size:
+                self.write_chunks(chunks)
+                chunks = []
+                self.open_segment()
+            record = encode_record(receive_time, product_id, sequence, message)
+            if product_id is not None and sequence is not None:
+                self.segment_index.add(product_id, sequence, self.segment_offset)
+            chunks.append(record)
+            self.segment_offset += len(record)
+            self.num_records += 1
+        self.write_chunks(chunks)
+        self.num_batches += 1
+
+    def write_chunks(self, chunks):
+        if chunks:
+            self.segment_file.write(b''.join(chunks))
+
+    def open_segment(self):
+        self.close_segment()
+        # older segments may have been deleted, so the next number follows the newest segment left
+        segment_number = max((get_segment_number(segment_path) for segment_path in list_segments(self.directory)),
+                             default=-1) + 1
+        self.segment_path = self.directory.joinpath('{}{:06d}{}'.format(SEGMENT_PREFIX, segment_number,
+                                                                       SEGMENT_SUFFIX))
+        self.segment_file = open(self.segment_path, 'ab')
+        self.segment_offset = self.segment_file.tell()
+        self.segment_index = SegmentIndex(self.index_interval)
+
+    def close_segment(self):
+        if self.segment_file is None:
+            return
+        self.segment_file.close()
+        index_path = self.segment_path.with_suffix(INDEX_SUFFIX)
+        with open(index_path.with_suffix('.tmp'), 'w') as index_file:
+            json.dump(self.segment_index.to_dict(), index_file)
+        os.replace(index_path.with_suffix('.tmp'), index_path)
+        self.segment_file = None
+
+
+class JournalReader:
+    """
+    Reads a journal directory back in the order it was written. Segments whose index shows no sequence in the
+    requested range are skipped and reading starts from the closest indexed offset of the product
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def records(self, product_id=None, start_seq=None, end_seq=None):
+        for segment_path in list_segments(self.directory):
+            segment_index = read_index(segment_path)
+            offset = 0
+            if segment_index is not None and product_id is not None:
+                product_index = segment_index.get("products", {}).get(product_id)
+                if product_index is None or (start_seq is not None and product_index["last_seq"] < start_seq) or \
+                        (end_seq is not None and product_index["first_seq"] > end_seq):
+                    continue
+                if start_seq is not None:
+                    offset = max([indexed_offset for indexed_seq, indexed_offset in product_index["offsets"]
+                                  if indexed_seq <= start_seq] or [0])
+            for record in read_segment(segment_path, offset):
+                if product_id is not None and record.product_id != product_id:
+                    continue
+                if record.sequence is not None:
+                    if start_seq is not None and record.sequence < start_seq:
+                        continue
+                    if end_seq is not None and record.sequence > end_seq:
+                        if product_id is not None:
+                            return
+                        continue
+                yield record
+
+    def events(self, product_id=None, start_seq=None, end_seq=None):
+        for record in self.records(product_id, start_seq, end_seq):
+            yield json.loads(record.message)
+
+
+def encode_record(receive_time, product_id, sequence, message):
+    if isinstance(message, str):
+        message = message.encode('utf-8')
+    product = (product_id or '').encode('utf-8')
+    return RECORD_HEADER.pack(RECORD_HEADER.size - 4 + len(product) + len(message), receive_time,
+                              -1 if sequence is None else sequence, len(product)) + product + message
+
+
+def read_segment(segment_path, offset=0):
+    with open(segment_path, 'rb') as segment_file:
+        segment_file.seek(offset)
+        while True:
+            header = segment_file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            record_length, receive_time, sequence, product_length = RECORD_HEADER.unpack(header)
+            body = segment_file.read(record_length - RECORD_HEADER.size + 4)
+            if len(body) < record_length - RECORD_HEADER.size + 4:
+                logging.warning('{} ends with a partly written record'.format(segment_path))
+                return
+            yield JournalRecord(receive_time, body[:product_length].decode('utf-8') or None,
+                                None if sequence < 0 else sequence, body[product_length:].decode('utf-8'))
+
+
+def read_index(segment_path):
+    try:
+        with open(segment_path.with_suffix(INDEX_SUFFIX), 'r') as index_file:
+            return json.load(index_file)
+    except (OSError, ValueError):
+        return None
+
+
+def list_segments(directory):
+    return sorted(Path(directory).glob('{}*{}'.format(SEGMENT_PREFIX, SEGMENT_SUFFIX)))
+
+
+def get_segment_number(segment_path):
+    try:
+        return int(segment_path.stem[len(SEGMENT_PREFIX):])
+    except ValueError:
+        return -1
@@ -0,0 +1,220 @@
+import logging
+
+from aiohttp import web
+
+from src.metrics import Stages
+
+
+class MetricTypes:
+    COUNTER = 'counter'
+    GAUGE = 'gauge'
+    SUMMARY = 'summary'
+    HISTOGRAM = 'histogram'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                           .replace('\n', '\\n'))
+                          for name, value in labels.items()) + '}'
+
+
+class MetricFamilies:
+    """
+    Collects samples by metric name and renders them in the prometheus text exposition format
+    """
+    def __init__(self):
+        self.families = {}
+
+    def add(self, name, metric_type, help_text, value, labels=None):
+        if value is None:
+            return
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = (metric_type, help_text, [])
+        family[2].append((name, labels, value))
+
+    def add_summary(self, name, help_text, histogram, labels=None, scale=1e-9):
+        # latency histograms are in nanoseconds, the summary is in seconds
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = (MetricTypes.SUMMARY, help_text, [])
+        labels = labels or {}
+        for quantile in [0.5, 0.9, 0.99, 0.999]:
+            family[2].append((name, dict(labels, quantile=quantile), histogram.percentile(quantile) * scale))
+        family[2].append((name + '_sum', labels, histogram.total * scale))
+        family[2].append((name + '_count', labels, histogram.count))
+
+    def add_histogram(self, name, help_text, histogram, labels=None):
+        # the power of two buckets of a Histogram, every bound up to the highest one recorded so the set of
+        # buckets only grows between scrapes
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = (MetricTypes.HISTOGRAM, help_text, [])
+        labels = labels or {}
+        buckets = histogram.buckets.copy()
+        max_bound = max(buckets, default=0)
+        bound = 1
+        count = 0
+        while bound <= max_bound:
+            count += buckets.get(bound, 0)
+            family[2].append((name + '_bucket', dict(labels, le=bound), count))
+            bound <<= 1
+        family[2].append((name + '_bucket', dict(labels, le='+Inf'), histogram.count))
+        family[2].append((name + '_sum', labels, histogram.total))
+        family[2].append((name + '_count', labels, histogram.count))
+
+    def to_text(self):
+        lines = []
+        for name, (metric_type, help_text, samples) in self.families.items():
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, metric_type))
+            lines.extend('{}{} {}'.format(sample_name, format_labels(labels), value)
+                         for sample_name, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """
+    Serves the state of the running books as prometheus metrics on http://<host>:<port>/metrics. Everything is
+    read from the books, pipelines, output writer, snapshot scheduler and latency tracker when scraped, nothing is
+    kept here.
+    Rates such as events/sec are the rate() of the _total counters
+    """
+    def __init__(self, host, port, orderbooks=None, event_readers=None, output_pipeline=None, snapshot_client=None,
+                 latency_tracker=None, output_writer=None):
+        self.host = host
+        self.port = port
+        self.orderbooks = orderbooks or {}
+        self.event_readers = event_readers or {}
+        self.output_pipeline = output_pipeline
+        self.snapshot_client = snapshot_client
+        self.latency_tracker = latency_tracker
+        self.output_writer = output_writer
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        logging.info('Serving metrics on http://{}:{}/metrics'.format(self.host, self.port))
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def handle_metrics(self, request):
+        # the exposition format version goes in the content type, which web.Response only takes as a header
+        return web.Response(text=self.collect().to_text(),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    def collect(self):
+        metrics = MetricFamilies()
+        for product_id, orderbook in self.orderbooks.items():
+            self.collect_orderbook(metrics, product_id, orderbook)
+        for product_id, pipeline in self.event_readers.items():
+            self.collect_pipeline(metrics, pipeline, {"pipeline": "events", "product_id": product_id})
+        if self.output_pipeline is not None:
+            self.collect_pipeline(metrics, self.output_pipeline, {"pipeline": "outputs"})
+        if self.output_writer is not None:
+            self.collect_writer(metrics, self.output_writer)
+        if getattr(self.snapshot_client, 'metrics', None) is not None:
+            self.collect_snapshots(metrics, self.snapshot_client)
+        if self.latency_tracker is not None:
+            self.collect_latencies(metrics, self.latency_tracker)
+        return metrics
+
+    @staticmethod
+    def collect_orderbook(metrics, product_id, orderbook):
+        labels = {"product_id": product_id}
+        metrics.add('orderbook_events_total', MetricTypes.COUNTER, 'Events taken off the book\'s pipeline',
+                    orderbook.num_events, labels)
+        metrics.add('orderbook_outputs_total', MetricTypes.COUNTER, 'Outputs published by the book',
+                    orderbook.num_outputs, labels)
+        metrics.add('orderbook_conflated_updates_total', MetricTypes.COUNTER,
+                    'Updates collapsed into a later output by conflation', orderbook.conflater.conflated_count, labels)
+        metrics.add('orderbook_last_sequence', MetricTypes.GAUGE, 'Sequence number of the last event applied',
+                    orderbook.curr_seq_num, labels)
+        metrics.add('orderbook_sequence_gaps_total', MetricTypes.COUNTER, 'Jumps in the feed\'s sequence numbers',
+                    orderbook.sequence_gaps, labels)
+        metrics.add('orderbook_errors', MetricTypes.GAUGE,
+                    'Errors since the last rebuild, a rebuild starts above the error threshold',
+                    orderbook.error_count, labels)
+        metrics.add('orderbook_rebuilds_total', MetricTypes.COUNTER, 'Completed rebuilds from a snapshot',
+                    orderbook.rebuild_count, labels)
+        metrics.add('orderbook_rebuilding', MetricTypes.GAUGE, '1 while a rebuild snapshot is being fetched',
+                    int(orderbook.rebuild_task is not None), labels)
+        metrics.add('orderbook_rebuild_seconds_total', MetricTypes.COUNTER, 'Time spent rebuilding',
+                    orderbook.rebuild_secs, labels)
+        metrics.add('orderbook_last_rebuild_seconds', MetricTypes.GAUGE, 'Duration of the last rebuild',
+                    orderbook.last_rebuild_secs, labels)
+        if orderbook.batch_sizes.count:
+            metrics.add_histogram('orderbook_batch_size', 'Events taken off the book\'s pipeline per batch',
+                                  orderbook.batch_sizes, labels)
+        reorder_buffer = orderbook.reorder_buffer
+        if reorder_buffer is not None:
+            metrics.add('orderbook_reorder_gaps_healed_total', MetricTypes.COUNTER,
+                        'Sequence gaps closed by late events within the reorder window', reorder_buffer.healed_gaps,
+                        labels)
+            metrics.add('orderbook_reorder_gaps_escalated_total', MetricTypes.COUNTER,
+                        'Sequence gaps that outlasted the reorder window', reorder_buffer.escalated_gaps, labels)
+            metrics.add('orderbook_reorder_held', MetricTypes.GAUGE, 'Events held waiting on a sequence gap',
+                        len(reorder_buffer.held), labels)
+
+    @staticmethod
+    def collect_pipeline(metrics, pipeline, labels):
+        pipeline_metrics = pipeline.metrics()
+        metrics.add('orderbook_pipeline_depth', MetricTypes.GAUGE, 'Items queued on the pipeline',
+                    pipeline_metrics["depth"], labels)
+        metrics.add('orderbook_pipeline_max_size', MetricTypes.GAUGE, 'Bound of the pipeline, 0 is unbounded',
+                    pipeline_metrics["max_size"], labels)
+        metrics.add('orderbook_pipeline_high_water_mark', MetricTypes.GAUGE, 'Highest depth the pipeline reached',
+                    pipeline_metrics["high_water_mark"], labels)
+        metrics.add('orderbook_pipeline_dropped_total', MetricTypes.COUNTER, 'Items dropped by the overflow policy',
+                    pipeline_metrics["dropped"], labels)
+        metrics.add('orderbook_pipeline_overflows_total', MetricTypes.COUNTER, 'Times the pipeline was full',
+                    pipeline_metrics["overflows"], labels)
+
+    @staticmethod
+    def collect_writer(metrics, output_writer):
+        metrics.add('orderbook_writer_outputs_total', MetricTypes.COUNTER, 'Outputs written by the output writer',
+                    output_writer.num_outputs)
+        metrics.add('orderbook_writer_bytes_total', MetricTypes.COUNTER, 'Bytes written by the output writer',
+                    output_writer.num_bytes)
+        metrics.add('orderbook_writer_dropped_total', MetricTypes.COUNTER, 'Outputs dropped on write errors',
+                    output_writer.num_dropped)
+
+    @staticmethod
+    def collect_snapshots(metrics, snapshot_client):
+        snapshot_metrics = snapshot_client.metrics
+        for name, help_text, value in [
+            ('requests', 'Snapshot requests from books', snapshot_metrics.requests),
+            ('attempts', 'Snapshot http requests sent', snapshot_metrics.attempts),
+            ('retries', 'Snapshot attempts retried', snapshot_metrics.retries),
+            ('failures', 'Snapshot requests that ran out of attempts', snapshot_metrics.failures),
+            ('rate_limited_seconds', 'Time snapshot requests waited on the rate limit',
+             snapshot_metrics.rate_limited_secs)
+        ]:
+            metrics.add('orderbook_snapshot_{}_total'.format(name), MetricTypes.COUNTER, help_text, value)
+        metrics.add('orderbook_snapshot_in_flight', MetricTypes.GAUGE, 'Snapshot http requests in flight',
+                    snapshot_metrics.in_flight)
+        if getattr(snapshot_client, 'fetch_latencies', None) is not None:
+            metrics.add_summary('orderbook_snapshot_fetch_seconds', 'Duration of snapshot http requests',
+                                snapshot_client.fetch_latencies)
+
+    @staticmethod
+    def collect_latencies(metrics, latency_tracker):
+        for product_id, latencies in list(latency_tracker.products.items()):
+            for stage, histogram in latencies.histograms.items():
+                if histogram.count:
+                    metrics.add_summary('orderbook_stage_latency_seconds', 'Time events spend in each stage',
+                                        histogram, {"product_id": product_id, "stage": stage})
+        if latency_tracker.write.count:
+            metrics.add_summary('orderbook_stage_latency_seconds', 'Time events spend in each stage',
+                                latency_tracker.write, {"stage": Stages.WRITE})
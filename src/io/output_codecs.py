@@ -0,0 +1,260 @@
+import json
+import struct
+import uuid
+from functools import lru_cache
+
+from src.orderbook.metadata import FrameTypes, OrderSides
+from src.orderbook.price_formats import from_fixed_point
+
+
+class OutputFormats:
+    JSONL = 'jsonl'
+    COMPACT = 'compact'
+    BINARY = 'binary'
+
+
+class JsonCodec:
+    """
+    One json document per line, compact drops the spaces after separators
+    """
+    def __init__(self, is_compact=False):
+        self.separators = (',', ':') if is_compact else None
+
+    def encode(self, output):
+        return (json.dumps(output, separators=self.separators) + '\n').encode('utf-8')
+
+    def header(self):
+        return b''
+
+
+class RecordTypes:
+    PRODUCT = 1
+    L3 = 2
+    L2 = 3
+    FULL = 4
+    DELTA = 5
+
+
+frame_header = struct.Struct('<I')
+record_header = struct.Struct('<BH')
+book_header = struct.Struct('<QII')
+frame_book_header = struct.Struct('<QQII')
+delta_header = struct.Struct('<QQI')
+order_record = struct.Struct('<qBqB16s')
+level_record = struct.Struct('<qBqBI')
+change_record = struct.Struct('<BqBqBI')
+
+side_ids = {OrderSides.BID: 0, OrderSides.ASK: 1}
+sides_by_id = [OrderSides.BID, OrderSides.ASK]
+
+
+def to_mantissa(value):
+    # the decimal string is kept exactly as an integer and its number of decimal places, '6500.10' is (650010, 2)
+    whole, _, fraction = value.partition('.')
+    return int(whole + fraction), len(fraction)
+
+
+# top of book prices and sizes repeat from one output to the next
+cached_mantissa = lru_cache(maxsize=65536)(to_mantissa)
+
+
+@lru_cache(maxsize=65536)
+def to_uuid_bytes(order_id):
+    uuid_bytes = bytes.fromhex(order_id.replace('-', ''))
+    if len(uuid_bytes) != 16:
+        raise ValueError('order id {} is not a uuid'.format(order_id))
+    return uuid_bytes
+
+
+cached_decimal = lru_cache(maxsize=65536)(from_fixed_point)
+
+
+@lru_cache(maxsize=65536)
+def from_uuid_bytes(uuid_bytes):
+    return str(uuid.UUID(bytes=uuid_bytes))
+
+
+@lru_cache(maxsize=1024)
+def records_struct(record_struct, num_records):
+    # all of an output's records are packed in one call
+    return struct.Struct('<' + record_struct.format.lstrip('<') * num_records)
+
+
+class BinaryCodec:
+    """
+    Every output is a frame: a little endian uint32 length then a record of fixed width fields. A record starts
+    with its type and a uint16 product index, the first record for a product is a PRODUCT record naming it.
+    Prices and sizes are int64 mantissas with a uint8 count of decimal places, order ids are their 16 uuid bytes.
+      L3     sequence uint64, num bids uint32, num asks uint32, then orders (price, size, order id)
+      L2     sequence uint64, num bids uint32, num asks uint32, then levels (price, size, num orders uint32)
+      FULL   as L2 with frame_seq uint64 after sequence
+      DELTA  sequence uint64, frame_seq uint64, num changes uint32, then (side uint8, price, size, num orders)
+    """
+    def __init__(self):
+        self.product_ids = {}
+
+    def encode(self, output):
+        chunks = []
+        product_index = self.product_ids.get(output.get("product_id"))
+        if product_index is None:
+            product_index = len(self.product_ids)
+            chunks.append(self.encode_product(output.get("product_id"), product_index))
+        frame_type = output.get("type")
+        if frame_type == FrameTypes.DELTA:
+            chunks.append(self.encode_delta(output, product_index))
+        elif frame_type == FrameTypes.FULL:
+            chunks.append(self.encode_levels(output, product_index, RecordTypes.FULL))
+        elif self.is_l3(output):
+            chunks.append(self.encode_l3(output, product_index))
+        else:
+            chunks.append(self.encode_levels(output, product_index, RecordTypes.L2))
+        # the product is only taken as sent once the whole output encoded
+        self.product_ids[output.get("product_id")] = product_index
+        return b''.join(chunks)
+
+    def header(self):
+        # the product records a new file has to start with to be decoded on its own
+        # called from the writer thread while the loop may be adding products, so iterated over a copy
+        return b''.join(self.encode_product(product_id, product_index)
+                        for product_id, product_index in list(self.product_ids.items()))
+
+    @staticmethod
+    def is_l3(output):
+        for side in [OrderSides.BID, OrderSides.ASK]:
+            if output.get(side):
+                return isinstance(output.get(side)[0][2], str)
+        return False
+
+    @staticmethod
+    def frame(record):
+        return frame_header.pack(len(record)) + record
+
+    def encode_product(self, product_id, product_index):
+        return self.frame(record_header.pack(RecordTypes.PRODUCT, product_index) + product_id.encode('utf-8'))
+
+    def encode_l3(self, output, product_index):
+        bids, asks = output.get(OrderSides.BID), output.get(OrderSides.ASK)
+        values = []
+        for price, size, order_id in bids + asks:
+            values.extend(cached_mantissa(price))
+            values.extend(cached_mantissa(size))
+            values.append(to_uuid_bytes(order_id))
+        return self.frame(record_header.pack(RecordTypes.L3, product_index) +
+                          book_header.pack(output.get("sequence"), len(bids), len(asks)) +
+                          records_struct(order_record, len(bids) + len(asks)).pack(*values))
+
+    def encode_levels(self, output, product_index, record_type):
+        bids, asks = output.get(OrderSides.BID), output.get(OrderSides.ASK)
+        if record_type == RecordTypes.FULL:
+            header = frame_book_header.pack(output.get("sequence"), output.get("frame_seq"), len(bids), len(asks))
+        else:
+            header = book_header.pack(output.get("sequence"), len(bids), len(asks))
+        values = []
+        for price, size, num_orders in bids + asks:
+            values.extend(cached_mantissa(price))
+            values.extend(cached_mantissa(size))
+            values.append(num_orders)
+        return self.frame(record_header.pack(record_type, product_index) + header +
+                          records_struct(level_record, len(bids) + len(asks)).pack(*values))
+
+    def encode_delta(self, output, product_index):
+        changes = output.get("changes")
+        values = []
+        for side, price, size, num_orders in changes:
+            values.append(side_ids[side])
+            values.extend(cached_mantissa(price))
+            values.extend(cached_mantissa(size))
+            values.append(num_orders)
+        return self.frame(record_header.pack(RecordTypes.DELTA, product_index) +
+                          delta_header.pack(output.get("sequence"), output.get("frame_seq"), len(changes)) +
+                          records_struct(change_record, len(changes)).pack(*values))
+
+
+class BinaryDecoder:
+    """
+    Turns a stream of BinaryCodec frames back into the outputs they were encoded from. feed() takes bytes as they
+    arrive, in any chunks, and returns the outputs completed by them
+    """
+    def __init__(self):
+        self.product_ids = {}
+        self.buffer = b''
+
+    def feed(self, data):
+        buffer = self.buffer + data
+        outputs = []
+        offset = 0
+        while len(buffer) - offset >= frame_header.size:
+            record_size, = frame_header.unpack_from(buffer, offset)
+            record_end = offset + frame_header.size + record_size
+            if record_end > len(buffer):
+                break
+            output = self.decode_record(buffer[offset + frame_header.size:record_end])
+            if output is not None:
+                outputs.append(output)
+            offset = record_end
+        self.buffer = buffer[offset:]
+        return outputs
+
+    def decode_record(self, record):
+        record_type, product_index = record_header.unpack_from(record)
+        offset = record_header.size
+        if record_type == RecordTypes.PRODUCT:
+            self.product_ids[product_index] = record[offset:].decode('utf-8')
+            return None
+        product_id = self.product_ids.get(product_index)
+        if product_id is None:
+            raise ValueError('record for product index {} before its product record'.format(product_index))
+        if record_type == RecordTypes.DELTA:
+            return self.decode_delta(record, offset, product_id)
+        if record_type == RecordTypes.FULL:
+            sequence, frame_seq, num_bids, num_asks = frame_book_header.unpack_from(record, offset)
+            offset += frame_book_header.size
+        elif record_type in (RecordTypes.L2, RecordTypes.L3):
+            sequence, num_bids, num_asks = book_header.unpack_from(record, offset)
+            offset += book_header.size
+        else:
+            raise ValueError('unknown record type {}'.format(record_type))
+        if record_type == RecordTypes.L3:
+            entries = [[cached_decimal(price, price_decimals), cached_decimal(size, size_decimals),
+                        from_uuid_bytes(order_id)]
+                       for price, price_decimals, size, size_decimals, order_id
+                       in order_record.iter_unpack(record[offset:])]
+        else:
+            entries = [[cached_decimal(price, price_decimals), cached_decimal(size, size_decimals), num_orders]
+                       for price, price_decimals, size, size_decimals, num_orders
+                       in level_record.iter_unpack(record[offset:])]
+        output = {"product_id": product_id, "sequence": sequence}
+        if record_type == RecordTypes.FULL:
+            output["type"] = FrameTypes.FULL
+            output["frame_seq"] = frame_seq
+        output[OrderSides.BID] = entries[:num_bids]
+        output[OrderSides.ASK] = entries[num_bids:num_bids + num_asks]
+        return output
+
+    @staticmethod
+    def decode_delta(record, offset, product_id):
+        sequence, frame_seq, _ = delta_header.unpack_from(record, offset)
+        changes = [[sides_by_id[side], cached_decimal(price, price_decimals),
+                    cached_decimal(size, size_decimals), num_orders]
+                   for side, price, price_decimals, size, size_decimals, num_orders
+                   in change_record.iter_unpack(record[offset + delta_header.size:])]
+        return {"type": FrameTypes.DELTA, "product_id": product_id, "sequence": sequence, "changes": changes,
+                "frame_seq": frame_seq}
+
+
+def decode_outputs(data):
+    return BinaryDecoder().feed(data)
+
+
+codecs = {
+    OutputFormats.JSONL: JsonCodec,
+    OutputFormats.COMPACT: lambda: JsonCodec(is_compact=True),
+    OutputFormats.BINARY: BinaryCodec
+}
+
+
+def create_codec(output_format):
+    codec = codecs.get(output_format or OutputFormats.JSONL)
+    if codec is None:
+        raise ValueError('unknown output format {}'.format(output_format))
+    return codec()
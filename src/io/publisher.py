@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+
+from aiohttp import WSMsgType, web
+
+from src.io.output_codecs import BinaryCodec
+from src.orderbook.metadata import FrameTypes, OrderSides
+
+
+class SubscriberFormats:
+    JSON = 'json'
+    BINARY = 'binary'
+
+
+def apply_changes(frame, changes):
+    # a full l2 frame with delta changes applied, levels with a size of 0 are removed
+    sides = {side: {level[0]: level for level in frame.get(side)} for side in [OrderSides.BID, OrderSides.ASK]}
+    for side, price, size, num_orders in changes:
+        if num_orders:
+            sides[side][price] = [price, size, num_orders]
+        else:
+            sides[side].pop(price, None)
+    return {
+        OrderSides.BID: sorted(sides[OrderSides.BID].values(), key=lambda level: float(level[0]), reverse=True),
+        OrderSides.ASK: sorted(sides[OrderSides.ASK].values(), key=lambda level: float(level[0]))
+    }
+
+
+def merge_output(pending, output):
+    """
+    Latest state conflation: the output that brings a subscriber from before pending to after output. Books and
+    full frames replace whatever is pending, a delta is merged into a pending delta or applied to a pending full
+    frame. A merged frame has the sequence and frame_seq of the last frame in it
+    """
+    if pending is None or output.get("type") != FrameTypes.DELTA:
+        return output
+    if pending.get("type") == FrameTypes.DELTA:
+        changes = {(change[0], change[1]): change for change in pending.get("changes")}
+        changes.update(((change[0], change[1]), change) for change in output.get("changes"))
+        merged = dict(output)
+        merged["changes"] = list(changes.values())
+        return merged
+    merged = dict(pending)
+    merged.update(apply_changes(pending, output.get("changes")))
+    merged["sequence"] = output.get("sequence")
+    merged["frame_seq"] = output.get("frame_seq")
+    return merged
+
+
+def trim_output(output, depth):
+    # books and full frames are cut to depth price levels, delta changes are sent as they are
+    if not depth or output.get("type") == FrameTypes.DELTA:
+        return output
+    trimmed = dict(output)
+    for side in [OrderSides.BID, OrderSides.ASK]:
+        entries = output.get(side)
+        if entries and isinstance(entries[0][2], str):
+            # l3 entries are orders, depth counts the prices they are at
+            num_levels = 0
+            for index, (price, _, _) in enumerate(entries):
+                if index == 0 or price != entries[index - 1][0]:
+                    num_levels += 1
+                    if num_levels > depth:
+                        entries = entries[:index]
+                        break
+            trimmed[side] = entries
+        else:
+            trimmed[side] = entries[:depth]
+    return trimmed
+
+
+class Subscriber:
+    """
+    One websocket client. Each subscribed product has at most one pending output, the latest book state, so a
+    client that can't keep up has its updates conflated instead of queued and never holds up the books or the
+    other clients. Its send task sends whatever is pending as fast as the socket takes it
+    """
+    def __init__(self, ws, subscriber_id):
+        self.ws = ws
+        self.subscriber_id = subscriber_id
+        self.product_ids = set()
+        self.depth = None
+        self.codec = None
+        self.pending = {}
+        self.has_pending = asyncio.Event()
+        self.num_published = 0
+        self.num_conflated = 0
+        self.send_task = None
+
+    def subscribe(self, product_ids, depth=None, output_format=None, books=None):
+        # depth and format are kept from earlier subscriptions unless given
+        self.product_ids.update(product_ids)
+        if depth is not None:
+            self.depth = depth
+        if output_format == SubscriberFormats.BINARY:
+            if self.codec is None:
+                self.codec = BinaryCodec()
+        elif output_format == SubscriberFormats.JSON:
+            self.codec = None
+        # a new subscription starts from the latest state of the book
+        for product_id in product_ids:
+            if (books or {}).get(product_id) is not None:
+                self.pending[product_id] = books.get(product_id)
+                self.has_pending.set()
+
+    def unsubscribe(self, product_ids):
+        for product_id in product_ids:
+            self.product_ids.discard(product_id)
+            self.pending.pop(product_id, None)
+
+    def publish(self, product_id, output):
+        if product_id not in self.product_ids:
+            return
+        pending = self.pending.get(product_id)
+        if pending is not None:
+            self.num_conflated += 1
+        self.pending[product_id] = merge_output(pending, output)
+        self.has_pending.set()
+
+    async def send_pending(self):
+        while True:
+            await self.has_pending.wait()
+            self.has_pending.clear()
+            pending, self.pending = self.pending, {}
+            for output in pending.values():
+                await self.send(trim_output(output, self.depth))
+                self.num_published += 1
+
+    async def send(self, message):
+        if self.codec is not None and message.get("type") not in ("subscriptions", "error"):
+            await self.ws.send_bytes(self.codec.encode(message))
+        else:
+            await self.ws.send_str(json.dumps(message))
+
+
+class PublicationServer:
+    """
+    Serves the book outputs to local websocket clients on ws://<host>:<port>/ws. A client sends
+    {"type": "subscribe", "product_ids": [...], "depth": 10, "format": "json"} (depth and format optional and
+    kept from earlier subscriptions, format 'binary' sends output_codecs frames) and
+    {"type": "unsubscribe", "product_ids": [...]}, both answered with its current subscriptions. publish() only
+    updates pending state and never waits on a client
+    """
+    def __init__(self, host, port, heartbeat=None):
+        self.host = host
+        self.port = port
+        self.heartbeat = heartbeat
+        self.subscribers = {}
+        self.books = {}
+        self.num_subscribers = 0
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/ws', self.handle_subscriber)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        logging.info('Publishing outputs on ws://{}:{}/ws'.format(self.host, self.port))
+
+    async def close(self):
+        for subscriber in list(self.subscribers.values()):
+            await subscriber.ws.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def publish(self, outputs):
+        for output in outputs:
+            product_id = output.get("product_id")
+            self.books[product_id] = merge_output(self.books.get(product_id), output)
+            for subscriber in self.subscribers.values():
+                subscriber.publish(product_id, output)
+
+    async def handle_subscriber(self, request):
+        ws = web.WebSocketResponse(heartbeat=self.heartbeat)
+        await ws.prepare(request)
+        self.num_subscribers += 1
+        subscriber = Subscriber(ws, self.num_subscribers)
+        self.subscribers[subscriber.subscriber_id] = subscriber
+        subscriber.send_task = asyncio.ensure_future(subscriber.send_pending())
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    await self.handle_message(subscriber, msg.data)
+                elif msg.type == WSMsgType.ERROR:
+                    logging.warning('Subscriber {} closed with {}'.format(subscriber.subscriber_id, ws.exception()))
+        finally:
+            del self.subscribers[subscriber.subscriber_id]
+            subscriber.send_task.cancel()
+        return ws
+
+    async def handle_message(self, subscriber, data):
+        try:
+            message = json.loads(data)
+            product_ids = message.get("product_ids") or []
+            if not isinstance(product_ids, list) or not all(isinstance(product_id, str) for product_id in product_ids):
+                raise ValueError('product_ids has to be a list of product ids')
+            if message.get("type") == "subscribe":
+                depth = message.get("depth")
+                if depth is not None and (not isinstance(depth, int) or depth < 1):
+                    raise ValueError('depth has to be a positive integer')
+                output_format = message.get("format")
+                if output_format not in (None, SubscriberFormats.JSON, SubscriberFormats.BINARY):
+                    raise ValueError('format has to be {} or {}'.format(SubscriberFormats.JSON,
+                                                                        SubscriberFormats.BINARY))
+                subscriber.subscribe(product_ids, depth, output_format, self.books)
+            elif message.get("type") == "unsubscribe":
+                subscriber.unsubscribe(product_ids)
+            else:
+                raise ValueError('unknown message type {}'.format(message.get("type")))
+        except (ValueError, AttributeError) as e:
+            await subscriber.send({"type": "error", "message": str(e)})
+            return
+        await subscriber.send({"type": "subscriptions", "product_ids": sorted(subscriber.product_ids),
+                               "depth": subscriber.depth})
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+from src.exceptions import SnapshotHttpException
+from src.metrics import LatencyHistogram
+from src.orderbook.snapshot_loader import copy_snapshot
+
+
+class TokenBucket:
+    """
+    Allows rate requests per second on average with bursts of up to capacity requests
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or 1
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self):
+        # returns how long the caller waited for its token
+        waited = 0
+        self.refill()
+        while self.tokens < 1:
+            wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+            waited += wait
+            self.refill()
+        self.tokens -= 1
+        return waited
+
+
+class SnapshotMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.deduplicated = 0
+        self.attempts = 0
+        self.retries = 0
+        self.successes = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rate_limited_secs = 0
+        self.fetch_secs = 0
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class SnapshotScheduler:
+    """
+    Shares one snapshot client between every book so startup and simultaneous rebuilds don't all hit the api at
+    once. At most max_concurrent requests are in flight and requests are spaced by a token bucket of rate per
+    second, a product that already has a request in flight waits for that one instead of sending another and
+    every book waiting on a shared request gets its own copy of the snapshot.
+    Failed attempts are retried with exponentially growing, randomly jittered waits and like
+    SnapshotHttpClient a RetryError is raised once attempts run out
+    """
+    def __init__(self, http_client, max_concurrent=None, rate=None, burst=None, attempts=None,
+                 backoff_base=None, backoff_max=None):
+        self.http_client = http_client
+        self.semaphore = asyncio.Semaphore(max_concurrent or 2)
+        self.token_bucket = TokenBucket(rate or 1, burst)
+        self.attempts = attempts or 5
+        self.backoff_base = backoff_base or 0.5
+        self.backoff_max = backoff_max or 30
+        self.in_flight = {}
+        self.metrics = SnapshotMetrics()
+        self.fetch_latencies = LatencyHistogram()
+
+    async def get_orderbook_snapshot(self, product_id, http_timeout, price_format=None):
+        self.metrics.requests += 1
+        in_flight = self.in_flight.get(product_id)
+        if in_flight is None:
+            request = asyncio.ensure_future(self.fetch_with_retries(product_id, http_timeout, price_format))
+            # the number of books waiting on the request
+            in_flight = self.in_flight[product_id] = [request, 1]
+            request.add_done_callback(lambda _: self.in_flight.pop(product_id, None))
+        else:
+            in_flight[1] += 1
+            self.metrics.deduplicated += 1
+        # one waiting book being cancelled must not cancel the request the others are waiting on
+        book_snapshot = await asyncio.shield(in_flight[0])
+        # nothing can join once the request is done, so a request with one waiter hands over the original
+        return copy_snapshot(book_snapshot) if in_flight[1] > 1 else book_snapshot
+
+    async def fetch_with_retries(self, product_id, http_timeout, price_format):
+        retrying = AsyncRetrying(retry=retry_if_exception_type(SnapshotHttpException),
+                                 stop=stop_after_attempt(self.attempts),
+                                 wait=wait_random_exponential(multiplier=self.backoff_base, max=self.backoff_max),
+                                 before_sleep=self.log_retry)
+        try:
+            return await retrying(self.fetch, product_id, http_timeout, price_format)
+        except Exception:
+            self.metrics.failures += 1
+            raise
+
+    async def fetch(self, product_id, http_timeout, price_format):
+        async with self.semaphore:
+            self.metrics.rate_limited_secs += await self.token_bucket.acquire()
+            self.metrics.attempts += 1
+            self.metrics.in_flight += 1
+            self.metrics.max_in_flight = max(self.metrics.max_in_flight, self.metrics.in_flight)
+            start = time.perf_counter_ns()
+            try:
+                book_snapshot = await self.http_client.fetch_orderbook_snapshot(product_id, http_timeout,
+                                                                                price_format)
+            finally:
+                fetch_ns = time.perf_counter_ns() - start
+                self.metrics.in_flight -= 1
+                self.metrics.fetch_secs += fetch_ns / 1e9
+                self.fetch_latencies.record(fetch_ns)
+        self.metrics.successes += 1
+        return book_snapshot
+
+    def log_retry(self, retry_state):
+        self.metrics.retries += 1
+        logging.warning('Snapshot attempt {} for product {} failed, {}, retrying in {:.2f}s'.format(
+            retry_state.attempt_number, retry_state.args[0], retry_state.outcome.exception(),
+            retry_state.next_action.sleep))
@@ -0,0 +1,160 @@
+import codecs
+import json
+
+from src.event.metadata import EventKeys
+from src.orderbook.metadata import OrderSides
+from src.orderbook.snapshot_loader import SnapshotLoader
+
+STREAM_CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+
+
+class ParseStates:
+    OBJECT_START = 'object_start'
+    KEY = 'key'
+    FIRST_KEY = 'first_key'
+    COLON = 'colon'
+    VALUE = 'value'
+    AFTER_VALUE = 'after_value'
+    FIRST_ORDER = 'first_order'
+    ORDER = 'order'
+    AFTER_ORDER = 'after_order'
+    END = 'end'
+
+
+class SnapshotStreamParser:
+    """
+    Parses a level 3 snapshot body as it arrives. The orders of bids and asks are handed to on_orders(side, orders)
+    once per fed chunk instead of being kept, every other top level key is kept in values. Only the snapshot's
+    own structure is walked here, each order and each other value is decoded by the json module
+    """
+    def __init__(self, on_orders, order_sides=None):
+        self.on_orders = on_orders
+        self.order_sides = order_sides or [OrderSides.BID, OrderSides.ASK]
+        self.values = {}
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.raw_decode = json.JSONDecoder().raw_decode
+        self.buffer = ''
+        self.state = ParseStates.OBJECT_START
+        self.key = None
+
+    def feed(self, chunk):
+        self.buffer += self.decoder.decode(chunk)
+        self.parse(False)
+
+    def close(self):
+        self.buffer += self.decoder.decode(b'', final=True)
+        self.parse(True)
+        if self.state != ParseStates.END:
+            raise ValueError('snapshot body ended in state {}'.format(self.state))
+
+    def parse(self, is_final):
+        buffer = self.buffer
+        end = len(buffer)
+        pos = 0
+        orders = []
+        while True:
+            while pos < end and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos == end:
+                break
+            char = buffer[pos]
+            state = self.state
+            if state == ParseStates.ORDER or state == ParseStates.FIRST_ORDER:
+                if char == ']' and state == ParseStates.FIRST_ORDER:
+                    self.end_orders(orders)
+                    orders = []
+                    pos += 1
+                    continue
+                try:
+                    order, pos = self.raw_decode(buffer, pos)
+                except ValueError:
+                    if is_final:
+                        raise
+                    break
+                orders.append(order)
+                self.state = ParseStates.AFTER_ORDER
+            elif state == ParseStates.AFTER_ORDER:
+                if char == ',':
+                    self.state = ParseStates.ORDER
+                elif char == ']':
+                    self.end_orders(orders)
+                    orders = []
+                else:
+                    raise ValueError('unexpected {} between orders at {}'.format(char, pos))
+                pos += 1
+            elif state == ParseStates.KEY or state == ParseStates.FIRST_KEY:
+                if char == '}' and state == ParseStates.FIRST_KEY:
+                    self.state = ParseStates.END
+                    pos += 1
+                    continue
+                try:
+                    self.key, pos = self.raw_decode(buffer, pos)
+                except ValueError:
+                    if is_final:
+                        raise
+                    break
+                self.state = ParseStates.COLON
+            elif state == ParseStates.COLON:
+                if char != ':':
+                    raise ValueError('expected : after key {}'.format(self.key))
+                self.state = ParseStates.VALUE
+                pos += 1
+            elif state == ParseStates.VALUE:
+                if char == '[' and self.key in self.order_sides:
+                    self.state = ParseStates.FIRST_ORDER
+                    pos += 1
+                    continue
+                try:
+                    value, value_end = self.raw_decode(buffer, pos)
+                except ValueError:
+                    if is_final:
+                        raise
+                    break
+                # a number at the end of the buffer may continue in the next chunk
+                if value_end == end and not is_final:
+                    break
+                self.values[self.key] = value
+                pos = value_end
+                self.state = ParseStates.AFTER_VALUE
+            elif state == ParseStates.AFTER_VALUE:
+                if char == ',':
+                    self.state = ParseStates.KEY
+                elif char == '}':
+                    self.state = ParseStates.END
+                else:
+                    raise ValueError('unexpected {} after value of {}'.format(char, self.key))
+                pos += 1
+            elif state == ParseStates.OBJECT_START:
+                if char != '{':
+                    raise ValueError('snapshot body is not an object')
+                self.state = ParseStates.FIRST_KEY
+                pos += 1
+            else:
+                raise ValueError('unexpected {} after the end of the snapshot'.format(char))
+        if orders:
+            self.on_orders(self.key, orders)
+        self.buffer = buffer[pos:]
+
+    def end_orders(self, orders):
+        if orders:
+            self.on_orders(self.key, orders)
+        self.state = ParseStates.AFTER_VALUE
+
+
+async def load_snapshot_stream(chunks, price_format):
+    # orders are grouped into levels as each chunk arrives, so the only full copy of the snapshot is the loader's
+    snapshot_loader = SnapshotLoader(price_format, None)
+    num_orders = {}
+
+    def add_orders(side, orders):
+        snapshot_loader.snapshot_seq_num = parser.values.get(EventKeys.SEQ)
+        snapshot_loader.add_orders(side, orders, num_orders.get(side, 0))
+        num_orders[side] = num_orders.get(side, 0) + len(orders)
+
+    parser = SnapshotStreamParser(add_orders)
+    async for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    snapshot_loader.snapshot_seq_num = parser.values.get(EventKeys.SEQ)
+    return snapshot_loader
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+
+from src.io.io_interfaces import Pipeline
+from src.io.output_codecs import create_codec
+
+
+class WriterTypes:
+    STDOUT = 'stdout'
+    FILE = 'file'
+
+
+class BufferedWriter:
+    """
+    Writes outputs from a background thread. write_batch() encodes the outputs and puts the bytes on a queue, the
+    thread joins whatever has queued up and writes it in one write, so blocking i/o never runs on the event loop.
+    Encoding stays on the loop, in a thread it would hold the GIL and slow the books down more than it saves.
+    Outputs that could not be encoded or written are counted in num_dropped. Subclasses say where the bytes go
+    """
+    def __init__(self, output_format=None, flush_interval=None):
+        self.codec = create_codec(output_format)
+        self.flush_interval = flush_interval or 1
+        self.batches = queue.SimpleQueue()
+        self.thread = None
+        self.num_outputs = 0
+        self.num_writes = 0
+        self.num_bytes = 0
+        self.num_dropped = 0
+        # encode failures are counted on the loop and write failures on the thread
+        self.dropped_lock = threading.Lock()
+        self.latency_tracker = None
+
+    def start(self):
+        self.open_output()
+        self.thread = threading.Thread(target=self.write_batches, name='output-writer', daemon=True)
+        self.thread.start()
+
+    def write_batch(self, outputs):
+        queued_at = time.perf_counter_ns() if self.latency_tracker is not None else None
+        self.batches.put((queued_at, self.encode_outputs(outputs)))
+
+    def close(self):
+        if self.thread is not None:
+            self.batches.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def write_batches(self):
+        is_closing = False
+        while not is_closing:
+            try:
+                batches = [self.batches.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                self.flush()
+                continue
+            while True:
+                try:
+                    batches.append(self.batches.get_nowait())
+                except queue.Empty:
+                    break
+            if batches[-1] is None:
+                is_closing = True
+                batches.pop()
+            chunks = [chunk for _, batch in batches for chunk in batch]
+            if not chunks:
+                continue
+            try:
+                self.write_chunks(chunks)
+            except OSError as e:
+                self.add_dropped(len(chunks))
+                logging.error('Unable to write {} outputs, {} dropped so far, {}'.format(len(chunks),
+                                                                                         self.num_dropped, e))
+                continue
+            self.num_outputs += len(chunks)
+            self.num_bytes += sum(map(len, chunks))
+            if self.latency_tracker is not None:
+                self.record_latencies(batches)
+        self.flush()
+        self.close_output()
+
+    def encode_outputs(self, outputs):
+        encode = self.codec.encode
+        chunks = []
+        for output in outputs:
+            try:
+                chunks.append(encode(output))
+            except ValueError as e:
+                self.add_dropped(1)
+                logging.error('Unable to encode output of {}, {}'.format(output.get('product_id'), e))
+        return chunks
+
+    def add_dropped(self, count):
+        with self.dropped_lock:
+            self.num_dropped += count
+
+    def record_latencies(self, batches):
+        written_at = time.perf_counter_ns()
+        for queued_at, batch in batches:
+            if queued_at is not None:
+                self.latency_tracker.write.record(written_at - queued_at, len(batch))
+
+    def open_output(self):
+        pass
+
+    def write_chunks(self, chunks):
+        self.write_bytes(b''.join(chunks))
+
+    def write_bytes(self, data):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close_output(self):
+        pass
+
+
+class StreamWriter(BufferedWriter):
+    def __init__(self, stream=None, output_format=None, flush_interval=None):
+        super().__init__(output_format, flush_interval)
+        self.stream = stream or sys.stdout.buffer
+
+    def write_bytes(self, data):
+        self.stream.write(data)
+        self.stream.flush()
+        self.num_writes += 1
+
+
+class FileWriter(BufferedWriter):
+    """
+    Appends to path. Once the file holds rotate_size bytes or was opened rotate_interval seconds ago it is
+    renamed to <name>-<time><suffix> on the next write and a new file is started at path
+    """
+    def __init__(self, path, output_format=None, rotate_size=None, rotate_interval=None, flush_interval=None):
+        super().__init__(output_format, flush_interval)
+        self.path = Path(path)
+        self.rotate_size = rotate_size
+        self.rotate_interval = rotate_interval
+        self.file = None
+        self.file_size = 0
+        self.opened_at = None
+        self.rotated_paths = []
+
+    def open_output(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, 'ab')
+        self.file_size = self.file.tell()
+        # every file can be decoded on its own, a binary one starts with the products already sent
+        header = self.codec.header()
+        if header:
+            self.write_bytes(header)
+        self.opened_at = time.monotonic()
+
+    def write_chunks(self, chunks):
+        # a batch is split where the file has to rotate, so files stay close to rotate_size
+        if self.should_rotate():
+            self.rotate()
+        start = 0
+        pending_size = 0
+        for index, chunk in enumerate(chunks):
+            if self.rotate_size and pending_size and self.file_size + pending_size >= self.rotate_size:
+                self.write_bytes(b''.join(chunks[start:index]))
+                self.rotate()
+                start = index
+                pending_size = 0
+            pending_size += len(chunk)
+        self.write_bytes(b''.join(chunks[start:]))
+
+    def write_bytes(self, data):
+        self.file.write(data)
+        self.file_size += len(data)
+        self.num_writes += 1
+
+    def should_rotate(self):
+        if not self.file_size:
+            return False
+        return bool(self.rotate_size and self.file_size >= self.rotate_size) or \
+            bool(self.rotate_interval and time.monotonic() - self.opened_at >= self.rotate_interval)
+
+    def rotate(self):
+        self.close_output()
+        rotated_path = self.get_rotated_path()
+        os.replace(self.path, rotated_path)
+        self.rotated_paths.append(rotated_path)
+        self.open_output()
+
+    def get_rotated_path(self):
+        name = '{}-{}'.format(self.path.stem, time.strftime('%Y%m%d-%H%M%S'))
+        rotated_path = self.path.with_name(name + self.path.suffix)
+        count = 1
+        while rotated_path.exists():
+            rotated_path = self.path.with_name('{}-{}{}'.format(name, count, self.path.suffix))
+            count += 1
+        return rotated_path
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close_output(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def create_writer(writer_config):
+    if writer_config.get('type') == WriterTypes.FILE:
+        return FileWriter(writer_config.get('path'), writer_config.get('format'), writer_config.get('rotate_size'),
+                          writer_config.get('rotate_interval'), writer_config.get('flush_interval'))
+    return StreamWriter(None, writer_config.get('format'), writer_config.get('flush_interval'))
+
+
+async def write_outputs(pipeline, writer, publisher=None):
+    # outputs already waiting are handed over together so the loop pays for one queue put per batch, with a
+    # publisher they are also published to its subscribers
+    pipe = pipeline.pipe
+    while True:
+        outputs = [await pipe.get()]
+        while not pipe.empty():
+            outputs.append(pipe.get_nowait())
+        is_closing = outputs[-1] == Pipeline.states.CLOSING_PIPE
+        if is_closing:
+            outputs.pop()
+        if outputs:
+            writer.write_batch(outputs)
+            if publisher is not None:
+                publisher.publish(outputs)
+        if is_closing:
+            await asyncio.get_event_loop().run_in_executor(None, writer.close)
+            return
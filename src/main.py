@@ -6,8 +6,15 @@ import asyncio
 from src import app_config
 from src.io.dispatchers import EventDispatcher
 from src.exceptions import InitException
-from src.io.io_interfaces import SnapshotHttpClient, get_full_feed, Pipeline, write_to_stdout
-from src.orderbook.orderbook import Orderbook
+from src.factories import create_latency_tracker, create_orderbook, create_pipeline, create_snapshot_client, \
+    get_checkpointer, request_full_frame, start_latency_dumps, stop_latency_dumps
+from src.io.io_interfaces import OverflowPolicies, get_full_feed
+from src.io.journal import JournalWriter
+from src.io.metrics_server import MetricsServer
+from src.io.publisher import PublicationServer
+from src.io.writers import create_writer, write_outputs
+from src.orderbook.metadata import OutputModes
+from src.shards import ShardPool
 
 
 async def start_event_reader(event_feed):
@@ -22,31 +29,133 @@ async def start_l2_writer(output_writer):
     await output_writer
 
 
+def start_journal_writer():
+    if not app_config.journal.get('enabled'):
+        return None
+    journal_writer = JournalWriter(app_config.journal.get('directory'), app_config.journal.get('segment_size'),
+                                   app_config.journal.get('index_interval'))
+    journal_writer.start()
+    return journal_writer
+
+
+def start_output_writer(latency_tracker=None):
+    output_writer = create_writer(app_config.writer)
+    output_writer.latency_tracker = latency_tracker
+    output_writer.start()
+    return output_writer
+
+
+async def start_publisher():
+    if not app_config.publisher.get('enabled'):
+        return None
+    publisher = PublicationServer(app_config.publisher.get('host'), app_config.publisher.get('port'),
+                                  app_config.publisher.get('heartbeat'))
+    await publisher.start()
+    return publisher
+
+
+async def start_metrics_server(orderbooks=None, event_readers=None, output_pipeline=None, snapshot_client=None,
+                               latency_tracker=None, output_writer=None):
+    if not app_config.metrics.get('enabled'):
+        return None
+    metrics_server = MetricsServer(app_config.metrics.get('host'), app_config.metrics.get('port'), orderbooks,
+                                   event_readers, output_pipeline, snapshot_client, latency_tracker, output_writer)
+    await metrics_server.start()
+    return metrics_server
+
+
+async def close_metrics_server(metrics_server):
+    if metrics_server is not None:
+        await metrics_server.close()
+
+
+async def close_publisher(publisher):
+    if publisher is not None:
+        await publisher.close()
+
+
+def close_journal_writer(journal_writer):
+    if journal_writer is not None:
+        journal_writer.close()
+
+
 async def start_app(app_loop):
     for sub_prod in app_config.subscribed_product_ids:
         if sub_prod not in app_config.product_list:
             raise InitException()
+    if app_config.num_shards > 1:
+        await start_sharded_app(app_loop)
+        return
 
+    journal_writer = start_journal_writer()
     tasks = []
     product_event_readers = {}
-    l2_writer_pipeline = Pipeline(asyncio.Queue())
-    l2_writer = write_to_stdout(l2_writer_pipeline)
-    l2_writer_task = asyncio.ensure_future(start_l2_writer(l2_writer))
+    orderbooks = {}
+    l2_writer_pipeline = create_pipeline(app_config.pipelines.get('outputs'),
+                                         lambda output: request_full_frame(orderbooks, output))
+    latency_tracker = create_latency_tracker()
+    dump_task = start_latency_dumps(latency_tracker)
+    output_writer = start_output_writer(latency_tracker)
+    publisher = await start_publisher()
+    l2_writer_task = asyncio.ensure_future(start_l2_writer(write_outputs(l2_writer_pipeline, output_writer,
+                                                                         publisher)))
     tasks.append(l2_writer_task)
     async with aiohttp.ClientSession(loop=app_loop) as session:
-        snapshot_client = SnapshotHttpClient(session)
+        snapshot_client = create_snapshot_client(session)
         for product in app_config.subscribed_product_ids:
-            event_reader = Pipeline(asyncio.Queue())
+            event_reader = create_pipeline(app_config.pipelines.get('events'))
             product_event_readers[product] = event_reader
-            orderbook = Orderbook(event_reader, l2_writer_pipeline, snapshot_client, product,
-                                  app_config.num_output_levels, app_config.error_threshold)
+            orderbook = create_orderbook(product, event_reader, l2_writer_pipeline, snapshot_client,
+                                         get_checkpointer(product), latency_tracker)
+            orderbooks[product] = orderbook
             consume_task = asyncio.ensure_future(start_orderbook_consume(orderbook))
             tasks.append(consume_task)
-        event_feed = get_full_feed(session, EventDispatcher(product_event_readers),
-                                   app_config.full_feed_subscribe_msg)
+        metrics_server = await start_metrics_server(orderbooks, product_event_readers, l2_writer_pipeline,
+                                                    snapshot_client, latency_tracker, output_writer)
+        event_feed = get_full_feed(session, EventDispatcher(product_event_readers, latency_tracker),
+                                   app_config.full_feed_subscribe_msg, journal_writer, latency_tracker)
         start_feed_task = asyncio.ensure_future(start_event_reader(event_feed))
         tasks.append(start_feed_task)
-        await asyncio.gather(*tasks)
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            close_journal_writer(journal_writer)
+            output_writer.close()
+            await close_publisher(publisher)
+            await close_metrics_server(metrics_server)
+            stop_latency_dumps(latency_tracker, dump_task)
+
+
+async def start_sharded_app(app_loop):
+    # the books run in worker processes, this process only reads the feed and writes the merged outputs
+    shard_pool = ShardPool(app_config.subscribed_product_ids, app_config.num_shards, app_config.shard_batch_size)
+    shard_pool.start()
+    journal_writer = start_journal_writer()
+    # the books are in other processes and can't be asked for a full frame, so delta outputs are never dropped
+    l2_writer_pipeline = create_pipeline(app_config.pipelines.get('outputs'), overflow_policy=OverflowPolicies.BLOCK
+                                         if app_config.output_mode == OutputModes.L2_DELTA else None)
+    # this process only sees the receive and write stages, the shards log the rest
+    latency_tracker = create_latency_tracker()
+    dump_task = start_latency_dumps(latency_tracker)
+    output_writer = start_output_writer(latency_tracker)
+    publisher = await start_publisher()
+    metrics_server = await start_metrics_server(output_pipeline=l2_writer_pipeline, latency_tracker=latency_tracker,
+                                                output_writer=output_writer)
+    tasks = [asyncio.ensure_future(start_l2_writer(write_outputs(l2_writer_pipeline, output_writer, publisher))),
+             asyncio.ensure_future(shard_pool.merge_outputs(l2_writer_pipeline))]
+    try:
+        async with aiohttp.ClientSession(loop=app_loop) as session:
+            event_feed = get_full_feed(session, shard_pool, app_config.full_feed_subscribe_msg, journal_writer,
+                                       latency_tracker)
+            tasks.append(asyncio.ensure_future(start_event_reader(event_feed)))
+            await asyncio.gather(*tasks)
+    finally:
+        shard_pool.close()
+        close_journal_writer(journal_writer)
+        output_writer.close()
+        await close_publisher(publisher)
+        await close_metrics_server(metrics_server)
+        stop_latency_dumps(latency_tracker, dump_task)
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import logging
+
+
+class Histogram:
+    """
+    Counts of recorded integer values in power of two buckets, a bucket holds the values above the previous
+    bucket's bound up to its own bound
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        bound = 1 << (value - 1).bit_length() if value > 1 else 1
+        self.buckets[bound] = self.buckets.get(bound, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "max": self.max,
+            "buckets": {bound: self.buckets[bound] for bound in sorted(self.buckets)}
+        }
+
+    def __str__(self):
+        return "count {}, mean {:.1f}, max {}, buckets {}".format(
+            self.count, self.mean(), self.max,
+            ', '.join('<={}: {}'.format(bound, self.buckets[bound]) for bound in sorted(self.buckets)))
+
+
+class LatencyHistogram:
+    """
+    HDR style histogram of nanosecond latencies: every power of two range is split into 2 ** precision_bits linear
+    buckets keyed on their lower bound, so a percentile is within 1 / 2 ** precision_bits of the recorded value
+    """
+    def __init__(self, precision_bits=5):
+        self.precision_bits = precision_bits
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value, count=1):
+        shift = value.bit_length() - self.precision_bits - 1
+        bucket = value >> shift << shift if shift > 0 else max(value, 0)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += count
+        self.total += value * count
+        if value > self.max:
+            self.max = value
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def percentile(self, fraction):
+        # the buckets are copied first as the writer thread records into its histogram while it is read
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in sorted(dict(self.buckets).items()):
+            seen += count
+            if seen >= rank:
+                return bucket
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "p999": self.percentile(0.999),
+            "max": self.max
+        }
+
+
+class Stages:
+    RECEIVE = 'receive'
+    DISPATCH = 'dispatch'
+    QUEUE = 'queue'
+    PROCESS = 'process'
+    OUTPUT = 'output'
+    TOTAL = 'total'
+    WRITE = 'write'
+    PRODUCT_STAGES = [RECEIVE, DISPATCH, QUEUE, PROCESS, OUTPUT, TOTAL]
+
+
+class ProductLatencies:
+    """
+    Stage latencies of one product's events: receive is parsing the feed frame, dispatch is putting the event on
+    the book's pipeline, queue is the wait there, process is process_event, output formatting and putting an output
+    on the output pipeline and total is from the feed frame to that put
+    """
+    def __init__(self):
+        self.histograms = {stage: LatencyHistogram() for stage in Stages.PRODUCT_STAGES}
+        self.rebuilds = 0
+        self.errors = 0
+
+    def to_dict(self):
+        return {
+            "events": self.histograms[Stages.PROCESS].count,
+            "outputs": self.histograms[Stages.OUTPUT].count,
+            "rebuilds": self.rebuilds,
+            "errors": self.errors,
+            "stages": {stage: histogram.to_dict() for stage, histogram in self.histograms.items()}
+        }
+
+
+class LatencyTracker:
+    """
+    Stage latencies of the events passing through this process. When enabled the feed stamps every event with
+    the perf_counter_ns it was received at and the dispatcher with the time it was queued, so the book can tell
+    how long it waited. write is per output, from the writer being handed it to it being written
+    """
+    def __init__(self):
+        self.products = {}
+        self.write = LatencyHistogram()
+
+    def for_product(self, product_id):
+        latencies = self.products.get(product_id)
+        if latencies is None:
+            latencies = self.products[product_id] = ProductLatencies()
+        return latencies
+
+    def record(self, stage, product_id, value):
+        self.for_product(product_id).histograms[stage].record(value)
+
+    def to_dict(self):
+        return {
+            "products": {product_id: latencies.to_dict() for product_id, latencies in list(self.products.items())},
+            Stages.WRITE: self.write.to_dict()
+        }
+
+
+def dump_latencies(latency_tracker):
+    logging.info('latencies {}'.format(json.dumps(latency_tracker.to_dict())))
+
+
+async def log_latencies(latency_tracker, interval):
+    while True:
+        await asyncio.sleep(interval)
+        dump_latencies(latency_tracker)
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from src.event.metadata import EventKeys
+from src.io.journal import JournalReader
+from src.orderbook.metadata import OrderSides
+
+
+class CheckpointKeys:
+    PRODUCT_ID = 'product_id'
+    SNAPSHOT_SEQ = 'snapshot_sequence'
+    TIME = 'time'
+
+
+class BookCheckpointer:
+    """
+    Saves a book's orders and sequence numbers to <directory>/<product_id>.json every interval seconds so a
+    restarted book can start from the checkpoint instead of a snapshot download. Checkpoints are level 3
+    snapshots with a few extra keys and are written to a temporary file first then renamed over the last one,
+    so a crash mid write never leaves a partial checkpoint. Events recorded in the journal after the
+    checkpoint are replayed on top of it when journal_directory is given
+    """
+    def __init__(self, product_id, directory, interval=None, journal_directory=None):
+        self.product_id = product_id
+        self.path = Path(directory).joinpath('{}.json'.format(product_id))
+        self.interval = interval or 60
+        self.journal_directory = journal_directory
+        self.last_save_time = time.monotonic()
+        self.save_count = 0
+
+    def is_due(self):
+        return time.monotonic() - self.last_save_time >= self.interval
+
+    async def save(self, orderbook):
+        # the checkpoint is copied out of the book on the loop, only serialising and writing it is left to a thread
+        self.last_save_time = time.monotonic()
+        checkpoint = build_checkpoint(orderbook)
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, write_checkpoint, self.path, checkpoint)
+            self.save_count += 1
+        except OSError as e:
+            logging.error('Unable to checkpoint product {}, {}'.format(self.product_id, e))
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning('Unable to read checkpoint {}, {}'.format(self.path, e))
+            return None
+        if checkpoint.get(CheckpointKeys.PRODUCT_ID) != self.product_id:
+            logging.warning('Checkpoint {} is not for product {}'.format(self.path, self.product_id))
+            return None
+        return checkpoint
+
+    def journal_events(self, start_seq):
+        if self.journal_directory is None:
+            return []
+        return JournalReader(self.journal_directory).events(self.product_id, start_seq)
+
+
+def build_checkpoint(orderbook):
+    format_level = orderbook.price_format.format_level
+    checkpoint = {
+        CheckpointKeys.PRODUCT_ID: orderbook.product_id,
+        EventKeys.SEQ: orderbook.curr_seq_num,
+        CheckpointKeys.SNAPSHOT_SEQ: orderbook.book_snapshot_seq_num,
+        CheckpointKeys.TIME: time.time()
+    }
+    for side, levels in [(OrderSides.BID, reversed(orderbook.bid_values)), (OrderSides.ASK, orderbook.ask_values)]:
+        orders = checkpoint[side] = []
+        for level in levels:
+            orders.extend(format_level(level))
+    return checkpoint
+
+
+def write_checkpoint(path, checkpoint):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file, separators=(',', ':'))
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(tmp_path, path)
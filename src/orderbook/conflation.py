@@ -0,0 +1,35 @@
+import time
+
+
+class OutputConflater:
+    """
+    Decides when a book publishes. Without a min_interval or max_pending every update is published,
+    otherwise updates are collapsed into a single publish of the latest book state once min_interval
+    seconds have passed since the last publish or max_pending updates are waiting
+    """
+    def __init__(self, min_interval=None, max_pending=None):
+        self.min_interval = min_interval or 0
+        self.max_pending = max_pending or 0
+        self.is_enabled = bool(self.min_interval or self.max_pending)
+        self.pending_updates = 0
+        self.last_publish_time = float('-inf')
+        self.published_count = 0
+        self.conflated_count = 0
+
+    def add_update(self):
+        self.pending_updates += 1
+        if not self.is_enabled:
+            return True
+        return bool((self.min_interval and time.monotonic() - self.last_publish_time >= self.min_interval) or
+                    (self.max_pending and self.pending_updates >= self.max_pending))
+
+    def time_left(self):
+        if not self.min_interval:
+            return 0
+        return max(self.min_interval - (time.monotonic() - self.last_publish_time), 0)
+
+    def mark_published(self):
+        self.conflated_count += max(self.pending_updates - 1, 0)
+        self.published_count += 1
+        self.pending_updates = 0
+        self.last_publish_time = time.monotonic()
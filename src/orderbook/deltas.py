@@ -0,0 +1,62 @@
+from src.orderbook.metadata import OrderSides, FrameTypes
+
+
+class L2DeltaFormatter:
+    """
+    Turns the top levels of a book into a stream of level 2 frames: a full frame to (re)synchronise on,
+    then delta frames holding only the levels whose size or order count changed since the last frame.
+    Removed levels are sent with a size of 0. Every frame carries frame_seq so consumers can detect gaps
+    """
+    def __init__(self, full_frame_interval):
+        self.full_frame_interval = full_frame_interval or 0
+        self.frame_seq = 0
+        self.frames_since_full = 0
+        self.full_frame_requested = True
+        self.published_levels = {
+            OrderSides.BID: {},
+            OrderSides.ASK: {}
+        }
+
+    def request_full_frame(self):
+        self.full_frame_requested = True
+
+    def next_frame(self, orderbook):
+        is_full_frame = self.full_frame_requested or (
+                self.full_frame_interval and self.frames_since_full >= self.full_frame_interval)
+        format_price = orderbook.price_format.format_price
+        format_size = orderbook.price_format.format_size
+        frame = {
+            "type": FrameTypes.FULL if is_full_frame else FrameTypes.DELTA,
+            "product_id": orderbook.product_id,
+            "sequence": orderbook.curr_seq_num
+        }
+        changes = []
+        for side in [OrderSides.BID, OrderSides.ASK]:
+            published_levels = self.published_levels.get(side)
+            curr_levels = {}
+            side_output = []
+            for price_key, level in orderbook.top_levels(side):
+                level_state = (level.total_size, len(level), level.price)
+                curr_levels[price_key] = level_state
+                if is_full_frame:
+                    side_output.append([format_price(level.price), format_size(level.total_size), len(level)])
+                elif published_levels.get(price_key) != level_state:
+                    changes.append([side, format_price(level.price), format_size(level.total_size), len(level)])
+            if is_full_frame:
+                frame[side] = side_output
+            else:
+                changes.extend([side, format_price(price), format_size(0), 0]
+                               for price_key, (_, _, price) in published_levels.items()
+                               if price_key not in curr_levels)
+            self.published_levels[side] = curr_levels
+        if is_full_frame:
+            self.full_frame_requested = False
+            self.frames_since_full = 0
+        elif changes:
+            frame["changes"] = changes
+            self.frames_since_full += 1
+        else:
+            return None
+        self.frame_seq += 1
+        frame["frame_seq"] = self.frame_seq
+        return frame
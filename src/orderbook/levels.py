@@ -0,0 +1,65 @@
+class Order:
+    """
+    A resting order. The price lives on the order's level, which is shared by every order at that price,
+    and the size is kept in the book's numeric representation. prev_order and next_order link the orders
+    of a level in FIFO order
+    """
+    __slots__ = ('size', 'order_id', 'level', 'prev_order', 'next_order')
+
+    def __init__(self, size, order_id):
+        self.size = size
+        self.order_id = order_id
+        self.level = None
+        self.prev_order = None
+        self.next_order = None
+
+
+class PriceLevel:
+    """
+    The orders resting at one price, kept as a linked list so orders are appended and removed in constant
+    time without a container per level. The total size is kept up to date so level 2 output never has to
+    walk the orders. The order count is len(level)
+    """
+    __slots__ = ('side', 'price_key', 'price', 'total_size', 'num_orders', 'first_order', 'last_order')
+
+    def __init__(self, side, price_key, price):
+        self.side = side
+        self.price_key = price_key
+        self.price = price
+        self.total_size = 0
+        self.num_orders = 0
+        self.first_order = None
+        self.last_order = None
+
+    def __len__(self):
+        return self.num_orders
+
+    def __iter__(self):
+        order = self.first_order
+        while order is not None:
+            yield order
+            order = order.next_order
+
+    def add_order(self, order):
+        order.level = self
+        order.prev_order = self.last_order
+        if self.last_order is None:
+            self.first_order = order
+        else:
+            self.last_order.next_order = order
+        self.last_order = order
+        self.num_orders += 1
+        self.total_size += order.size
+
+    def remove_order(self, order):
+        if order.prev_order is None:
+            self.first_order = order.next_order
+        else:
+            order.prev_order.next_order = order.next_order
+        if order.next_order is None:
+            self.last_order = order.prev_order
+        else:
+            order.next_order.prev_order = order.prev_order
+        order.prev_order = order.next_order = None
+        self.num_orders -= 1
+        self.total_size -= order.size
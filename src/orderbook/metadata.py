@@ -12,6 +12,22 @@ class OrderSides:
     ASK = 'asks'
 
 
+class OutputModes:
+    L3 = 'l3'
+    L2 = 'l2'
+    L2_DELTA = 'l2_delta'
+
+
+class FrameTypes:
+    FULL = 'snapshot'
+    DELTA = 'l2update'
+
+
+class RebuildModes:
+    RELOAD = 'reload'
+    RECONCILE = 'reconcile'
+
+
 class ErrorLvls:
     WARN = auto()
     ERROR = auto()
\ No newline at end of file
@@ -1,30 +1,69 @@
 import asyncio
 import logging
+import time
 
 from tenacity import RetryError
 
 from src import app_config
-from decimal import Decimal
 from sortedcontainers import SortedDict
 from src.event.verifiers import should_process_event
 from src.event.metadata import EventKeys, EventOrderTypes, EventDoneReasons, EventSides
 from src.exceptions import EventException, SnapshotException, SnapshotHttpException
 from src.io.io_interfaces import Pipeline
-from src.orderbook.metadata import OrderSides, OrderIndexes, ErrorLvls
+from src.metrics import Histogram, Stages
+from src.orderbook.checkpoint import CheckpointKeys
+from src.orderbook.conflation import OutputConflater
+from src.orderbook.deltas import L2DeltaFormatter
+from src.orderbook.levels import Order, PriceLevel
+from src.orderbook.metadata import OrderSides, ErrorLvls, OutputModes, RebuildModes
+from src.orderbook.price_formats import DecimalFormat
+from src.orderbook.reconciliation import ReconcileStats, iter_snapshot_orders
+from src.orderbook.reorder import ReorderBuffer
+from src.orderbook.snapshot_loader import get_snapshot_loader, get_snapshot_seq_num
 
 
 class Orderbook:
-    def __init__(self, event_reader, l2_writer, http_client, product_id, num_output_levels, error_threshold):
+    def __init__(self, event_reader, l2_writer, http_client, product_id, num_output_levels, error_threshold,
+                 price_format=None, output_mode=None, full_frame_interval=None,
+                 conflation_interval=None, conflation_max_pending=None, rebuild_mode=None, checkpointer=None,
+                 max_batch_size=None, latencies=None, reorder_max_size=None, reorder_max_wait=None):
         self.event_reader = event_reader
         self.l2_writer = l2_writer
         self.http_client = http_client
         self.product_id = product_id or ''
-        self.num_output_lvls = num_output_levels or 25
+        self.output_boundaries = {
+            OrderSides.BID: None,
+            OrderSides.ASK: None
+        }
+        self._num_output_lvls = num_output_levels or 25
         self.error_threshold = error_threshold or 10
+        self.price_format = price_format or DecimalFormat()
+        self.output_mode = output_mode or OutputModes.L3
+        self.delta_formatter = L2DeltaFormatter(full_frame_interval) \
+            if self.output_mode == OutputModes.L2_DELTA else None
+        self.conflater = OutputConflater(conflation_interval, conflation_max_pending)
+        self.rebuild_mode = rebuild_mode or RebuildModes.RELOAD
+        self.checkpointer = checkpointer
+        self.is_warm_started = False
+        self.max_batch_size = max_batch_size or 1
+        self.batch_sizes = Histogram()
+        self.latencies = latencies
+        self.reorder_buffer = ReorderBuffer(reorder_max_size, reorder_max_wait) if reorder_max_size else None
+        self.last_received_at = None
         self.book_snapshot_seq_num = -1
         self.last_output_seq_num = -1
         self.curr_seq_num = 0
         self.error_count = 0
+        self.rebuild_count = 0
+        self.rebuild_task = None
+        self.rebuild_started_at = None
+        self.rebuild_secs = 0
+        self.last_rebuild_secs = None
+        self.num_events = 0
+        self.num_outputs = 0
+        self.sequence_gaps = 0
+        self.rebuild_events = None
+        self.last_reconcile_stats = None
         self.takers_match_prices = {
             OrderSides.BID: {},
             OrderSides.ASK: {}
@@ -33,11 +72,21 @@ class Orderbook:
             OrderSides.BID: SortedDict({}),
             OrderSides.ASK: SortedDict({})
         }
+        self.orders_by_id = {}
         self.bid_values = self.order_sides.get(OrderSides.BID).values()
         self.ask_values = self.order_sides.get(OrderSides.ASK).values()
         self.bid_levels = self.order_sides.get(OrderSides.BID).keys()
         self.ask_levels = self.order_sides.get(OrderSides.ASK).keys()
 
+    @property
+    def num_output_lvls(self):
+        return self._num_output_lvls
+
+    @num_output_lvls.setter
+    def num_output_lvls(self, num_output_lvls):
+        self._num_output_lvls = num_output_lvls
+        self.update_output_boundaries()
+
     async def begin_consume(self):
         start_trigger = await self.event_reader.pipe.get()
         if start_trigger == Pipeline.states.STARTED:
@@ -51,61 +100,367 @@ class Orderbook:
 
     async def consume(self):
         while True:
-            try:
-                event = await self.event_reader.pipe.get()
+            events = await self.next_events()
+            has_output = False
+            for event in events:
                 if event == Pipeline.states.CLOSING_PIPE:
-                    break
-                if self.process_event(event) and self.should_output(event) \
-                        and self.last_output_seq_num < self.curr_seq_num:
-                    self.last_output_seq_num = self.curr_seq_num
-                    output = self.output_formatter()
-                    await self.l2_writer.pipe.put(output)
-                    asyncio.sleep(0)
+                    if has_output:
+                        await self.output_changes()
+                    await self.close_consume()
+                    return
+                if event == Pipeline.states.OVERFLOWED:
+                    self.handle_overflow()
+                    continue
+                self.num_events += 1
+                try:
+                    if self.is_warm_started:
+                        await self.bridge_warm_start(event)
+                    if self.rebuild_events is not None:
+                        self.rebuild_events.append(event)
+                    changed_level = self.process_event(event) if self.latencies is None \
+                        else self.timed_process_event(event)
+                    if changed_level and self.is_in_output_levels(*changed_level):
+                        has_output = True
+                except (AttributeError, EventException, KeyError) as e:
+                    self.handle_error(e, ErrorLvls.ERROR)
+                if self.rebuild_task is not None:
+                    if self.rebuild_task.done():
+                        await self.finish_rebuild()
+                elif self.error_count > self.error_threshold:
+                    self.start_rebuild()
+            # output is decided once per batch, after its last event
+            if has_output:
+                await self.output_changes()
+            if self.checkpointer is not None and self.checkpointer.is_due():
+                await self.checkpointer.save(self)
+
+    def handle_overflow(self):
+        # queued events were dropped so the book has a gap, a rebuild already running is left to finish and starts
+        # again through the error count if its snapshot is older than the gap
+        logging.warning('Events for product {} overflowed its pipeline, rebuilding'.format(self.product_id))
+        if self.rebuild_task is None:
+            self.start_rebuild()
+
+    async def close_consume(self):
+        if self.rebuild_task is not None:
+            await asyncio.wait([self.rebuild_task])
+            await self.finish_rebuild()
+        if self.conflater.pending_updates:
+            await self.publish_output()
+        if self.checkpointer is not None:
+            await self.checkpointer.save(self)
+        if self.batch_sizes.count:
+            logging.info('{} consume batch sizes {}'.format(self.product_id, self.batch_sizes))
+        if self.reorder_buffer is not None and self.reorder_buffer.held_events:
+            logging.info('{} reorder buffer {}'.format(self.product_id, self.reorder_buffer.to_dict()))
+
+    async def output_changes(self):
+        if self.last_output_seq_num < self.curr_seq_num:
+            self.last_output_seq_num = self.curr_seq_num
+            if self.conflater.add_update():
+                await self.publish_output()
+
+    async def next_events(self):
+        # in batch mode whatever is already queued is taken without suspending again, up to max_batch_size events
+        event = await self.next_event()
+        # None is a reorder gap that waited too long on a quiet feed, the buffer escalates it below
+        events = [event] if event is not None else []
+        if self.max_batch_size > 1 and events:
+            pipe = self.event_reader.pipe
+            while len(events) < self.max_batch_size and not pipe.empty() and \
+                    events[-1] != Pipeline.states.CLOSING_PIPE:
+                events.append(pipe.get_nowait())
+            self.batch_sizes.record(len(events))
+        if self.reorder_buffer is not None:
+            events = self.reorder_buffer.reorder(events, self.curr_seq_num)
+        return events
+
+    async def next_event(self):
+        pipe = self.event_reader.pipe
+        # wake up for a finished rebuild, to flush a conflated update once the interval is up or the feed goes quiet,
+        # or to escalate a reorder gap that stayed open for too long
+        while pipe.empty() and (self.rebuild_task is not None or self.conflater.pending_updates or
+                                (self.reorder_buffer is not None and self.reorder_buffer.held)):
+            if self.rebuild_task is not None and self.rebuild_task.done():
+                await self.finish_rebuild()
+                continue
+            get_task = asyncio.ensure_future(pipe.get())
+            waiting_on = {get_task} if self.rebuild_task is None else {get_task, self.rebuild_task}
+            timeouts = [self.conflater.time_left() if self.conflater.pending_updates else None,
+                        self.reorder_buffer.time_left() if self.reorder_buffer is not None else None]
+            timeouts = [timeout for timeout in timeouts if timeout is not None]
+            done, _ = await asyncio.wait(waiting_on, timeout=min(timeouts) if timeouts else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if get_task in done:
+                return get_task.result()
+            get_task.cancel()
+            if not done:
+                if self.conflater.pending_updates and not self.conflater.time_left():
+                    await self.publish_output()
+                if self.reorder_buffer is not None and self.reorder_buffer.time_left() == 0:
+                    return None
+        return await pipe.get()
+
+    def start_rebuild(self):
+        # the live book keeps processing events while the snapshot is fetched, the events are also kept so they
+        # can be replayed on top of the snapshot before it replaces the live book
+        self.rebuild_events = []
+        self.rebuild_started_at = time.monotonic()
+        self.rebuild_task = asyncio.ensure_future(
+            self.http_client.get_orderbook_snapshot(self.product_id, app_config.http.get('timeout'),
+                                                    self.price_format))
+
+    async def finish_rebuild(self):
+        rebuild_task, rebuild_events = self.rebuild_task, self.rebuild_events
+        self.rebuild_task, self.rebuild_events = None, None
+        self.last_rebuild_secs = time.monotonic() - self.rebuild_started_at
+        self.rebuild_secs += self.last_rebuild_secs
+        # on http error reset error count to give http time to recover, continue processing events
+        self.error_count = 0
+        try:
+            book_snapshot = rebuild_task.result()
+            if self.rebuild_mode == RebuildModes.RECONCILE:
+                reconcile_stats = self.reconcile_snapshot(book_snapshot, rebuild_events)
+                should_output = any(self.is_in_output_levels(side, price_key)
+                                    for side, price_key in reconcile_stats.changed_levels)
+            else:
+                self.swap_book(self.replay_onto_snapshot(book_snapshot, rebuild_events))
+                self.request_full_frame()
+                should_output = True
+        except RetryError:
+            logging.error('Unable to get snapshot for product {}'.format(self.product_id))
+            return
+        except SnapshotException as e:
+            logging.error('Unable to rebuild product {} from snapshot, {}'.format(self.product_id, e))
+            return
+        except Exception as e:
+            # a snapshot that can't be applied must not stop consume, the live book is kept until the next rebuild
+            logging.exception('Failed to rebuild product {} from snapshot, {}'.format(self.product_id, e))
+            return
+        self.rebuild_count += 1
+        if self.latencies is not None:
+            self.latencies.rebuilds += 1
+        if should_output and self.conflater.add_update():
+            await self.publish_output()
+
+    def replay_onto_snapshot(self, book_snapshot, events):
+        rebuilt_book = Orderbook(None, None, None, self.product_id, self.num_output_lvls, self.error_threshold,
+                                 self.price_format)
+        rebuilt_book.book_snapshot_seq_num = self.book_snapshot_seq_num
+        rebuilt_book.orderbook_from_snapshot(book_snapshot)
+        for event in events:
+            try:
+                rebuilt_book.process_event(event)
             except (AttributeError, EventException, KeyError) as e:
+                rebuilt_book.handle_error(e, ErrorLvls.ERROR)
+        return rebuilt_book
+
+    def reconcile_snapshot(self, book_snapshot, events=None):
+        snapshot_seq_num = get_snapshot_seq_num(book_snapshot)
+        if snapshot_seq_num is None or snapshot_seq_num <= self.book_snapshot_seq_num:
+            raise SnapshotException("snapshot seq num {} is before order books".format(snapshot_seq_num))
+        # the live book is already past the snapshot, so orders touched by the events newer than the snapshot are
+        # left out of the diff and instead compared to their snapshot state with only those events applied
+        newer_events = [event for event in events or [] if (event.get(EventKeys.SEQ) or 0) > snapshot_seq_num]
+        touched_orders = {}
+        for event in newer_events:
+            order_id = event.get(EventKeys.ORDER_ID) or event.get(EventKeys.MAKER_ID)
+            if order_id is not None:
+                touched_orders[order_id] = None
+        reconcile_stats = self.reconcile(iter_snapshot_orders(book_snapshot, self.price_format), touched_orders)
+        if newer_events:
+            self.replay_onto_orders(touched_orders, newer_events)
+            self.reconcile_touched(reconcile_stats, touched_orders)
+        else:
+            self.curr_seq_num = snapshot_seq_num
+        self.book_snapshot_seq_num = snapshot_seq_num
+        self.last_reconcile_stats = reconcile_stats
+        if reconcile_stats.has_drift():
+            logging.warning("{} reconciled against snapshot {}, {}".format(self.product_id, snapshot_seq_num,
+                                                                          reconcile_stats))
+        return reconcile_stats
+
+    def reconcile(self, target_orders, touched_orders=None):
+        # touched orders are skipped, their snapshot state is kept in touched_orders
+        touched_orders = touched_orders or {}
+        reconcile_stats = ReconcileStats()
+        unseen_order_ids = set(self.orders_by_id)
+        unseen_order_ids.difference_update(touched_orders)
+        for side, price_key, price, size, order_id in target_orders:
+            if order_id in touched_orders:
+                touched_orders[order_id] = (side, price_key, price, size)
+                continue
+            unseen_order_ids.discard(order_id)
+            self.reconcile_order(reconcile_stats, side, price_key, price, size, order_id)
+        for order_id in unseen_order_ids:
+            self.reconcile_phantom(reconcile_stats, order_id)
+        return reconcile_stats
+
+    def reconcile_touched(self, reconcile_stats, touched_orders):
+        for order_id, target_order in touched_orders.items():
+            if target_order is not None:
+                self.reconcile_order(reconcile_stats, *target_order, order_id)
+            elif order_id in self.orders_by_id:
+                self.reconcile_phantom(reconcile_stats, order_id)
+
+    def reconcile_order(self, reconcile_stats, side, price_key, price, size, order_id):
+        order = self.orders_by_id.get(order_id)
+        if order is None:
+            reconcile_stats.missing_orders += 1
+            self.add_order(side, price_key, price, size, order_id)
+        elif order.level.side != side or order.level.price_key != price_key:
+            reconcile_stats.moved_orders += 1
+            reconcile_stats.changed_levels.add((order.level.side, order.level.price_key))
+            self.remove_order(order_id)
+            self.add_order(side, price_key, price, size, order_id)
+        else:
+            if order.size == size:
+                return
+            reconcile_stats.size_mismatches += 1
+            order.level.total_size += size - order.size
+            order.size = size
+        reconcile_stats.changed_levels.add((side, price_key))
+
+    def reconcile_phantom(self, reconcile_stats, order_id):
+        reconcile_stats.phantom_orders += 1
+        level = self.remove_order(order_id).level
+        reconcile_stats.changed_levels.add((level.side, level.price_key))
+
+    def replay_onto_orders(self, orders, events):
+        # applies events to (side, price_key, price, size) tuples by order id the way process_event applies them
+        # to the book, None is an order that is not on the book
+        for event in events:
+            try:
+                if not should_process_event(event):
+                    continue
+                event_type = event.get(EventKeys.TYPE)
+                order_id = event.get(EventKeys.ORDER_ID) or event.get(EventKeys.MAKER_ID)
+                event_size = event.get(EventKeys.REMAINING_SIZE) or event.get(EventKeys.SIZE)
+                if event_type == EventOrderTypes.OPEN:
+                    price_key, price = self.price_format.parse_price(event.get(EventKeys.PRICE))
+                    orders[order_id] = (get_book_side(event.get(EventKeys.SIDE)), price_key, price,
+                                        self.price_format.parse_size(event_size))
+                elif event_type == EventOrderTypes.MATCH:
+                    order = orders.get(order_id)
+                    if order is None:
+                        raise EventException("match not on book for event {}".format(event), event)
+                    size, _, _ = self.price_format.reduce_size(order[3], event_size)
+                    orders[order_id] = order[:3] + (size,)
+                elif event_type == EventOrderTypes.DONE and event[EventKeys.REASON] in [EventDoneReasons.CANCEL,
+                                                                                         EventDoneReasons.FILLED]:
+                    orders[order_id] = None
+            except (ValueError, TypeError, ArithmeticError, KeyError, EventException) as e:
                 self.handle_error(e, ErrorLvls.ERROR)
-            if self.error_count > self.error_threshold:
-                try:
-                    await self.build_orderbook()
-                # on http error tell reset error count to give http time to recover, continue processing events
-                except RetryError:
-                    logging.error('Unable to get snapshot for product {}'.format(self.product_id))
-                finally:
-                    self.error_count = 0
+
+    def iter_orders(self):
+        for orderbook_side in self.order_sides.values():
+            for level in orderbook_side.values():
+                for order in level:
+                    yield level.side, level.price_key, level.price, order.size, order.order_id
+
+    def swap_book(self, orderbook):
+        self.order_sides = orderbook.order_sides
+        self.orders_by_id = orderbook.orders_by_id
+        self.bid_values = orderbook.bid_values
+        self.ask_values = orderbook.ask_values
+        self.bid_levels = orderbook.bid_levels
+        self.ask_levels = orderbook.ask_levels
+        self.update_output_boundaries()
+        self.curr_seq_num = orderbook.curr_seq_num
+        self.book_snapshot_seq_num = orderbook.book_snapshot_seq_num
+        self.error_count = orderbook.error_count
+
+    async def publish_output(self):
+        self.conflater.mark_published()
+        started_at = time.perf_counter_ns() if self.latencies is not None else None
+        output = self.output_formatter()
+        if output is not None:
+            self.num_outputs += 1
+            await self.l2_writer.put(output)
+            if started_at is not None:
+                self.record_output_latencies(started_at)
+
+    def timed_process_event(self, event):
+        # the event's receive stamp is kept for the total latency of the output it may cause
+        started_at = time.perf_counter_ns()
+        histograms = self.latencies.histograms
+        dispatched_at = event.get(EventKeys.DISPATCHED_AT)
+        if dispatched_at is not None:
+            histograms[Stages.QUEUE].record(started_at - dispatched_at)
+        self.last_received_at = event.get(EventKeys.RECEIVED_AT)
+        try:
+            return self.process_event(event)
+        finally:
+            histograms[Stages.PROCESS].record(time.perf_counter_ns() - started_at)
+
+    def record_output_latencies(self, started_at):
+        published_at = time.perf_counter_ns()
+        self.latencies.histograms[Stages.OUTPUT].record(published_at - started_at)
+        if self.last_received_at is not None:
+            self.latencies.histograms[Stages.TOTAL].record(published_at - self.last_received_at)
 
     def process_event(self, event):
         if self.is_valid_seq_num(event) and should_process_event(event):
             event_type = event.get(EventKeys.TYPE)
-            price = event.get(EventKeys.PRICE)
-            price_key = float(price)
+            try:
+                price_key, price = self.price_format.parse_price(event.get(EventKeys.PRICE))
+            except ValueError:
+                raise EventException("price not on the book's price increments for {}".format(event), event)
             order_id = event.get(EventKeys.ORDER_ID) or event.get(EventKeys.MAKER_ID)
             event_size = event.get(EventKeys.REMAINING_SIZE) or event.get(EventKeys.SIZE)
             order_side = get_book_side(event.get(EventKeys.SIDE))
-            orderbook_side = self.order_sides.get(order_side)
-            orders = orderbook_side.get(price_key)
+            orders = self.order_sides.get(order_side).get(price_key)
             if event_type == EventOrderTypes.OPEN:
-                orderbook_side.setdefault(price_key, []).append([price, event_size, order_id])
+                try:
+                    size = self.price_format.parse_size(event_size)
+                except (ValueError, TypeError, ArithmeticError):
+                    raise EventException("size not on the book's size increments for {}".format(event), event)
+                self.add_order(order_side, price_key, price, size, order_id)
             elif event_type == EventOrderTypes.MATCH:
                 try:
-                    order = next(order for order in orders if order[OrderIndexes.ORDER_ID] == order_id)
-                    new_size = Decimal(order[OrderIndexes.SIZE]) - Decimal(event_size)
-                    if new_size < 0:
+                    order = self.orders_by_id[order_id]
+                    order.size, filled_size, overfilled = self.price_format.reduce_size(order.size, event_size)
+                    order.level.total_size -= filled_size
+                    if overfilled:
                         self.handle_error("match size larger than book size for {}".format(event), ErrorLvls.WARN)
-                    order[OrderIndexes.SIZE] = str(max(new_size, 0))
-                except (ValueError, TypeError, StopIteration, KeyError):
+                except (ValueError, TypeError, KeyError, ArithmeticError):
                     raise EventException("match not on book for event {}".format(event), event)
             elif event_type == EventOrderTypes.DONE and (
                     event[EventKeys.REASON] == EventDoneReasons.CANCEL or (
                     event[EventKeys.REASON] == EventDoneReasons.FILLED and orders is not None)):
                 try:
-                    order_index = next(i for i, order in enumerate(orders) if order[OrderIndexes.ORDER_ID] == order_id)
-                    orders.pop(order_index)
-                    if not orders:
-                        del orderbook_side[price_key]
-                except (ValueError, TypeError, StopIteration, KeyError):
+                    self.remove_order(order_id)
+                except (ValueError, KeyError):
                     raise EventException("filled/canceled should be on book for {}".format(event), event)
             else:
                 return False
-            return True
+            return order_side, price_key
+
+    def get_order(self, order_id):
+        return self.orders_by_id.get(order_id)
+
+    def add_order(self, order_side, price_key, price, size, order_id):
+        # an order id already on the book is replaced so its level total and orders_by_id stay in step
+        if order_id in self.orders_by_id:
+            self.remove_order(order_id)
+        orderbook_side = self.order_sides.get(order_side)
+        level = orderbook_side.get(price_key)
+        if level is None:
+            level = orderbook_side[price_key] = PriceLevel(order_side, price_key, price)
+            self.level_changed(order_side, price_key)
+        order = Order(size, order_id)
+        level.add_order(order)
+        self.orders_by_id[order_id] = order
+        return order
+
+    def remove_order(self, order_id):
+        order = self.orders_by_id.pop(order_id)
+        level = order.level
+        level.remove_order(order)
+        if not level:
+            del self.order_sides.get(level.side)[level.price_key]
+            self.level_changed(level.side, level.price_key)
+        return order
 
     def is_valid_seq_num(self, event):
         try:
@@ -113,6 +468,7 @@ class Orderbook:
             if event_seq_num <= self.curr_seq_num:
                 return False
             if self.curr_seq_num + 1 < event_seq_num:
+                self.sequence_gaps += 1
                 self.handle_error("jump in sequence number between book-{} and event-{}"
                                   .format(self.curr_seq_num, event_seq_num), ErrorLvls.WARN)
             if event_seq_num > self.curr_seq_num:
@@ -122,52 +478,119 @@ class Orderbook:
             raise EventException("seq number key is missing", event)
 
     async def build_orderbook(self):
+        if self.checkpointer is not None and self.warm_start():
+            return
         init_snapshot = await self.http_client.get_orderbook_snapshot(self.product_id,
-                                                                      app_config.http.get('timeout'))
+                                                                      app_config.http.get('timeout'),
+                                                                      self.price_format)
         self.orderbook_from_snapshot(init_snapshot)
 
+    def warm_start(self):
+        checkpoint = self.checkpointer.load()
+        if checkpoint is None:
+            return False
+        try:
+            self.orderbook_from_snapshot(checkpoint)
+        except SnapshotException as e:
+            logging.warning('Unable to warm start product {} from checkpoint, {}'.format(self.product_id, e))
+            return False
+        self.book_snapshot_seq_num = checkpoint.get(CheckpointKeys.SNAPSHOT_SEQ, self.book_snapshot_seq_num)
+        for event in self.checkpointer.journal_events(self.curr_seq_num + 1):
+            try:
+                self.process_event(event)
+            except (AttributeError, EventException, KeyError) as e:
+                self.handle_error(e, ErrorLvls.ERROR)
+        # whether the book is usable is only known once the first live event shows if there is a gap
+        self.is_warm_started = True
+        logging.info('Warm started product {} from checkpoint at {}'.format(self.product_id, self.curr_seq_num))
+        return True
+
+    async def bridge_warm_start(self, event):
+        self.is_warm_started = False
+        event_seq_num = event.get(EventKeys.SEQ)
+        if event_seq_num is None or event_seq_num <= self.curr_seq_num + 1:
+            return
+        logging.warning('Checkpoint of product {} at {} does not reach the feed at {}, loading a snapshot'
+                        .format(self.product_id, self.curr_seq_num, event_seq_num))
+        try:
+            book_snapshot = await self.http_client.get_orderbook_snapshot(self.product_id,
+                                                                          app_config.http.get('timeout'),
+                                                                          self.price_format)
+            self.orderbook_from_snapshot(book_snapshot)
+        except RetryError:
+            logging.error('Unable to get snapshot for product {}'.format(self.product_id))
+            self.error_count = self.error_threshold + 1
+        except SnapshotException as e:
+            logging.error('Unable to load snapshot for product {}, {}'.format(self.product_id, e))
+            self.error_count = self.error_threshold + 1
+
     def orderbook_from_snapshot(self, book_snapshot):
-        snapshot_seq_num = book_snapshot.get(EventKeys.SEQ)
+        snapshot_seq_num = get_snapshot_seq_num(book_snapshot)
         if snapshot_seq_num is None or snapshot_seq_num <= self.book_snapshot_seq_num:
             raise SnapshotException("snapshot seq num {} is before order books".format(snapshot_seq_num))
-        [values.clear() for values in self.order_sides.values()]
-        for side in [OrderSides.BID, OrderSides.ASK]:
-            orderbook_side = self.order_sides.get(side)
-            if book_snapshot.get(side) is not None:
-                for index, order in enumerate(book_snapshot.get(side)):
-                    if order and len(order) == 3:
-                        price = float(order[OrderIndexes.PRICE])
-                        orderbook_side.setdefault(price, []).append(order)
-                    else:
-                        logging.warning("{}, {}, order {} is empty".format(snapshot_seq_num, side, index))
-            else:
-                logging.warning("{} has no {} orders".format(snapshot_seq_num, side))
+        get_snapshot_loader(book_snapshot, self.price_format).load_into(self)
         self.curr_seq_num = snapshot_seq_num
         self.book_snapshot_seq_num = snapshot_seq_num
+        self.request_full_frame()
 
     def should_output(self, event):
-        try:
-            price = float(event.get(EventKeys.PRICE))
-            if event.get(EventKeys.SIDE) == EventSides.SELL:
-                return (len(self.ask_levels) < self.num_output_lvls + 1
-                        or price < self.ask_levels[self.num_output_lvls])
-            elif event.get(EventKeys.SIDE) == EventSides.BUY:
-                num_bid_lvls = len(self.bid_levels)
-                return (num_bid_lvls < self.num_output_lvls + 1 or
-                        price > self.bid_levels[num_bid_lvls - self.num_output_lvls - 1])
-        except IndexError as e:
-            logging.error("Should output index out of bounds error for event {}".format(e))
-            return False
+        price, _ = self.price_format.parse_price(event.get(EventKeys.PRICE))
+        return self.is_in_output_levels(get_book_side(event.get(EventKeys.SIDE)), price)
+
+    def is_in_output_levels(self, order_side, price_key):
+        # the boundary is the first level past the output levels, None while a side has no more levels than that
+        boundary = self.output_boundaries.get(order_side)
+        if order_side == OrderSides.ASK:
+            return boundary is None or price_key < boundary
+        elif order_side == OrderSides.BID:
+            return boundary is None or price_key > boundary
+        return False
+
+    def level_changed(self, order_side, price_key):
+        # creating or removing a level only moves the boundary when it happens at or inside the boundary
+        boundary = self.output_boundaries.get(order_side)
+        if boundary is None or (price_key <= boundary if order_side == OrderSides.ASK else price_key >= boundary):
+            self.update_output_boundary(order_side)
+
+    def update_output_boundaries(self):
+        self.update_output_boundary(OrderSides.BID)
+        self.update_output_boundary(OrderSides.ASK)
+
+    def update_output_boundary(self, order_side):
+        levels = self.ask_levels if order_side == OrderSides.ASK else self.bid_levels
+        if len(levels) > self._num_output_lvls:
+            self.output_boundaries[order_side] = levels[self._num_output_lvls if order_side == OrderSides.ASK
+                                                        else -self._num_output_lvls - 1]
+        else:
+            self.output_boundaries[order_side] = None
 
     def output_formatter(self):
+        if self.delta_formatter is not None:
+            return self.delta_formatter.next_frame(self)
+        if self.output_mode == OutputModes.L2:
+            return self.l2_output_formatter()
+        return self.l3_output_formatter()
+
+    def request_full_frame(self):
+        if self.delta_formatter is not None:
+            self.delta_formatter.request_full_frame()
+
+    def top_levels(self, side):
+        levels = self.order_sides.get(side).items()
+        if side == OrderSides.BID:
+            return reversed(levels[max(len(levels) - self.num_output_lvls, 0):])
+        return levels[:self.num_output_lvls]
+
+    def l3_output_formatter(self):
         output_bids, output_asks = [], []
         bid_values_len = len(self.bid_values)
         ask_values_len = len(self.ask_values)
+        format_level = self.price_format.format_level
         for i in range(self.num_output_lvls):
             if i < bid_values_len:
-                output_bids.extend(self.bid_values[bid_values_len - i - 1])
+                output_bids.extend(format_level(self.bid_values[bid_values_len - i - 1]))
             if i < ask_values_len:
-                output_asks.extend(self.ask_values[i])
+                output_asks.extend(format_level(self.ask_values[i]))
         return {
             "product_id": self.product_id,
             "sequence": self.curr_seq_num,
@@ -175,12 +598,29 @@ class Orderbook:
             "asks": output_asks
         }
 
+    def l2_output_formatter(self):
+        format_price = self.price_format.format_price
+        format_size = self.price_format.format_size
+        num_bid_lvls = len(self.bid_values)
+        top_bids = self.bid_values[max(num_bid_lvls - self.num_output_lvls, 0):]
+        top_asks = self.ask_values[:self.num_output_lvls]
+        return {
+            "product_id": self.product_id,
+            "sequence": self.curr_seq_num,
+            "bids": [[format_price(level.price), format_size(level.total_size), len(level)]
+                     for level in reversed(top_bids)],
+            "asks": [[format_price(level.price), format_size(level.total_size), len(level)]
+                     for level in top_asks]
+        }
+
     def handle_error(self, msg, logginglevel):
         if logginglevel == ErrorLvls.WARN:
             logging.warning(msg)
         else:
             logging.error(msg)
         self.error_count += 1
+        if self.latencies is not None:
+            self.latencies.errors += 1
 
 
 def get_book_side(event_side):
@@ -0,0 +1,93 @@
+from decimal import Decimal
+
+
+class DecimalFormat:
+    """
+    Default book representation: levels are keyed on float(price) and keep the price string they
+    arrived with, order sizes, level totals and matches are Decimal
+    """
+    def parse_price(self, price):
+        return float(price), price
+
+    def parse_size(self, size):
+        return Decimal(size)
+
+    def reduce_size(self, size, matched_size):
+        new_size = size - Decimal(matched_size)
+        remaining_size = new_size if new_size > 0 else ZERO
+        return remaining_size, size - remaining_size, new_size < 0
+
+    def format_price(self, price):
+        return price
+
+    def format_size(self, size):
+        return '{:f}'.format(size) if size else '0'
+
+    def format_level(self, level):
+        price = level.price
+        return [[price, '{:f}'.format(order.size) if order.size else '0', order.order_id] for order in level]
+
+
+class FixedPointFormat:
+    """
+    Prices and sizes are parsed once into integer multiples of the product's increments and
+    every book operation stays in integer arithmetic. Strings are only built for output
+    """
+    def __init__(self, price_increment, size_increment):
+        self.price_decimals = get_increment_decimals(price_increment)
+        self.size_decimals = get_increment_decimals(size_increment)
+
+    def parse_price(self, price):
+        price_ticks = to_fixed_point(price, self.price_decimals)
+        return price_ticks, price_ticks
+
+    def parse_size(self, size):
+        return to_fixed_point(size, self.size_decimals)
+
+    def reduce_size(self, size, matched_size):
+        new_size = size - to_fixed_point(matched_size, self.size_decimals)
+        remaining_size = max(new_size, 0)
+        return remaining_size, size - remaining_size, new_size < 0
+
+    def format_price(self, price):
+        return from_fixed_point(price, self.price_decimals)
+
+    def format_size(self, size):
+        return from_fixed_point(size, self.size_decimals)
+
+    def format_level(self, level):
+        price = from_fixed_point(level.price, self.price_decimals)
+        return [[price, from_fixed_point(order.size, self.size_decimals), order.order_id] for order in level]
+
+
+ZERO = Decimal(0)
+
+
+def get_increment_decimals(increment):
+    exponent = Decimal(increment).normalize().as_tuple()
+    if exponent.digits != (1,) or exponent.exponent > 0:
+        raise ValueError("increment {} is not a power of ten".format(increment))
+    return -exponent.exponent
+
+
+def to_fixed_point(value, decimals):
+    whole, _, fraction = value.partition('.')
+    if len(fraction) > decimals:
+        if fraction[decimals:].strip('0'):
+            raise ValueError("{} is finer than {} decimal places".format(value, decimals))
+        fraction = fraction[:decimals]
+    return int(whole + fraction.ljust(decimals, '0') or '0')
+
+
+def from_fixed_point(value, decimals):
+    if not decimals:
+        return str(value)
+    whole, fraction = divmod(abs(value), 10 ** decimals)
+    return '{}{}.{:0{}d}'.format('-' if value < 0 else '', whole, fraction, decimals)
+
+
+def get_price_format(product_id, fixed_point_products):
+    increments = (fixed_point_products or {}).get(product_id)
+    if increments is None:
+        return DecimalFormat()
+    return FixedPointFormat(increments.get('quote_increment'), increments.get('base_increment'))
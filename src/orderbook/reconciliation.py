@@ -0,0 +1,27 @@
+from src.orderbook.snapshot_loader import get_snapshot_loader
+
+
+class ReconcileStats:
+    """
+    Drift found between a live book and the snapshot it was reconciled against.
+    phantom orders were on the live book but not the snapshot, missing orders were in the snapshot but not
+    on the live book, moved orders were found at a different side or price
+    """
+    def __init__(self):
+        self.phantom_orders = 0
+        self.missing_orders = 0
+        self.moved_orders = 0
+        self.size_mismatches = 0
+        self.changed_levels = set()
+
+    def has_drift(self):
+        return bool(self.phantom_orders or self.missing_orders or self.moved_orders or self.size_mismatches)
+
+    def __str__(self):
+        return "phantom orders {}, missing orders {}, moved orders {}, size mismatches {}, changed levels {}".format(
+            self.phantom_orders, self.missing_orders, self.moved_orders, self.size_mismatches,
+            len(self.changed_levels))
+
+
+def iter_snapshot_orders(book_snapshot, price_format):
+    yield from get_snapshot_loader(book_snapshot, price_format).iter_orders()
@@ -0,0 +1,94 @@
+import time
+
+from src.event.metadata import EventKeys
+
+
+class ReorderBuffer:
+    """
+    Holds events that arrive ahead of the book's next sequence number and releases them in sequence order once
+    the missing events arrive, so out of order delivery doesn't show up as a gap. A gap that is still open once
+    more than max_size events are held or max_wait seconds after it opened is escalated: the held events are
+    released as they are and the book sees the jump in sequence numbers. Without a max_wait only max_size
+    escalates. A gap the book moved past on its own, by a rebuild, is neither healed nor escalated
+    """
+    def __init__(self, max_size, max_wait=None):
+        self.max_size = max_size
+        self.max_wait = max_wait or 0
+        self.held = {}
+        self.gap_opened_at = None
+        self.next_seq_num = None
+        self.healed_gaps = 0
+        self.escalated_gaps = 0
+        self.rebuilt_gaps = 0
+        self.held_events = 0
+
+    def reorder(self, events, curr_seq_num):
+        """
+        The events ready to be processed after curr_seq_num, in order. Events without a sequence, stale events
+        and pipeline states pass straight through, a state flushes everything held before it
+        """
+        released = []
+        next_seq_num = curr_seq_num + 1
+        if self.held and next_seq_num != self.next_seq_num:
+            # a rebuild moved the book, events it is now past are dropped and the rest may follow on from it
+            for seq_num in [seq_num for seq_num in self.held if seq_num < next_seq_num]:
+                del self.held[seq_num]
+            self.rebuilt_gaps += 1
+            if not self.held:
+                self.gap_opened_at = None
+            next_seq_num = self.release_held(released, next_seq_num, is_healed=False)
+        for event in events:
+            seq_num = event.get(EventKeys.SEQ) if isinstance(event, dict) else None
+            if seq_num is None or seq_num < next_seq_num:
+                if not isinstance(event, dict):
+                    next_seq_num = self.escalate(released, next_seq_num)
+                released.append(event)
+            elif seq_num == next_seq_num:
+                released.append(event)
+                next_seq_num = self.release_held(released, next_seq_num + 1)
+            elif seq_num not in self.held:
+                self.held[seq_num] = event
+                self.held_events += 1
+                if self.gap_opened_at is None:
+                    self.gap_opened_at = time.monotonic()
+        if self.held and (len(self.held) > self.max_size or self.time_left() == 0):
+            next_seq_num = self.escalate(released, next_seq_num)
+        self.next_seq_num = next_seq_num
+        return released
+
+    def release_held(self, released, next_seq_num, is_healed=True):
+        if not self.held or next_seq_num not in self.held:
+            return next_seq_num
+        while next_seq_num in self.held:
+            released.append(self.held.pop(next_seq_num))
+            next_seq_num += 1
+        if is_healed:
+            self.healed_gaps += 1
+        # events still held are waiting on a newer gap
+        self.gap_opened_at = time.monotonic() if self.held else None
+        return next_seq_num
+
+    def escalate(self, released, next_seq_num):
+        if not self.held:
+            return next_seq_num
+        seq_nums = sorted(self.held)
+        released.extend(self.held[seq_num] for seq_num in seq_nums)
+        self.held = {}
+        self.gap_opened_at = None
+        self.escalated_gaps += 1
+        return seq_nums[-1] + 1
+
+    def time_left(self):
+        # None while there is no deadline
+        if self.gap_opened_at is None or not self.max_wait:
+            return None
+        return max(self.max_wait - (time.monotonic() - self.gap_opened_at), 0)
+
+    def to_dict(self):
+        return {
+            "held": len(self.held),
+            "held_events": self.held_events,
+            "healed_gaps": self.healed_gaps,
+            "escalated_gaps": self.escalated_gaps,
+            "rebuilt_gaps": self.rebuilt_gaps
+        }
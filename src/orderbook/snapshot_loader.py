@@ -0,0 +1,115 @@
+import logging
+
+from src.event.metadata import EventKeys
+from src.orderbook.levels import Order, PriceLevel
+from src.orderbook.metadata import OrderSides
+
+
+class SnapshotLoader:
+    """
+    Groups snapshot orders into price levels in a single pass so each side of the book can be built with
+    one SortedDict construction instead of an insertion per level. Level 3 snapshots are sorted by price,
+    so the price of the previous order is reused instead of being parsed again, and sizes repeat often
+    enough that orders with the same size string share one parsed size
+    """
+    def __init__(self, price_format, snapshot_seq_num):
+        self.price_format = price_format
+        self.snapshot_seq_num = snapshot_seq_num
+        self.levels = {
+            OrderSides.BID: {},
+            OrderSides.ASK: {}
+        }
+        self.orders_by_id = {}
+        self.sizes = {}
+
+    def add_orders(self, side, orders, first_index=0):
+        levels = self.levels.get(side)
+        orders_by_id = self.orders_by_id
+        sizes = self.sizes
+        parse_price = self.price_format.parse_price
+        parse_size = self.price_format.parse_size
+        prev_price = None
+        level = price_key = None
+        for index, order in enumerate(orders, first_index):
+            try:
+                price, size, order_id = order
+            except (TypeError, ValueError):
+                logging.warning("{}, {}, order {} is empty".format(self.snapshot_seq_num, side, index))
+                continue
+            if order_id in orders_by_id:
+                logging.warning("{}, {}, order {} is a duplicate of order id {}".format(self.snapshot_seq_num, side,
+                                                                                     index, order_id))
+                continue
+            try:
+                if price != prev_price:
+                    prev_price = level = None
+                    price_key, book_price = parse_price(price)
+                    prev_price = price
+                size_value = sizes.get(size)
+                if size_value is None:
+                    size_value = sizes[size] = parse_size(size)
+            except (TypeError, ValueError, ArithmeticError):
+                logging.warning("{}, {}, order {} is invalid".format(self.snapshot_seq_num, side, index))
+                continue
+            # the level is only created once an order for it parsed, so invalid orders leave no empty levels
+            if level is None:
+                level = levels.get(price_key)
+                if level is None:
+                    level = levels[price_key] = PriceLevel(side, price_key, book_price)
+            order = orders_by_id[order_id] = Order(size_value, order_id)
+            level.add_order(order)
+
+    def iter_orders(self):
+        for side, levels in self.levels.items():
+            for level in levels.values():
+                for order in level:
+                    yield side, level.price_key, level.price, order.size, order.order_id
+
+    def copy(self):
+        # load_into hands the levels and orders to the book, so a loader shared by several books is copied
+        snapshot_loader = SnapshotLoader(self.price_format, self.snapshot_seq_num)
+        snapshot_loader.sizes = self.sizes
+        for side, levels in self.levels.items():
+            copied_levels = snapshot_loader.levels.get(side)
+            for price_key, level in levels.items():
+                copied_level = copied_levels[price_key] = PriceLevel(side, price_key, level.price)
+                for order in level:
+                    copied_order = snapshot_loader.orders_by_id[order.order_id] = Order(order.size, order.order_id)
+                    copied_level.add_order(copied_order)
+        return snapshot_loader
+
+    def load_into(self, orderbook):
+        for side, levels in self.levels.items():
+            orderbook_side = orderbook.order_sides.get(side)
+            orderbook_side.clear()
+            orderbook_side.update(levels)
+        orderbook.orders_by_id = self.orders_by_id
+        orderbook.update_output_boundaries()
+
+
+def copy_snapshot(book_snapshot):
+    # parsed json snapshots are only read, a loader is taken over by the book it is loaded into
+    if isinstance(book_snapshot, SnapshotLoader):
+        return book_snapshot.copy()
+    return book_snapshot
+
+
+def get_snapshot_seq_num(book_snapshot):
+    # snapshots are either parsed json or, when streamed, a loader that already holds the orders
+    if isinstance(book_snapshot, SnapshotLoader):
+        return book_snapshot.snapshot_seq_num
+    return book_snapshot.get(EventKeys.SEQ)
+
+
+def get_snapshot_loader(book_snapshot, price_format):
+    # parsed json snapshots are grouped by a loader, which skips empty, invalid and duplicate orders
+    if isinstance(book_snapshot, SnapshotLoader):
+        return book_snapshot
+    snapshot_seq_num = get_snapshot_seq_num(book_snapshot)
+    snapshot_loader = SnapshotLoader(price_format, snapshot_seq_num)
+    for side in [OrderSides.BID, OrderSides.ASK]:
+        if book_snapshot.get(side) is not None:
+            snapshot_loader.add_orders(side, book_snapshot.get(side))
+        else:
+            logging.warning("{} has no {} orders".format(snapshot_seq_num, side))
+    return snapshot_loader
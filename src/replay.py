@@ -0,0 +1,144 @@
+"""
+Replays a recorded level 3 snapshot and newline delimited feed through the same EventDispatcher and Orderbook
+path as the live feed, outputs are written to a file by the same output writer as the app, one json object per
+line unless another format is chosen.
+e.g. python -m src.replay tests/resources/btc_eur/1st_snapshot.txt
+         tests/resources/btc_eur/newer_than_1st_snapshot_feed.txt output/replay.txt --pacing realtime --speed 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from src.event.metadata import EventKeys
+from src.io.dispatchers import EventDispatcher
+from src.io.io_interfaces import Pipeline, StaticSnapshotClient
+from src.io.output_codecs import codecs
+from src.io.writers import FileWriter, write_outputs
+from src.factories import create_orderbook
+
+
+class Pacings:
+    FAST = 'fast'
+    REALTIME = 'realtime'
+
+
+class FeedPacer:
+    """
+    Holds each event back until as much time has passed since the first event as between their timestamps,
+    divided by speed. Events without a timestamp are not held back
+    """
+    def __init__(self, speed=None):
+        self.speed = speed or 1
+        self.first_event_time = None
+        self.start_time = None
+
+    async def wait_for(self, event):
+        event_time = get_event_time(event)
+        if event_time is None:
+            return
+        if self.first_event_time is None:
+            self.first_event_time = event_time
+            self.start_time = time.monotonic()
+            return
+        delay = (event_time - self.first_event_time).total_seconds() / self.speed - \
+            (time.monotonic() - self.start_time)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class ReplayStats:
+    def __init__(self):
+        self.num_events = 0
+        self.num_outputs = 0
+        self.elapsed = 0
+
+    def __str__(self):
+        return "replayed {} events, {} outputs in {:.3f}s, {:.0f} events/s".format(
+            self.num_events, self.num_outputs, self.elapsed, self.num_events / self.elapsed if self.elapsed else 0)
+
+
+def get_event_time(event):
+    try:
+        return datetime.strptime(event.get(EventKeys.TIME), '%Y-%m-%dT%H:%M:%S.%fZ')
+    except (TypeError, ValueError):
+        return None
+
+
+def read_feed(feed_file):
+    for line in feed_file:
+        if line.strip():
+            yield json.loads(line)
+
+
+async def replay(book_snapshot, events, output_writer, product_id, pacing=None, speed=None, yield_every=100):
+    replay_stats = ReplayStats()
+    pacer = FeedPacer(speed) if pacing == Pacings.REALTIME else None
+    l2_writer = Pipeline(asyncio.Queue())
+    event_reader = Pipeline(asyncio.Queue())
+    orderbook = create_orderbook(product_id, event_reader, l2_writer, StaticSnapshotClient({product_id: book_snapshot}))
+    # the writer is closed by write_outputs once the outputs are written
+    output_writer.start()
+    writer_task = asyncio.ensure_future(write_outputs(l2_writer, output_writer))
+    consume_task = asyncio.ensure_future(orderbook.begin_consume())
+    dispatcher = EventDispatcher({product_id: event_reader})
+    start_time = time.perf_counter()
+    for event in events:
+        if pacer is not None:
+            await pacer.wait_for(event)
+        elif replay_stats.num_events % yield_every == 0:
+            # let the book catch up so the whole feed is not queued up in memory
+            await asyncio.sleep(0)
+        await dispatcher.dispatch(event)
+        replay_stats.num_events += 1
+    if event_reader.state == Pipeline.states.NOT_STARTED:
+        consume_task.cancel()
+    else:
+        await event_reader.put(Pipeline.states.CLOSING_PIPE)
+        await consume_task
+    replay_stats.elapsed = time.perf_counter() - start_time
+    replay_stats.num_outputs = orderbook.num_outputs
+    await l2_writer.put(Pipeline.states.CLOSING_PIPE)
+    await writer_task
+    return replay_stats
+
+
+def get_product_id(feed_path):
+    with open(feed_path, 'r') as feed_file:
+        for event in read_feed(feed_file):
+            if event.get(EventKeys.PRODUCT_ID) is not None:
+                return event.get(EventKeys.PRODUCT_ID)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='replay a recorded snapshot and feed through an orderbook')
+    parser.add_argument('snapshot', help='level 3 snapshot json file')
+    parser.add_argument('feed', help='newline delimited json feed file')
+    parser.add_argument('output', help='file the book outputs are written to')
+    parser.add_argument('--product-id', help='product to replay, defaults to the first product in the feed')
+    parser.add_argument('--pacing', choices=[Pacings.FAST, Pacings.REALTIME], default=Pacings.FAST,
+                        help="'fast' replays as fast as possible, 'realtime' follows the event timestamps")
+    parser.add_argument('--speed', type=float, default=1, help='realtime pacing speed up, e.g. 10 for 10x')
+    parser.add_argument('--format', choices=list(codecs), help="output format, 'jsonl' by default")
+    args = parser.parse_args(args)
+    product_id = args.product_id or get_product_id(args.feed)
+    with open(args.snapshot, 'r') as snapshot_file:
+        book_snapshot = json.loads(snapshot_file.read())
+    # the file writer appends, a replay starts a new output file
+    if os.path.exists(args.output):
+        os.remove(args.output)
+    with open(args.feed, 'r') as feed_file:
+        loop = asyncio.get_event_loop()
+        replay_stats = loop.run_until_complete(replay(book_snapshot, read_feed(feed_file),
+                                                      FileWriter(args.output, args.format), product_id,
+                                                      args.pacing, args.speed))
+    logging.info('{} {}'.format(product_id, replay_stats))
+    return replay_stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
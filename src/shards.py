@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+
+import aiohttp
+
+from src import app_config
+from src.event.metadata import EventKeys
+from src.factories import create_latency_tracker, create_orderbook, create_pipeline, create_snapshot_client, \
+    get_checkpointer, request_full_frame, start_latency_dumps, stop_latency_dumps
+from src.io.dispatchers import EventDispatcher
+from src.io.io_interfaces import Pipeline, StaticSnapshotClient
+
+
+def assign_shards(product_ids, num_shards):
+    shards = [[] for _ in range(max(min(num_shards, len(product_ids)), 1))]
+    for index, product in enumerate(product_ids):
+        shards[index % len(shards)].append(product)
+    return shards
+
+
+class ShardPool:
+    """
+    Runs the books of the subscribed products in worker processes, each worker owns the books of its products
+    on its own event loop. The pool is the feed's dispatcher: events are routed to the worker owning their
+    product in batches, a batch is sent once it holds batch_size events or at the end of the current loop
+    iteration so a quiet feed is not held back. Worker outputs are merged back with merge_outputs
+    """
+    def __init__(self, product_ids, num_shards, batch_size=None, snapshots=None, poll_interval=None):
+        self.shards = assign_shards(product_ids, num_shards)
+        self.batch_size = batch_size or 100
+        self.poll_interval = poll_interval or 0.1
+        self.snapshots = snapshots
+        self.product_shards = {product: index for index, products in enumerate(self.shards) for product in products}
+        self.batches = [[] for _ in self.shards]
+        self.event_queues = []
+        self.output_queue = None
+        self.processes = []
+        self.flush_handle = None
+        self.sent_batches = 0
+
+    def start(self):
+        context = multiprocessing.get_context('spawn')
+        self.output_queue = context.Queue()
+        for products in self.shards:
+            event_queue = context.Queue()
+            process = context.Process(target=run_shard, args=(products, event_queue, self.output_queue,
+                                                              self.snapshots), daemon=True)
+            process.start()
+            self.event_queues.append(event_queue)
+            self.processes.append(process)
+
+    async def dispatch(self, event):
+        shard = self.product_shards.get(event.get(EventKeys.PRODUCT_ID))
+        if shard is None:
+            logging.error("Pipe doesn't exist for {}".format(event))
+            return
+        batch = self.batches[shard]
+        batch.append(event)
+        if len(batch) >= self.batch_size:
+            self.send_batch(shard)
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_event_loop().call_soon(self.flush)
+
+    def flush(self):
+        self.flush_handle = None
+        for shard, batch in enumerate(self.batches):
+            if batch:
+                self.send_batch(shard)
+
+    def send_batch(self, shard):
+        self.event_queues[shard].put(self.batches[shard])
+        self.batches[shard] = []
+        self.sent_batches += 1
+
+    async def merge_outputs(self, l2_writer):
+        # the queue is polled so the executor thread is handed back every poll_interval, the merge stops once
+        # every worker has sent its end marker, once the workers have exited or when it is cancelled
+        loop = asyncio.get_event_loop()
+        open_shards = len(self.processes)
+        is_exited = False
+        while open_shards:
+            try:
+                outputs = await loop.run_in_executor(None, self.output_queue.get, not is_exited, self.poll_interval)
+            except queue.Empty:
+                if is_exited:
+                    logging.error("{} shard workers exited without closing".format(open_shards))
+                    return
+                # outputs sent by workers that have exited are drained before the merge gives up on them
+                is_exited = not any(process.is_alive() for process in self.processes)
+                continue
+            if outputs is None:
+                open_shards -= 1
+                continue
+            for output in outputs:
+                await l2_writer.put(output)
+
+    def close(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+        self.flush()
+        for event_queue in self.event_queues:
+            event_queue.put(None)
+
+    def join(self):
+        for process in self.processes:
+            process.join()
+
+
+def run_shard(product_ids, event_queue, output_queue, snapshots=None):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(consume_shard(product_ids, event_queue, output_queue, snapshots))
+    finally:
+        output_queue.put(None)
+        loop.close()
+
+
+async def consume_shard(product_ids, event_queue, output_queue, snapshots):
+    loop = asyncio.get_event_loop()
+    orderbooks = {}
+    l2_writer = create_pipeline(app_config.pipelines.get('outputs'),
+                                lambda output: request_full_frame(orderbooks, output))
+    event_readers = {}
+    consume_tasks = {}
+    # each worker tracks and logs the latencies of its own books
+    latency_tracker = create_latency_tracker()
+    dump_task = start_latency_dumps(latency_tracker)
+    async with aiohttp.ClientSession() as session:
+        snapshot_client = create_snapshot_client(session) if snapshots is None else StaticSnapshotClient(snapshots)
+        for product in product_ids:
+            event_readers[product] = create_pipeline(app_config.pipelines.get('events'))
+            orderbook = create_orderbook(product, event_readers[product], l2_writer, snapshot_client,
+                                         get_checkpointer(product) if snapshots is None else None, latency_tracker)
+            orderbooks[product] = orderbook
+            consume_tasks[product] = asyncio.ensure_future(orderbook.begin_consume())
+        forward_task = asyncio.ensure_future(forward_outputs(l2_writer, output_queue))
+        dispatcher = EventDispatcher(event_readers, latency_tracker)
+        while True:
+            batch = await loop.run_in_executor(None, event_queue.get)
+            if batch is None:
+                break
+            for event in batch:
+                await dispatcher.dispatch(event)
+        for product, event_reader in event_readers.items():
+            # a book that never received an event is still waiting for its start trigger
+            if event_reader.state == Pipeline.states.NOT_STARTED:
+                consume_tasks[product].cancel()
+            else:
+                await event_reader.put(Pipeline.states.CLOSING_PIPE)
+        for result in await asyncio.gather(*consume_tasks.values(), return_exceptions=True):
+            if isinstance(result, Exception):
+                logging.error(result)
+        await l2_writer.put(Pipeline.states.CLOSING_PIPE)
+        await forward_task
+    stop_latency_dumps(latency_tracker, dump_task)
+
+
+async def forward_outputs(l2_writer, output_queue):
+    # outputs already waiting are sent together so a busy shard pays for one queue put per batch
+    pipe = l2_writer.pipe
+    while True:
+        outputs = [await pipe.get()]
+        while not pipe.empty():
+            outputs.append(pipe.get_nowait())
+        is_closing = outputs[-1] == Pipeline.states.CLOSING_PIPE
+        if is_closing:
+            outputs.pop()
+        if outputs:
+            output_queue.put(outputs)
+        if is_closing:
+            return
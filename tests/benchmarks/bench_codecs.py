@@ -0,0 +1,53 @@
+"""
+Bytes and encode time per update of every output codec, for each output mode of a book replaying the recorded
+btc_eur feed. repr is what print wrote before the codecs, decode is the time to read the binary frames back.
+Run from the repository root with python -m tests.benchmarks.bench_codecs
+"""
+import time
+
+from src.io.output_codecs import OutputFormats, create_codec, decode_outputs
+from src.orderbook.metadata import OutputModes
+from tests.benchmarks.bench_suite import create_orderbook
+from tests.benchmarks.bench_utils import load_feed, load_snapshot
+
+
+def book_outputs(book_snapshot, events, output_mode):
+    orderbook = create_orderbook(book_snapshot, 'BTC-EUR', output_mode)
+    outputs = []
+    for event in events:
+        orderbook.process_event(event)
+        output = orderbook.output_formatter()
+        if output is not None:
+            outputs.append(output)
+    return outputs
+
+
+def time_encode(encode, outputs):
+    start = time.perf_counter_ns()
+    chunks = [encode(output) for output in outputs]
+    return time.perf_counter_ns() - start, chunks
+
+
+def run():
+    book_snapshot = load_snapshot('btc_eur/1st_snapshot.txt')
+    events = load_feed('btc_eur/newer_than_1st_snapshot_feed.txt')
+    results = []
+    for output_mode in [OutputModes.L3, OutputModes.L2, OutputModes.L2_DELTA]:
+        outputs = book_outputs(book_snapshot, events, output_mode)
+        elapsed, chunks = time_encode(lambda output: (repr(output) + '\n').encode('utf-8'), outputs)
+        results.append((output_mode, 'repr', len(outputs), sum(map(len, chunks)), elapsed))
+        for output_format in [OutputFormats.JSONL, OutputFormats.COMPACT, OutputFormats.BINARY]:
+            elapsed, chunks = time_encode(create_codec(output_format).encode, outputs)
+            results.append((output_mode, output_format, len(outputs), sum(map(len, chunks)), elapsed))
+        data = b''.join(chunks)
+        start = time.perf_counter_ns()
+        decode_outputs(data)
+        results.append((output_mode, 'decode', len(outputs), len(data), time.perf_counter_ns() - start))
+    return results
+
+
+if __name__ == '__main__':
+    print('{:<10}{:<10}{:>10}{:>14}{:>14}'.format('mode', 'codec', 'updates', 'bytes/update', 'ns/update'))
+    for output_mode, codec, num_outputs, num_bytes, elapsed in run():
+        print('{:<10}{:<10}{:>10}{:>14.0f}{:>14.0f}'.format(output_mode, codec, num_outputs,
+                                                            num_bytes / num_outputs, elapsed / num_outputs))
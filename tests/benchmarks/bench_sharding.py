@@ -0,0 +1,105 @@
+"""
+Throughput of the single event loop against the sharded runtime. The btc_eur snapshot and feed are relabelled
+as several products so every book does the same work, outputs are counted instead of written.
+Run from the repository root with python -m tests.benchmarks.bench_sharding
+"""
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+from src.event.metadata import EventKeys
+from src.io.dispatchers import EventDispatcher
+from src.io.io_interfaces import Pipeline, StaticSnapshotClient
+from src.factories import create_orderbook
+from src.shards import ShardPool
+
+resources = Path(__file__).resolve().parent.parent.joinpath('resources')
+
+num_products = 4
+
+
+def load_products():
+    with open(resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as snapshot_file, \
+            open(resources.joinpath('btc_eur/newer_than_1st_snapshot_feed.txt'), 'r') as feed_file:
+        book_snapshot = json.loads(snapshot_file.read())
+        feed = [json.loads(line) for line in feed_file.readlines()]
+    products = ['BENCH-{}'.format(index) for index in range(num_products)]
+    snapshots = {product: book_snapshot for product in products}
+    events = []
+    for event in feed:
+        for product in products:
+            product_event = dict(event)
+            product_event[EventKeys.PRODUCT_ID] = product
+            events.append(product_event)
+    return products, snapshots, events
+
+
+async def count_outputs(l2_writer):
+    num_outputs = 0
+    while True:
+        output = await l2_writer.pipe.get()
+        if output == Pipeline.states.CLOSING_PIPE:
+            return num_outputs
+        num_outputs += 1
+
+
+async def run_single_loop(products, snapshots, events):
+    l2_writer = Pipeline(asyncio.Queue())
+    snapshot_client = StaticSnapshotClient(snapshots)
+    event_readers = {product: Pipeline(asyncio.Queue()) for product in products}
+    consume_tasks = [asyncio.ensure_future(create_orderbook(product, event_readers[product], l2_writer,
+                                                            snapshot_client).begin_consume())
+                     for product in products]
+    output_task = asyncio.ensure_future(count_outputs(l2_writer))
+    dispatcher = EventDispatcher(event_readers)
+    start = time.perf_counter()
+    for index, event in enumerate(events):
+        await dispatcher.dispatch(event)
+        if index % 100 == 0:
+            await asyncio.sleep(0)
+    for event_reader in event_readers.values():
+        await event_reader.pipe.put(Pipeline.states.CLOSING_PIPE)
+    await asyncio.gather(*consume_tasks)
+    elapsed = time.perf_counter() - start
+    await l2_writer.pipe.put(Pipeline.states.CLOSING_PIPE)
+    return elapsed, await output_task
+
+
+async def run_sharded(products, snapshots, events, num_shards):
+    l2_writer = Pipeline(asyncio.Queue())
+    shard_pool = ShardPool(products, num_shards, snapshots=snapshots)
+    shard_pool.start()
+    output_task = asyncio.ensure_future(count_outputs(l2_writer))
+    # process start up and unpickling the snapshots is left out of the timing
+    await asyncio.sleep(2)
+    start = time.perf_counter()
+    for index, event in enumerate(events):
+        await shard_pool.dispatch(event)
+        if index % 100 == 0:
+            await asyncio.sleep(0)
+    shard_pool.close()
+    await shard_pool.merge_outputs(l2_writer)
+    elapsed = time.perf_counter() - start
+    shard_pool.join()
+    await l2_writer.pipe.put(Pipeline.states.CLOSING_PIPE)
+    return elapsed, await output_task
+
+
+def run(shard_counts=(2, 4)):
+    products, snapshots, events = load_products()
+    loop = asyncio.get_event_loop()
+    results = [('single loop',) + loop.run_until_complete(run_single_loop(products, snapshots, events))]
+    for num_shards in shard_counts:
+        results.append(('{} shards'.format(num_shards),) +
+                       loop.run_until_complete(run_sharded(products, snapshots, events, num_shards)))
+    return len(events), results
+
+
+if __name__ == '__main__':
+    num_events, results = run()
+    print('{} events over {} products, {} cpus'.format(num_events, num_products, os.cpu_count()))
+    print('{:<14}{:>12}{:>14}{:>10}'.format('mode', 'seconds', 'events/sec', 'outputs'))
+    for mode, elapsed, num_outputs in results:
+        print('{:<14}{:>12.3f}{:>14.0f}{:>10}'.format(mode, elapsed, num_events / elapsed, num_outputs))
@@ -0,0 +1,59 @@
+"""
+Load time of the level 3 snapshots in tests/resources, bulk loader against one insertion per order.
+Run from the repository root with python -m tests.benchmarks.bench_snapshot_load
+"""
+import json
+import time
+from pathlib import Path
+
+from src.event.metadata import EventKeys
+from src.orderbook.metadata import OrderSides, OrderIndexes
+from src.orderbook.orderbook import Orderbook
+
+resources = Path(__file__).resolve().parent.parent.joinpath('resources')
+
+snapshot_files = ['btc_eur/1st_snapshot.txt', 'btc_eur/2nd_snapshot.txt',
+                  'ltc_usd/1st_snapshot.txt', 'ltc_usd/2nd_snapshot.txt']
+
+
+def load_one_order_at_a_time(orderbook, book_snapshot):
+    for side in [OrderSides.BID, OrderSides.ASK]:
+        for order in book_snapshot.get(side):
+            if order and len(order) == 3:
+                price_key, price = orderbook.price_format.parse_price(order[OrderIndexes.PRICE])
+                orderbook.add_order(side, price_key, price, orderbook.price_format.parse_size(order[OrderIndexes.SIZE]),
+                                    order[OrderIndexes.ORDER_ID])
+    orderbook.curr_seq_num = book_snapshot.get(EventKeys.SEQ)
+
+
+def load_bulk(orderbook, book_snapshot):
+    orderbook.orderbook_from_snapshot(book_snapshot)
+
+
+def best_of(loader, book_snapshot, repeats):
+    timings = []
+    for _ in range(repeats):
+        orderbook = Orderbook(None, None, None, 'BENCH', 25, 10)
+        start = time.perf_counter()
+        loader(orderbook, book_snapshot)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(repeats=5):
+    results = []
+    for snapshot_file in snapshot_files:
+        with open(resources.joinpath(snapshot_file), 'r') as snapshot:
+            book_snapshot = json.loads(snapshot.read())
+        num_orders = len(book_snapshot.get(OrderSides.BID)) + len(book_snapshot.get(OrderSides.ASK))
+        one_at_a_time = best_of(load_one_order_at_a_time, book_snapshot, repeats)
+        bulk = best_of(load_bulk, book_snapshot, repeats)
+        results.append((snapshot_file, num_orders, one_at_a_time, bulk))
+    return results
+
+
+if __name__ == '__main__':
+    print('{:<28}{:>10}{:>18}{:>12}{:>10}'.format('snapshot', 'orders', 'one at a time ms', 'bulk ms', 'speedup'))
+    for snapshot_file, num_orders, one_at_a_time, bulk in run():
+        print('{:<28}{:>10}{:>18.2f}{:>12.2f}{:>9.2f}x'.format(snapshot_file, num_orders, one_at_a_time * 1000,
+                                                              bulk * 1000, one_at_a_time / bulk))
@@ -0,0 +1,311 @@
+"""
+Throughput, per event latency and peak memory of the book's hot paths and of the whole consume pipeline on
+recorded and synthetic feeds. Results can be saved as json and compared against those of an earlier run on the
+same machine, the run exits with 1 if a benchmark regressed by more than the tolerance.
+Run from the repository root, on the baseline commit with
+python -m tests.benchmarks.bench_suite --output baseline.json
+then on the change with
+python -m tests.benchmarks.bench_suite --output results.json --baseline baseline.json
+"""
+import argparse
+import asyncio
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+from src.io.dispatchers import EventDispatcher
+from src.io.io_interfaces import Pipeline
+from src.io.snapshot_stream import STREAM_CHUNK_SIZE, load_snapshot_stream
+from src.io.output_codecs import OutputFormats
+from src.io.writers import StreamWriter
+from src.metrics import LatencyTracker
+from src.orderbook.metadata import OrderSides, OutputModes
+from src.orderbook.orderbook import Orderbook
+from tests.benchmarks.bench_utils import BenchResult, load_feed, load_snapshot, measure_peak_memory, resources, \
+    synthetic_feed, timed_calls
+
+
+def create_orderbook(book_snapshot, product_id, output_mode=None, reader=None, writer=None, max_batch_size=None,
+                     latencies=None):
+    orderbook = Orderbook(reader, writer, None, product_id, 25, 10, output_mode=output_mode,
+                          max_batch_size=max_batch_size, latencies=latencies)
+    orderbook.orderbook_from_snapshot(json.loads(json.dumps(book_snapshot)))
+    return orderbook
+
+
+def bench_process_event(name, book_snapshot, events):
+    orderbook = create_orderbook(book_snapshot, 'BENCH')
+    elapsed, latencies = timed_calls(orderbook.process_event, [(event,) for event in events])
+    return BenchResult(name, len(events), elapsed, latencies)
+
+
+def bench_should_output(name, book_snapshot, events):
+    orderbook = create_orderbook(book_snapshot, 'BENCH')
+    events = [event for event in events if event.get('price') is not None and event.get('side') is not None]
+    elapsed, latencies = timed_calls(orderbook.should_output, [(event,) for event in events])
+    return BenchResult(name, len(events), elapsed, latencies)
+
+
+def bench_output_formatter(name, book_snapshot, events, output_mode):
+    # the book moves on by one event between outputs so l2 delta frames carry real changes
+    orderbook = create_orderbook(book_snapshot, 'BENCH', output_mode)
+    latencies = []
+    perf_counter_ns = time.perf_counter_ns
+    start = time.perf_counter()
+    for event in events:
+        orderbook.process_event(event)
+        call_start = perf_counter_ns()
+        orderbook.output_formatter()
+        latencies.append(perf_counter_ns() - call_start)
+    return BenchResult(name, len(events), time.perf_counter() - start, latencies)
+
+
+def bench_output_writer(name, book_snapshot, events, writer_format):
+    # latencies are what the event loop pays per output: a print to /dev/null, or encoding it for a writer thread.
+    # events/sec includes the writer thread finishing
+    orderbook = create_orderbook(book_snapshot, 'BENCH')
+    outputs = []
+    for event in events:
+        orderbook.process_event(event)
+        outputs.append(orderbook.output_formatter())
+    latencies = []
+    perf_counter_ns = time.perf_counter_ns
+    with open(os.devnull, 'wb') as devnull:
+        start = time.perf_counter()
+        if writer_format is None:
+            text_devnull = io.TextIOWrapper(devnull)
+            for output in outputs:
+                call_start = perf_counter_ns()
+                print(output, file=text_devnull)
+                latencies.append(perf_counter_ns() - call_start)
+            text_devnull.flush()
+            text_devnull.detach()
+        else:
+            writer = StreamWriter(devnull, writer_format)
+            writer.start()
+            for output in outputs:
+                call_start = perf_counter_ns()
+                writer.write_batch([output])
+                latencies.append(perf_counter_ns() - call_start)
+            writer.close()
+        return BenchResult(name, len(outputs), time.perf_counter() - start, latencies)
+
+
+def bench_snapshot_load(name, book_snapshot, repeats):
+    num_orders = len(book_snapshot.get(OrderSides.BID)) + len(book_snapshot.get(OrderSides.ASK))
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        orderbook = Orderbook(None, None, None, 'BENCH', 25, 10)
+        call_start = time.perf_counter_ns()
+        orderbook.orderbook_from_snapshot(book_snapshot)
+        latencies.append(time.perf_counter_ns() - call_start)
+    # latencies are per snapshot load, events/sec is orders loaded per second
+    return BenchResult(name, num_orders * repeats, time.perf_counter() - start, latencies)
+
+
+def bench_snapshot_body(name, body, is_streamed, repeats):
+    # from the raw response body, so the buffered path pays for json lists the streamed path never builds
+    async def iter_chunks():
+        for start in range(0, len(body), STREAM_CHUNK_SIZE):
+            yield body[start:start + STREAM_CHUNK_SIZE]
+
+    latencies = []
+    num_orders = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        orderbook = Orderbook(None, None, None, 'BENCH', 25, 10)
+        call_start = time.perf_counter_ns()
+        if is_streamed:
+            book_snapshot = asyncio.get_event_loop().run_until_complete(
+                load_snapshot_stream(iter_chunks(), orderbook.price_format))
+        else:
+            book_snapshot = json.loads(body)
+        orderbook.orderbook_from_snapshot(book_snapshot)
+        latencies.append(time.perf_counter_ns() - call_start)
+        num_orders += len(orderbook.orders_by_id)
+        # levels and orders link to each other, the previous book is only freed by a collection before the next
+        # load so peak memory is that of a single rebuild
+        orderbook = book_snapshot = None
+        gc.collect()
+    return BenchResult(name, num_orders, time.perf_counter() - start, latencies)
+
+
+def bench_dispatch(name, events):
+    pipeline = Pipeline(asyncio.Queue())
+    dispatcher = EventDispatcher({event.get('product_id'): pipeline for event in events})
+
+    async def dispatch_events():
+        latencies = []
+        perf_counter_ns = time.perf_counter_ns
+        for event in events:
+            call_start = perf_counter_ns()
+            await dispatcher.dispatch(event)
+            latencies.append(perf_counter_ns() - call_start)
+        return latencies
+
+    start = time.perf_counter()
+    latencies = asyncio.get_event_loop().run_until_complete(dispatch_events())
+    return BenchResult(name, len(events), time.perf_counter() - start, latencies)
+
+
+def bench_pipeline(name, book_snapshot, events, max_batch_size=None, is_latency_tracked=False):
+    # with latency tracking events are stamped as the feed would and the book records its stages. An event's
+    # latency is from its batch being taken off the pipeline until the book comes back for the next batch, so it
+    # covers processing and publishing the batch's output
+    reader = Pipeline(asyncio.Queue())
+    writer = Pipeline(asyncio.Queue())
+    latencies = LatencyTracker().for_product('BENCH') if is_latency_tracked else None
+    orderbook = create_orderbook(book_snapshot, 'BENCH', reader=reader, writer=writer, max_batch_size=max_batch_size,
+                                 latencies=latencies)
+    if is_latency_tracked:
+        events = [dict(event, received_ns=time.perf_counter_ns(), dispatched_ns=time.perf_counter_ns())
+                  for event in events]
+
+    async def drain_outputs():
+        while True:
+            if await writer.pipe.get() == Pipeline.states.CLOSING_PIPE:
+                return
+
+    event_latencies = []
+    perf_counter_ns = time.perf_counter_ns
+    next_events = orderbook.next_events
+    batch = []
+    batch_taken_at = None
+
+    async def timed_next_events():
+        nonlocal batch, batch_taken_at
+        if batch:
+            event_latencies.extend([perf_counter_ns() - batch_taken_at] * len(batch))
+        batch = await next_events()
+        batch_taken_at = perf_counter_ns()
+        return batch
+
+    async def consume_events():
+        drain_task = asyncio.ensure_future(drain_outputs())
+        for event in events:
+            reader.pipe.put_nowait(event)
+        reader.pipe.put_nowait(Pipeline.states.CLOSING_PIPE)
+        await orderbook.consume()
+        # the last batch ends with the closing state which is not an event
+        event_latencies.extend([perf_counter_ns() - batch_taken_at] * (len(batch) - 1))
+        writer.pipe.put_nowait(Pipeline.states.CLOSING_PIPE)
+        await drain_task
+
+    orderbook.next_events = timed_next_events
+    start = time.perf_counter()
+    asyncio.get_event_loop().run_until_complete(consume_events())
+    return BenchResult(name, len(events), time.perf_counter() - start, event_latencies)
+
+
+def get_benchmarks(quick=False):
+    btc_eur_snapshot = load_snapshot('btc_eur/1st_snapshot.txt')
+    btc_eur_feed = load_feed('btc_eur/newer_than_1st_snapshot_feed.txt')
+    ltc_usd_snapshot = load_snapshot('ltc_usd/1st_snapshot.txt')
+    synthetic_snapshot, synthetic_events = synthetic_feed('BENCH', 5000 if quick else 50000)
+    btc_eur_body = resources.joinpath('btc_eur/1st_snapshot.txt').read_bytes()
+    repeats = 2 if quick else 10
+    return [
+        ('process_event[recorded]', bench_process_event, (btc_eur_snapshot, btc_eur_feed)),
+        ('process_event[synthetic]', bench_process_event, (synthetic_snapshot, synthetic_events)),
+        ('should_output[recorded]', bench_should_output, (btc_eur_snapshot, btc_eur_feed)),
+        ('output_formatter[l3]', bench_output_formatter, (btc_eur_snapshot, btc_eur_feed, OutputModes.L3)),
+        ('output_formatter[l2]', bench_output_formatter, (btc_eur_snapshot, btc_eur_feed, OutputModes.L2)),
+        ('output_formatter[l2_delta]', bench_output_formatter, (btc_eur_snapshot, btc_eur_feed,
+                                                                 OutputModes.L2_DELTA)),
+        ('output_writer[print]', bench_output_writer, (btc_eur_snapshot, btc_eur_feed, None)),
+        ('output_writer[jsonl]', bench_output_writer, (btc_eur_snapshot, btc_eur_feed, OutputFormats.JSONL)),
+        ('output_writer[compact]', bench_output_writer, (btc_eur_snapshot, btc_eur_feed, OutputFormats.COMPACT)),
+        ('output_writer[binary]', bench_output_writer, (btc_eur_snapshot, btc_eur_feed, OutputFormats.BINARY)),
+        ('orderbook_from_snapshot[btc_eur]', bench_snapshot_load, (btc_eur_snapshot, repeats)),
+        ('orderbook_from_snapshot[ltc_usd]', bench_snapshot_load, (ltc_usd_snapshot, repeats)),
+        ('snapshot_body[json]', bench_snapshot_body, (btc_eur_body, False, repeats)),
+        ('snapshot_body[stream]', bench_snapshot_body, (btc_eur_body, True, repeats)),
+        ('dispatch[recorded]', bench_dispatch, (btc_eur_feed,)),
+        ('pipeline[recorded]', bench_pipeline, (btc_eur_snapshot, btc_eur_feed)),
+        ('pipeline[synthetic]', bench_pipeline, (synthetic_snapshot, synthetic_events)),
+        ('pipeline[recorded,batch=64]', bench_pipeline, (btc_eur_snapshot, btc_eur_feed, 64)),
+        ('pipeline[synthetic,batch=64]', bench_pipeline, (synthetic_snapshot, synthetic_events, 64)),
+        ('pipeline[recorded,latency]', bench_pipeline, (btc_eur_snapshot, btc_eur_feed, None, True)),
+        ('pipeline[synthetic,latency]', bench_pipeline, (synthetic_snapshot, synthetic_events, None, True))
+    ]
+
+
+def run(quick=False, names=None):
+    results = {}
+    for name, benchmark, args in get_benchmarks(quick):
+        if names and not any(selected in name for selected in names):
+            continue
+        bench_result = benchmark(name, *args)
+        # tracemalloc slows everything down so peak memory is taken from a second run
+        bench_result.peak_memory = measure_peak_memory(lambda: benchmark(name, *args))
+        results[name] = bench_result.to_dict()
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "benchmarks": results
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.get("benchmarks").items():
+        baseline_result = baseline.get("benchmarks", {}).get(name)
+        if baseline_result is None:
+            continue
+        # a metric missing from either run, e.g. memory on a run without tracemalloc, can't be compared
+        for key, is_lower_worse in [("events_per_sec", True), ("p99_us", False), ("peak_memory_kb", False)]:
+            value, baseline_value = result.get(key), baseline_result.get(key)
+            if value is None or not baseline_value:
+                continue
+            if value < baseline_value * (1 - tolerance) if is_lower_worse else \
+                    value > baseline_value * (1 + tolerance):
+                regressions.append("{} {} {:.1f} from {:.1f}".format(name, key, value, baseline_value))
+    return regressions
+
+
+def format_value(value, value_format):
+    return '-' if value is None else value_format.format(value)
+
+
+def format_results(results):
+    lines = ['{:<36}{:>10}{:>14}{:>10}{:>10}{:>10}{:>12}'.format(
+        'benchmark', 'events', 'events/sec', 'p50 us', 'p99 us', 'p999 us', 'peak KiB')]
+    for name, result in results.get("benchmarks").items():
+        lines.append('{:<36}{:>10}{:>14}{:>10}{:>10}{:>10}{:>12}'.format(
+            name, result["events"], format_value(result.get("events_per_sec"), '{:.0f}'),
+            *[format_value(result.get(key), '{:.1f}') for key in ["p50_us", "p99_us", "p999_us"]],
+            format_value(result.get("peak_memory_kb"), '{:.0f}')))
+    return '\n'.join(lines)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='orderbook benchmark suite')
+    parser.add_argument('--output', help='write the results as json to this file')
+    parser.add_argument('--baseline', help='compare against results saved by an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='fraction events/sec, p99 or peak memory can get worse before it is a regression')
+    parser.add_argument('--quick', action='store_true', help='smaller feeds and fewer snapshot loads')
+    parser.add_argument('--only', nargs='*', help='only run benchmarks whose name contains one of these')
+    args = parser.parse_args(args)
+    results = run(args.quick, args.only)
+    print(format_results(results))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION {}'.format(regression))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import gc
+import json
+import random
+import time
+import tracemalloc
+from pathlib import Path
+
+from src.orderbook.metadata import OrderSides
+
+resources = Path(__file__).resolve().parent.parent.joinpath('resources')
+
+
+def load_snapshot(snapshot_file):
+    with open(resources.joinpath(snapshot_file), 'r') as snapshot:
+        return json.loads(snapshot.read())
+
+
+def load_feed(feed_file):
+    with open(resources.joinpath(feed_file), 'r') as feed:
+        return [json.loads(line) for line in feed if line.strip()]
+
+
+class BenchResult:
+    """
+    Per event latencies in nanoseconds of one benchmark, events/sec is worked out from the total time of
+    the run so it includes everything between the timed calls
+    """
+    def __init__(self, name, num_events, elapsed, latencies=None):
+        self.name = name
+        self.num_events = num_events
+        self.elapsed = elapsed
+        self.latencies = sorted(latencies or [])
+        self.peak_memory = None
+
+    def percentile(self, fraction):
+        if not self.latencies:
+            return None
+        return self.latencies[min(int(fraction * len(self.latencies)), len(self.latencies) - 1)] / 1000
+
+    def to_dict(self):
+        return {
+            "events": self.num_events,
+            "events_per_sec": self.num_events / self.elapsed if self.elapsed else None,
+            "p50_us": self.percentile(0.5),
+            "p99_us": self.percentile(0.99),
+            "p999_us": self.percentile(0.999),
+            "peak_memory_kb": self.peak_memory / 1024 if self.peak_memory is not None else None
+        }
+
+
+def measure_peak_memory(run):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak_memory
+
+
+def timed_calls(call, args_list):
+    latencies = []
+    perf_counter_ns = time.perf_counter_ns
+    start = time.perf_counter()
+    for args in args_list:
+        call_start = perf_counter_ns()
+        call(*args)
+        latencies.append(perf_counter_ns() - call_start)
+    return time.perf_counter() - start, latencies
+
+
+def synthetic_feed(product_id, num_events, num_levels=200, seed=1):
+    """
+    A deterministic level 3 snapshot and feed of opens, matches and cancels around a mid price of 100.00,
+    every match and cancel is for an order that is on the book at that point
+    """
+    rng = random.Random(seed)
+    sequence = 1000
+    live_orders = {}
+    snapshot = {"sequence": sequence, OrderSides.BID: [], OrderSides.ASK: []}
+    for index in range(num_levels * 5):
+        side = OrderSides.BID if index % 2 else OrderSides.ASK
+        price = 10000 + (1 if side == OrderSides.ASK else -1) * rng.randint(1, num_levels)
+        order = ["{:.2f}".format(price / 100), "{:.8f}".format(rng.uniform(0.01, 5)), "snapshot-{}".format(index)]
+        snapshot[side].append(order)
+        live_orders[order[2]] = ('sell' if side == OrderSides.ASK else 'buy', order[0], order[1])
+    snapshot[OrderSides.BID].sort(key=lambda order: -float(order[0]))
+    snapshot[OrderSides.ASK].sort(key=lambda order: float(order[0]))
+    events = []
+    for index in range(num_events):
+        sequence += 1
+        roll = rng.random()
+        if roll < 0.5 or len(live_orders) < 10:
+            event_side = rng.choice(['buy', 'sell'])
+            price = 10000 + (-1 if event_side == 'buy' else 1) * rng.randint(1, num_levels)
+            order_id = "order-{}".format(index)
+            size = "{:.8f}".format(rng.uniform(0.01, 5))
+            live_orders[order_id] = (event_side, "{:.2f}".format(price / 100), size)
+            events.append({"type": "open", "side": event_side, "price": live_orders[order_id][1],
+                           "order_id": order_id, "remaining_size": size, "product_id": product_id,
+                           "sequence": sequence})
+        else:
+            order_id = rng.choice(list(live_orders)) if roll < 0.6 else next(iter(live_orders))
+            event_side, price, size = live_orders.pop(order_id)
+            if roll < 0.75:
+                events.append({"type": "match", "maker_order_id": order_id, "side": event_side, "size": size,
+                               "price": price, "product_id": product_id, "sequence": sequence})
+                sequence += 1
+                events.append({"type": "done", "side": event_side, "order_id": order_id, "reason": "filled",
+                               "price": price, "remaining_size": "0", "product_id": product_id,
+                               "sequence": sequence})
+            else:
+                events.append({"type": "done", "side": event_side, "order_id": order_id, "reason": "canceled",
+                               "price": price, "remaining_size": size, "product_id": product_id,
+                               "sequence": sequence})
+    return snapshot, events
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.io.io_interfaces import Pipeline, StaticSnapshotClient
+from src.io.journal import JournalWriter
+from src.orderbook.checkpoint import BookCheckpointer, build_checkpoint
+from src.orderbook.orderbook import Orderbook
+from tests.unittests import test_utils
+
+
+class CountingSnapshotClient(StaticSnapshotClient):
+    def __init__(self, snapshots):
+        super().__init__(snapshots)
+        self.num_requests = 0
+
+    async def get_orderbook_snapshot(self, product_id, http_timeout, price_format=None):
+        self.num_requests += 1
+        return await super().get_orderbook_snapshot(product_id, http_timeout, price_format)
+
+
+class TestCheckpoint(unittest.TestCase):
+    resources = Path.cwd().joinpath('../resources')
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.loop = asyncio.get_event_loop()
+        with open(TestCheckpoint.resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as snapshot_file:
+            self.snapshot = json.loads(snapshot_file.read())
+        with open(TestCheckpoint.resources.joinpath('btc_eur/newer_than_1st_snapshot_feed.txt'), 'r') as feed_file:
+            self.messages = [line.strip() for line in feed_file.readlines() if line.strip()]
+        self.events = [json.loads(message) for message in self.messages
+                       if json.loads(message)['sequence'] > self.snapshot['sequence']]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_orderbook(self, http_client=None, journal_directory=None):
+        reader = Pipeline(asyncio.Queue())
+        writer = Pipeline(asyncio.Queue())
+        checkpointer = BookCheckpointer('BTC-EUR', self.directory.name, journal_directory=journal_directory)
+        return Orderbook(reader, writer, http_client, 'BTC-EUR', 10, 10, checkpointer=checkpointer)
+
+    def save_checkpoint(self, num_events):
+        orderbook = self.create_orderbook()
+        orderbook.orderbook_from_snapshot(json.loads(json.dumps(self.snapshot)))
+        for event in self.events[:num_events]:
+            orderbook.process_event(event)
+        self.loop.run_until_complete(orderbook.checkpointer.save(orderbook))
+        return orderbook
+
+    def consume(self, orderbook, events):
+        async def run_consume():
+            await orderbook.event_reader.pipe.put(Pipeline.states.STARTED)
+            for event in events:
+                await orderbook.event_reader.pipe.put(event)
+            await orderbook.event_reader.pipe.put(Pipeline.states.CLOSING_PIPE)
+            await orderbook.begin_consume()
+
+        self.loop.run_until_complete(run_consume())
+
+    def test_checkpoint_should_load_back_the_same_book(self):
+        saved_orderbook = self.save_checkpoint(1000)
+        self.assertEqual(1, saved_orderbook.checkpointer.save_count)
+        self.assertEqual([], list(Path(self.directory.name).glob('*.tmp')))
+
+        orderbook = self.create_orderbook()
+        self.assertTrue(orderbook.warm_start())
+        self.assertEqual(test_utils.book_as_lists(saved_orderbook), test_utils.book_as_lists(orderbook))
+        self.assertEqual(saved_orderbook.curr_seq_num, orderbook.curr_seq_num)
+        self.assertEqual(saved_orderbook.book_snapshot_seq_num, orderbook.book_snapshot_seq_num)
+
+    def test_warm_start_should_not_download_a_snapshot_for_a_contiguous_feed(self):
+        self.save_checkpoint(1000)
+        http_client = CountingSnapshotClient({})
+        orderbook = self.create_orderbook(http_client)
+        self.consume(orderbook, self.events[1000:])
+
+        cold_orderbook = self.save_checkpoint(len(self.events))
+        self.assertEqual(0, http_client.num_requests)
+        self.assertEqual(0, orderbook.error_count)
+        self.assertEqual(test_utils.book_as_lists(cold_orderbook), test_utils.book_as_lists(orderbook))
+
+    def test_warm_start_should_download_a_snapshot_when_the_feed_has_moved_on(self):
+        newer_snapshot = build_checkpoint(self.save_checkpoint(1500))
+        self.save_checkpoint(1000)
+        http_client = CountingSnapshotClient({'BTC-EUR': newer_snapshot})
+        orderbook = self.create_orderbook(http_client)
+        with self.assertLogs(level='WARNING'):
+            self.consume(orderbook, self.events[1200:])
+
+        cold_orderbook = self.save_checkpoint(len(self.events))
+        self.assertEqual(1, http_client.num_requests)
+        self.assertEqual(test_utils.book_as_lists(cold_orderbook), test_utils.book_as_lists(orderbook))
+
+    def test_warm_start_should_replay_the_journal_after_the_checkpoint(self):
+        self.save_checkpoint(1000)
+        journal_directory = Path(self.directory.name).joinpath('journal')
+        journal_writer = JournalWriter(journal_directory)
+        journal_writer.start()
+        for event in self.events[900:2000]:
+            journal_writer.record(json.dumps(event), event['product_id'], event['sequence'])
+        journal_writer.close()
+
+        orderbook = self.create_orderbook(journal_directory=journal_directory)
+        self.assertTrue(orderbook.warm_start())
+        cold_orderbook = self.save_checkpoint(2000)
+        self.assertEqual(self.events[1999]['sequence'], orderbook.curr_seq_num)
+        self.assertEqual(test_utils.book_as_lists(cold_orderbook), test_utils.book_as_lists(orderbook))
+
+    def test_missing_or_foreign_checkpoint_should_not_load(self):
+        self.assertIsNone(BookCheckpointer('BTC-EUR', self.directory.name).load())
+        self.save_checkpoint(10)
+        directory = Path(self.directory.name)
+        directory.joinpath('BTC-EUR.json').rename(directory.joinpath('ETH-EUR.json'))
+        with self.assertLogs(level='WARNING'):
+            self.assertIsNone(BookCheckpointer('ETH-EUR', self.directory.name).load())
+        directory.joinpath('BTC-EUR.json').write_text('{"product_id": "BTC-EUR", "bids": [')
+        with self.assertLogs(level='WARNING'):
+            self.assertIsNone(BookCheckpointer('BTC-EUR', self.directory.name).load())
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import unittest
+from pathlib import Path
+
+from src.io.io_interfaces import Pipeline
+from src.orderbook.conflation import OutputConflater
+from src.orderbook.orderbook import Orderbook
+
+
+class TestConflation(unittest.TestCase):
+    resources = Path.cwd().joinpath('../resources')
+
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.reader = Pipeline(asyncio.Queue())
+        self.writer = Pipeline(asyncio.Queue())
+        with open(TestConflation.resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as snapshot_file, \
+                open(TestConflation.resources.joinpath('btc_eur/before_2nd_snapshot_feed.txt'), 'r') as feed_file:
+            self.snapshot = json.loads(snapshot_file.read())
+            self.event_feed = [json.loads(line) for line in feed_file.readlines()]
+
+    def create_orderbook(self, conflation_interval=None, conflation_max_pending=None):
+        orderbook = Orderbook(self.reader, self.writer, None, 'BTC-EUR', 10, 10,
+                              conflation_interval=conflation_interval,
+                              conflation_max_pending=conflation_max_pending)
+        orderbook.orderbook_from_snapshot(self.snapshot)
+        return orderbook
+
+    async def drain_writer(self):
+        outputs = []
+        while not self.writer.pipe.empty():
+            outputs.append(await self.writer.pipe.get())
+        return outputs
+
+    def test_conflater_without_limits_publishes_every_update(self):
+        conflater = OutputConflater()
+        self.assertTrue(conflater.add_update())
+        conflater.mark_published()
+        self.assertEqual((1, 0), (conflater.published_count, conflater.conflated_count))
+
+    def test_conflater_max_pending(self):
+        conflater = OutputConflater(max_pending=3)
+        conflater.mark_published()
+        self.assertFalse(conflater.add_update())
+        self.assertFalse(conflater.add_update())
+        self.assertTrue(conflater.add_update())
+        conflater.mark_published()
+        self.assertEqual(2, conflater.conflated_count)
+
+    def test_max_pending_should_publish_latest_state(self):
+        orderbook = self.create_orderbook(conflation_max_pending=20)
+
+        async def test_runner():
+            for event in self.event_feed:
+                await self.reader.pipe.put(event)
+            await self.reader.pipe.put(Pipeline.states.CLOSING_PIPE)
+            await orderbook.consume()
+            outputs = await self.drain_writer()
+            conflater = orderbook.conflater
+            self.assertEqual(conflater.published_count, len(outputs))
+            self.assertGreater(conflater.conflated_count, conflater.published_count)
+            self.assertEqual(orderbook.output_formatter(), outputs[-1])
+
+        self.loop.run_until_complete(test_runner())
+
+    def test_min_interval_should_flush_pending_update(self):
+        orderbook = self.create_orderbook(conflation_interval=0.05)
+
+        async def test_runner():
+            consume_task = asyncio.ensure_future(orderbook.consume())
+            for event in self.event_feed[:800]:
+                await self.reader.pipe.put(event)
+            await asyncio.sleep(0.01)
+            self.assertEqual(1, len(await self.drain_writer()))
+            await asyncio.sleep(0.1)
+            outputs = await self.drain_writer()
+            self.assertEqual(1, len(outputs))
+            self.assertEqual(orderbook.output_formatter(), outputs[-1])
+            self.assertEqual(0, orderbook.conflater.pending_updates)
+            await self.reader.pipe.put(Pipeline.states.CLOSING_PIPE)
+            await consume_task
+
+        self.loop.run_until_complete(test_runner())
@@ -1,6 +1,7 @@
 import asyncio
 import json
 import unittest
+from decimal import Decimal
 from pathlib import Path
 
 from tenacity import retry_if_exception_type, stop_after_attempt, retry
@@ -129,6 +130,39 @@ class TestConsume(unittest.TestCase):
             self.assertEqual(unpacked_second_snapshot.cmp_bids, book_orders.cmp_bids)
         self.loop.run_until_complete(test_runner())
 
+    def test_batched_consume_should_match_unbatched_consume(self):
+        with open(TestConsume.resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as snapshot_file, \
+                open(TestConsume.resources.joinpath('btc_eur/before_2nd_snapshot_feed.txt'), 'r') as feed_file:
+            snapshot = json.loads(snapshot_file.read())
+            self.event_feed = feed_file.readlines()
+
+        async def run_consume(max_batch_size):
+            self.reader = Pipeline(asyncio.Queue())
+            self.writer = Pipeline(asyncio.Queue())
+            self.orderbook = Orderbook(self.reader, self.writer, None, 'BTC-EUR', 10, 10,
+                                       max_batch_size=max_batch_size)
+            self.orderbook.orderbook_from_snapshot(json.loads(json.dumps(snapshot)))
+            await self.setUp_run_consume()
+            outputs = []
+            while not self.writer.pipe.empty():
+                outputs.append(self.writer.pipe.get_nowait())
+            return self.orderbook, outputs
+
+        async def test_runner():
+            orderbook, outputs = await run_consume(None)
+            batched_orderbook, batched_outputs = await run_consume(64)
+            self.assertEqual(test_utils.book_as_lists(orderbook), test_utils.book_as_lists(batched_orderbook))
+            self.assertEqual(orderbook.curr_seq_num, batched_orderbook.curr_seq_num)
+            self.assertEqual(orderbook.error_count, batched_orderbook.error_count)
+            self.assertEqual(0, orderbook.batch_sizes.count)
+            # the whole feed is queued before consuming so every batch but the last one is full
+            self.assertEqual(-(-(len(self.event_feed) + 1) // 64), batched_orderbook.batch_sizes.count)
+            self.assertEqual(64, batched_orderbook.batch_sizes.max)
+            self.assertLess(len(batched_outputs), len(outputs))
+            self.assertEqual(outputs[-1], batched_outputs[-1])
+
+        self.loop.run_until_complete(test_runner())
+
     def test_simulate_ltc_usd(self):
         with open(TestConsume.resources.joinpath('ltc_usd/1st_snapshot.txt'), 'r') as first_snapshot_file, \
                 open(TestConsume.resources.joinpath('ltc_usd/2nd_snapshot.txt'), 'r') as second_snapshot_file, \
@@ -157,6 +191,51 @@ class TestConsume(unittest.TestCase):
             self.assertEqual(unpacked_second_snapshot.cmp_bids, book_orders.cmp_bids)
         self.loop.run_until_complete(test_runner())
 
+    def test_book_keeps_consuming_while_rebuilding(self):
+        self.orderbook.orderbook_from_snapshot({"sequence": 100, "bids": [["10", "1", "order_id_1"]],
+                                                "asks": [["20", "1", "order_id_2"]]})
+        self.orderbook.error_threshold = 1
+        self.orderbook.http_client = GatedHttpClientMock({"sequence": 104,
+                                                          "bids": [["10", "1", "order_id_1"],
+                                                                   ["11", "2", "order_id_3"]],
+                                                          "asks": [["20", "1", "order_id_2"]]})
+        events = [
+            {"type": "match", "maker_order_id": "order_id_9", "side": "buy", "size": "1", "price": "10",
+             "sequence": 102},
+            {"type": "open", "side": "buy", "price": "11", "order_id": "order_id_3", "remaining_size": "2",
+             "sequence": 103},
+            {"type": "open", "side": "sell", "price": "19", "order_id": "order_id_4", "remaining_size": "1",
+             "sequence": 105}
+        ]
+
+        async def test_runner():
+            with self.assertLogs(level='WARNING'):
+                consume_task = asyncio.ensure_future(self.orderbook.consume())
+                await self.reader.pipe.put(events[0])
+                await self.reader.pipe.put(events[1])
+                await asyncio.sleep(0.01)
+                self.assertIsNotNone(self.orderbook.rebuild_task)
+                self.assertEqual(1, self.writer.pipe.qsize())
+                self.assertIn(11.0, self.orderbook.order_sides.get(OrderSides.BID))
+
+                self.orderbook.http_client.release.set()
+                await asyncio.sleep(0.01)
+                self.assertIsNone(self.orderbook.rebuild_task)
+                self.assertEqual(1, self.orderbook.rebuild_count)
+                self.assertEqual(104, self.orderbook.curr_seq_num)
+                self.assertEqual(0, self.orderbook.error_count)
+                self.assertEqual(2, self.writer.pipe.qsize())
+
+                await self.reader.pipe.put(events[2])
+                await self.reader.pipe.put(Pipeline.states.CLOSING_PIPE)
+                await consume_task
+            self.assertEqual([10.0, 11.0], list(self.orderbook.order_sides.get(OrderSides.BID).keys()))
+            self.assertEqual([19.0, 20.0], list(self.orderbook.order_sides.get(OrderSides.ASK).keys()))
+            self.assertEqual(("19", Decimal("1")),
+                             test_utils.get_price_and_size(self.orderbook.get_order("order_id_4")))
+
+        self.loop.run_until_complete(test_runner())
+
     def test_begin_consume_happy_flow(self):
         self.orderbook.http_client = DefaultHttpClientMock(self.default_snapshot)
 
@@ -181,13 +260,23 @@ class DefaultHttpClientMock:
     def __init__(self, resp):
         self.resp = resp
 
-    async def get_orderbook_snapshot(self, product_id, http_timeout):
+    async def get_orderbook_snapshot(self, product_id, http_timeout, price_format=None):
         await asyncio.sleep(0)
         return self.resp
 
 
+class GatedHttpClientMock:
+    def __init__(self, resp):
+        self.resp = resp
+        self.release = asyncio.Event()
+
+    async def get_orderbook_snapshot(self, product_id, http_timeout, price_format=None):
+        await self.release.wait()
+        return self.resp
+
+
 class FaultyHttpMock:
     @retry(retry=retry_if_exception_type(SnapshotHttpException),
            stop=stop_after_attempt(1))
-    async def get_orderbook_snapshot(self, product_id, http_timeout):
+    async def get_orderbook_snapshot(self, product_id, http_timeout, price_format=None):
         raise SnapshotHttpException
@@ -0,0 +1,99 @@
+import json
+import unittest
+from pathlib import Path
+
+from src.orderbook.metadata import OutputModes, FrameTypes, OrderSides
+from src.orderbook.orderbook import Orderbook
+
+
+class TestDeltas(unittest.TestCase):
+    resources = Path.cwd().joinpath('../resources')
+
+    def setUp(self):
+        self.orderbook = Orderbook(None, None, None, 'BTC-USD', 2, 10, None, OutputModes.L2_DELTA, 3)
+        self.sample = {
+            'sequence': 111,
+            "bids": [["12345.56", "50.35", "order_id_1"],
+                     ["12345.56", "100", "order_id_2"],
+                     ["14038.13", "0.0003", "order_id_3"]],
+            "asks": [["15000.00", "30.24", "order_id_4"],
+                     ["16000.00", "2.5", "order_id_5"],
+                     ["17000.00", "1", "order_id_6"]]
+        }
+        self.orderbook.orderbook_from_snapshot(self.sample)
+        self.seq_num = 111
+
+    def process(self, event):
+        self.seq_num += 1
+        event['sequence'] = self.seq_num
+        self.orderbook.process_event(event)
+        return self.orderbook.output_formatter()
+
+    def test_first_frame_should_be_full(self):
+        expected_frame = {'type': FrameTypes.FULL, 'product_id': 'BTC-USD', 'sequence': 111, 'frame_seq': 1,
+                          'bids': [['14038.13', '0.0003', 1], ['12345.56', '150.35', 2]],
+                          'asks': [['15000.00', '30.24', 1], ['16000.00', '2.5', 1]]}
+        self.assertEqual(expected_frame, self.orderbook.output_formatter())
+        self.assertIsNone(self.orderbook.output_formatter())
+
+    def test_delta_frames_only_hold_changed_levels(self):
+        self.orderbook.output_formatter()
+        frame = self.process({"type": "open", "side": "buy", "price": "12345.56", "order_id": "order_id_7",
+                              "remaining_size": "1"})
+        self.assertEqual({'type': FrameTypes.DELTA, 'product_id': 'BTC-USD', 'sequence': 112, 'frame_seq': 2,
+                          'changes': [[OrderSides.BID, '12345.56', '151.35', 3]]}, frame)
+
+        frame = self.process({"type": "done", "side": "sell", "order_id": "order_id_4", "reason": "canceled",
+                              "price": "15000.00", "remaining_size": "30.24"})
+        self.assertEqual([[OrderSides.ASK, '17000.00', '1', 1], [OrderSides.ASK, '15000.00', '0', 0]],
+                         frame['changes'])
+        self.assertEqual(3, frame['frame_seq'])
+
+    def test_full_frame_after_interval_and_on_request(self):
+        self.orderbook.output_formatter()
+        for size in ['1', '2', '3']:
+            self.assertEqual(FrameTypes.DELTA, self.process(
+                {"type": "open", "side": "buy", "price": "14038.13", "order_id": "new_order_id_" + size,
+                 "remaining_size": size})['type'])
+        frame = self.process({"type": "open", "side": "buy", "price": "14038.13", "order_id": "order_id_8",
+                              "remaining_size": "1"})
+        self.assertEqual(FrameTypes.FULL, frame['type'])
+        self.assertEqual(5, frame['frame_seq'])
+
+        self.orderbook.request_full_frame()
+        self.assertEqual(FrameTypes.FULL, self.orderbook.output_formatter()['type'])
+
+    def test_applying_deltas_should_rebuild_l2_book(self):
+        orderbook = Orderbook(None, None, None, 'BTC-EUR', 10, 10, None, OutputModes.L2_DELTA, 0)
+        l2_orderbook = Orderbook(None, None, None, 'BTC-EUR', 10, 10, None, OutputModes.L2)
+        with open(TestDeltas.resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as snapshot_file, \
+                open(TestDeltas.resources.joinpath('btc_eur/before_2nd_snapshot_feed.txt'), 'r') as feed_file:
+            snapshot = json.loads(snapshot_file.read())
+            events = [json.loads(line) for line in feed_file.readlines()]
+        orderbook.orderbook_from_snapshot(json.loads(json.dumps(snapshot)))
+        l2_orderbook.orderbook_from_snapshot(snapshot)
+
+        consumer_book = {}
+        last_frame_seq = 0
+        for event in events:
+            orderbook.process_event(dict(event))
+            l2_orderbook.process_event(event)
+            frame = orderbook.output_formatter()
+            if frame is None:
+                continue
+            self.assertEqual(last_frame_seq + 1, frame['frame_seq'])
+            last_frame_seq = frame['frame_seq']
+            if frame['type'] == FrameTypes.FULL:
+                consumer_book = {side: {float(price): [price, size, count] for price, size, count in frame[side]}
+                                 for side in [OrderSides.BID, OrderSides.ASK]}
+            for side, price, size, count in frame.get('changes', []):
+                if count:
+                    consumer_book[side][float(price)] = [price, size, count]
+                else:
+                    del consumer_book[side][float(price)]
+        expected_output = l2_orderbook.output_formatter()
+        self.assertEqual(expected_output[OrderSides.BID],
+                         [consumer_book[OrderSides.BID][price] for price in sorted(consumer_book[OrderSides.BID],
+                                                                                  reverse=True)])
+        self.assertEqual(expected_output[OrderSides.ASK],
+                         [consumer_book[OrderSides.ASK][price] for price in sorted(consumer_book[OrderSides.ASK])])
@@ -1,10 +1,12 @@
 import unittest
+from decimal import Decimal
 
 from sortedcontainers import SortedDict
 from src.event.metadata import EventKeys, EventSides
 from src.exceptions import EventException
 from src.orderbook.metadata import OrderSides
 from src.orderbook.orderbook import Orderbook
+from tests.unittests import test_utils
 
 
 class TestEventHandling(unittest.TestCase):
@@ -103,7 +105,7 @@ class TestEventHandling(unittest.TestCase):
         }
         self.set_and_increment_seq(TestEventHandling.open_buy_2)
         self.orderbook.process_event(TestEventHandling.open_buy_2)
-        self.assertEqual(expected_result_open_buy_2, self.orderbook.order_sides.get(OrderSides.BID))
+        self.assertEqual(expected_result_open_buy_2, test_utils.book_side_as_lists(self.orderbook, OrderSides.BID))
 
         expected_result_open_buy_1 = {
             float(TestEventHandling.open_buy_1[EventKeys.PRICE]): [create_order(TestEventHandling.open_buy_1)],
@@ -111,7 +113,7 @@ class TestEventHandling(unittest.TestCase):
         }
         self.set_and_increment_seq(TestEventHandling.open_buy_1)
         self.orderbook.process_event(TestEventHandling.open_buy_1)
-        self.assertEqual(expected_result_open_buy_1, self.orderbook.order_sides.get(OrderSides.BID))
+        self.assertEqual(expected_result_open_buy_1, test_utils.book_side_as_lists(self.orderbook, OrderSides.BID))
 
         expected_result_same_price = {
             float(TestEventHandling.open_buy_1[EventKeys.PRICE]):
@@ -121,7 +123,7 @@ class TestEventHandling(unittest.TestCase):
         }
         self.set_and_increment_seq(TestEventHandling.open_buy_3)
         self.orderbook.process_event(TestEventHandling.open_buy_3)
-        self.assertEqual(expected_result_same_price, self.orderbook.order_sides.get(OrderSides.BID))
+        self.assertEqual(expected_result_same_price, test_utils.book_side_as_lists(self.orderbook, OrderSides.BID))
 
     def test_adding_open_orders_on_both_sides_of_book(self):
         expected_result_open_buy_1 = {
@@ -129,7 +131,7 @@ class TestEventHandling(unittest.TestCase):
         }
         self.set_and_increment_seq(TestEventHandling.open_buy_1)
         self.orderbook.process_event(TestEventHandling.open_buy_1)
-        self.assertEqual(expected_result_open_buy_1, self.orderbook.order_sides.get(OrderSides.BID))
+        self.assertEqual(expected_result_open_buy_1, test_utils.book_side_as_lists(self.orderbook, OrderSides.BID))
 
         expected_result_open_sell_1 = {
             OrderSides.BID: {
@@ -143,7 +145,7 @@ class TestEventHandling(unittest.TestCase):
         }
         self.set_and_increment_seq(TestEventHandling.open_sell_1)
         self.orderbook.process_event(TestEventHandling.open_sell_1)
-        self.assertEqual(expected_result_open_sell_1, self.orderbook.order_sides)
+        self.assertEqual(expected_result_open_sell_1, test_utils.book_as_lists(self.orderbook))
 
         expected_result_open_same_sell_1 = {
             OrderSides.BID: {
@@ -158,7 +160,7 @@ class TestEventHandling(unittest.TestCase):
         }
         self.set_and_increment_seq(TestEventHandling.open_sell_2)
         self.orderbook.process_event(TestEventHandling.open_sell_2)
-        self.assertEqual(expected_result_open_same_sell_1, self.orderbook.order_sides)
+        self.assertEqual(expected_result_open_same_sell_1, test_utils.book_as_lists(self.orderbook))
 
     def test_done_events(self):
         self.set_and_increment_seq(TestEventHandling.open_sell_2)
@@ -188,7 +190,7 @@ class TestEventHandling(unittest.TestCase):
         expected_result_done_limit_2 = {
             float(TestEventHandling.open_buy_1[EventKeys.PRICE]): [create_order(TestEventHandling.open_buy_1)]
         }
-        self.assertEqual(expected_result_done_limit_2, self.orderbook.order_sides.get(OrderSides.BID))
+        self.assertEqual(expected_result_done_limit_2, test_utils.book_side_as_lists(self.orderbook, OrderSides.BID))
 
     def test_match_orders(self):
         self.set_and_increment_seq(TestEventHandling.open_buy_1)
@@ -202,7 +204,8 @@ class TestEventHandling(unittest.TestCase):
         expected_bid_book_after_match_buy_1 = {
             float(expected_bid_order[EventKeys.PRICE]): [create_order(expected_bid_order)]
         }
-        self.assertEqual(expected_bid_book_after_match_buy_1, self.orderbook.order_sides.get(OrderSides.BID))
+        self.assertEqual(expected_bid_book_after_match_buy_1,
+                         test_utils.book_side_as_lists(self.orderbook, OrderSides.BID))
 
         self.set_and_increment_seq(TestEventHandling.open_sell_1)
         self.orderbook.process_event(TestEventHandling.open_sell_1)
@@ -219,26 +222,32 @@ class TestEventHandling(unittest.TestCase):
             OrderSides.BID: expected_bid_book_after_match_buy_1,
             OrderSides.ASK: expected_bid_book_after_match_sell_1
         }
-        self.assertEqual(expected_result_match_buy_1_sell_1, self.orderbook.order_sides)
+        self.assertEqual(expected_result_match_buy_1_sell_1, test_utils.book_as_lists(self.orderbook))
+
+        # opening an order id already on the book replaces the resting order
+        self.set_and_increment_seq(TestEventHandling.open_buy_1)
+        self.orderbook.process_event(TestEventHandling.open_buy_1)
+        self.assertEqual({float(TestEventHandling.open_buy_1[EventKeys.PRICE]):
+                          [create_order(TestEventHandling.open_buy_1)]},
+                         test_utils.book_side_as_lists(self.orderbook, OrderSides.BID))
+        self.assertEqual(Decimal('100'), self.orderbook.get_order('order_id_1').level.total_size)
 
         with self.assertLogs(level='WARNING') as cm:
-            self.set_and_increment_seq(TestEventHandling.open_buy_1)
-            self.orderbook.process_event(TestEventHandling.open_buy_1)
-            self.set_and_increment_seq(TestEventHandling.match_buy_1)
-            self.orderbook.process_event(TestEventHandling.match_buy_1)
+            for _ in range(2):
+                self.set_and_increment_seq(TestEventHandling.match_buy_1)
+                self.orderbook.process_event(TestEventHandling.match_buy_1)
 
             expected_bid_order = dict(TestEventHandling.open_buy_1)
             expected_bid_order[EventKeys.REMAINING_SIZE] = '0'
 
-            expected_bid_book_after_second_buy_second_match = {
-                float(expected_bid_order[EventKeys.PRICE]):
-                    [create_order(expected_bid_order), create_order(TestEventHandling.open_buy_1)]
+            expected_bid_book_after_second_match = {
+                float(expected_bid_order[EventKeys.PRICE]): [create_order(expected_bid_order)]
             }
-            expected_result_match_after_second_buy_second_match = {
-                OrderSides.BID: expected_bid_book_after_second_buy_second_match,
+            expected_result_match_after_second_match = {
+                OrderSides.BID: expected_bid_book_after_second_match,
                 OrderSides.ASK: expected_bid_book_after_match_sell_1
             }
-            self.assertEqual(expected_result_match_after_second_buy_second_match, self.orderbook.order_sides)
+            self.assertEqual(expected_result_match_after_second_match, test_utils.book_as_lists(self.orderbook))
         self.assertTrue(cm.output[0].startswith('WARNING:root:match size larger than book size for'))
 
     def testing_all_order_types_together(self):
@@ -263,9 +272,37 @@ class TestEventHandling(unittest.TestCase):
                     create_order(TestEventHandling.open_sell_1)]
             }
         }
-        self.assertEqual(expected_result_open_sell_1, self.orderbook.order_sides)
+        self.assertEqual(expected_result_open_sell_1, test_utils.book_as_lists(self.orderbook))
         self.orderbook.process_event(TestEventHandling.done_market)
-        self.assertEqual(expected_result_open_sell_1, self.orderbook.order_sides)
+        self.assertEqual(expected_result_open_sell_1, test_utils.book_as_lists(self.orderbook))
+
+    def test_get_order_tracks_open_match_and_done(self):
+        self.assertIsNone(self.orderbook.get_order(TestEventHandling.open_buy_1[EventKeys.ORDER_ID]))
+        self.set_and_increment_seq(TestEventHandling.open_buy_1)
+        self.orderbook.process_event(TestEventHandling.open_buy_1)
+        order = self.orderbook.get_order(TestEventHandling.open_buy_1[EventKeys.ORDER_ID])
+        self.assertEqual(Decimal('100'), order.size)
+        self.assertEqual('123.45', order.level.price)
+
+        self.set_and_increment_seq(TestEventHandling.match_buy_1)
+        self.orderbook.process_event(TestEventHandling.match_buy_1)
+        self.assertEqual(Decimal('49.3'),
+                         self.orderbook.get_order(TestEventHandling.open_buy_1[EventKeys.ORDER_ID]).size)
+
+        self.set_and_increment_seq(TestEventHandling.done_limit_1)
+        self.orderbook.process_event(TestEventHandling.done_limit_1)
+        self.assertIsNone(self.orderbook.get_order(TestEventHandling.open_buy_1[EventKeys.ORDER_ID]))
+        self.assertEqual({}, self.orderbook.orders_by_id)
+
+    def test_snapshot_reload_should_reindex_orders(self):
+        self.set_and_increment_seq(TestEventHandling.open_buy_1)
+        self.orderbook.process_event(TestEventHandling.open_buy_1)
+        self.orderbook.orderbook_from_snapshot({"sequence": 10,
+                                                "bids": [["10.10", "5", "order_id_2"]],
+                                                "asks": [["555", "1", "order_id_4"]]})
+        self.assertIsNone(self.orderbook.get_order(TestEventHandling.open_buy_1[EventKeys.ORDER_ID]))
+        self.assertEqual(("10.10", Decimal("5")), test_utils.get_price_and_size(self.orderbook.get_order("order_id_2")))
+        self.assertEqual(("555", Decimal("1")), test_utils.get_price_and_size(self.orderbook.get_order("order_id_4")))
 
 
 def create_order(event):
@@ -0,0 +1,69 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.io.journal import JournalWriter, JournalReader, list_segments, read_index, read_segment
+
+
+class TestJournal(unittest.TestCase):
+    resources = Path.cwd().joinpath('../resources')
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        with open(TestJournal.resources.joinpath('btc_eur/newer_than_1st_snapshot_feed.txt'), 'r') as feed_file:
+            self.messages = [line.strip() for line in feed_file.readlines() if line.strip()][:1000]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_journal(self, messages, **kwargs):
+        journal_writer = JournalWriter(self.directory.name, **kwargs)
+        journal_writer.start()
+        for receive_time, message in enumerate(messages, 1):
+            event = json.loads(message)
+            journal_writer.record(message, event.get('product_id'), event.get('sequence'), receive_time)
+        journal_writer.close()
+        return journal_writer
+
+    def test_journal_should_read_back_every_message(self):
+        journal_writer = self.write_journal(self.messages, segment_size=32 * 1024, index_interval=50)
+        self.assertEqual(len(self.messages), journal_writer.num_records)
+        segments = list_segments(self.directory.name)
+        self.assertGreater(len(segments), 1)
+        records = list(JournalReader(self.directory.name).records())
+        self.assertEqual(self.messages, [record.message for record in records])
+        self.assertEqual(list(range(1, len(self.messages) + 1)), [record.receive_time for record in records])
+        self.assertEqual('BTC-EUR', records[0].product_id)
+
+        segment_index = read_index(segments[0])
+        product_index = segment_index['products']['BTC-EUR']
+        first_segment = list(read_segment(segments[0]))
+        self.assertEqual(first_segment[0].sequence, product_index['first_seq'])
+        self.assertEqual(first_segment[-1].sequence, product_index['last_seq'])
+        self.assertEqual(len(first_segment), product_index['count'])
+
+    def test_journal_range_should_seek_to_sequences(self):
+        self.write_journal(self.messages, segment_size=32 * 1024, index_interval=50)
+        sequences = [json.loads(message)['sequence'] for message in self.messages]
+        start_seq, end_seq = sequences[321], sequences[654]
+        events = list(JournalReader(self.directory.name).events('BTC-EUR', start_seq, end_seq))
+        self.assertEqual(sequences[321:655], [event['sequence'] for event in events])
+        self.assertEqual([], list(JournalReader(self.directory.name).events('BTC-USD')))
+
+    def test_restarted_writer_should_start_a_new_segment(self):
+        self.write_journal(self.messages[:10])
+        self.write_journal(self.messages[10:20])
+        self.assertEqual(2, len(list_segments(self.directory.name)))
+        self.assertEqual(self.messages[:20],
+                         [record.message for record in JournalReader(self.directory.name).records()])
+
+    def test_writer_should_number_segments_after_the_newest_left(self):
+        self.write_journal(self.messages[:10])
+        self.write_journal(self.messages[10:20])
+        list_segments(self.directory.name)[0].unlink()
+        self.write_journal(self.messages[20:30])
+        self.assertEqual(['journal-000001.bin', 'journal-000002.bin'],
+                         [segment_path.name for segment_path in list_segments(self.directory.name)])
+        self.assertEqual(self.messages[10:30],
+                         [record.message for record in JournalReader(self.directory.name).records()])
@@ -0,0 +1,92 @@
+import asyncio
+import io
+import time
+import unittest
+
+from src.event.metadata import EventKeys
+from src.io.dispatchers import EventDispatcher
+from src.io.io_interfaces import Pipeline
+from src.io.writers import StreamWriter, write_outputs
+from src.metrics import Histogram, LatencyHistogram, LatencyTracker, Stages
+from src.orderbook.orderbook import Orderbook
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_should_count_values_in_power_of_two_buckets(self):
+        histogram = Histogram()
+        for value in [1, 2, 3, 4, 5, 64, 65]:
+            histogram.record(value)
+        self.assertEqual({1: 1, 2: 1, 4: 2, 8: 1, 64: 1, 128: 1}, histogram.to_dict()["buckets"])
+        self.assertEqual(7, histogram.count)
+        self.assertEqual(65, histogram.max)
+        self.assertEqual(144 / 7, histogram.mean())
+
+    def test_latency_histogram_percentiles_should_be_within_its_precision(self):
+        histogram = LatencyHistogram()
+        for value in range(1, 100001):
+            histogram.record(value)
+        histogram.record(10 ** 9, 10)
+        for fraction in [0.5, 0.9, 0.99]:
+            expected = fraction * 100010
+            self.assertLessEqual(histogram.percentile(fraction), expected)
+            self.assertGreater(histogram.percentile(fraction), expected * (1 - 1 / 32))
+        self.assertEqual(10 ** 9, histogram.max)
+        self.assertGreater(histogram.percentile(1), 10 ** 9 * (1 - 1 / 32))
+        self.assertEqual(100010, histogram.to_dict()["count"])
+        self.assertEqual([0, 1, 63, 64, 64, 100, 992], [LatencyHistogram().percentile(0)] +
+                         [self.bucket_of(value) for value in [1, 63, 64, 65, 101, 1000]])
+
+    @staticmethod
+    def bucket_of(value):
+        histogram = LatencyHistogram()
+        histogram.record(value)
+        return histogram.percentile(1)
+
+    def test_tracker_should_record_every_stage_of_a_product(self):
+        latency_tracker = LatencyTracker()
+        reader = Pipeline(asyncio.Queue())
+        writer = Pipeline(asyncio.Queue())
+        dispatcher = EventDispatcher({'BTC-EUR': reader}, latency_tracker)
+        orderbook = Orderbook(reader, writer, None, 'BTC-EUR', 10, 10,
+                              latencies=latency_tracker.for_product('BTC-EUR'))
+        orderbook.orderbook_from_snapshot({"sequence": 100, "bids": [["10", "1", "order_id_1"]],
+                                           "asks": [["20", "1", "order_id_2"]]})
+        stream_writer = StreamWriter(io.BytesIO())
+        stream_writer.latency_tracker = latency_tracker
+        events = [{"type": "open", "side": "buy", "price": str(11 + sequence % 5), "remaining_size": "1",
+                   "order_id": "order_id_{}".format(sequence), "product_id": 'BTC-EUR', "sequence": sequence}
+                  for sequence in range(101, 111)]
+        events.append({"type": "done", "side": "buy", "price": "9", "reason": "canceled", "product_id": 'BTC-EUR',
+                       "sequence": 111, "order_id": "order_id_unknown"})
+
+        async def test_runner():
+            stream_writer.start()
+            write_task = asyncio.ensure_future(write_outputs(writer, stream_writer))
+            # the book is already built, so it doesn't wait for the start trigger
+            reader.state = Pipeline.states.STARTED
+            consume_task = asyncio.ensure_future(orderbook.consume())
+            for event in events:
+                event[EventKeys.RECEIVED_AT] = time.perf_counter_ns()
+                await dispatcher.dispatch(event)
+                await asyncio.sleep(0)
+            await reader.put(Pipeline.states.CLOSING_PIPE)
+            await consume_task
+            await writer.put(Pipeline.states.CLOSING_PIPE)
+            await write_task
+
+        with self.assertLogs(level='WARNING'):
+            self.loop_run(test_runner())
+        latencies = latency_tracker.to_dict()
+        product_latencies = latencies["products"]['BTC-EUR']
+        self.assertEqual(len(events), product_latencies["events"])
+        self.assertEqual(10, product_latencies["outputs"])
+        self.assertEqual(1, product_latencies["errors"])
+        self.assertEqual(0, product_latencies["rebuilds"])
+        stages = product_latencies["stages"]
+        self.assertEqual([0, len(events), len(events), len(events), 10, 10],
+                         [stages[stage]["count"] for stage in Stages.PRODUCT_STAGES])
+        self.assertLessEqual(stages[Stages.OUTPUT]["p50"], stages[Stages.TOTAL]["p50"])
+        self.assertEqual(10, latencies[Stages.WRITE]["count"])
+
+    def loop_run(self, coroutine):
+        asyncio.get_event_loop().run_until_complete(coroutine)
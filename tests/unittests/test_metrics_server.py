@@ -0,0 +1,94 @@
+import asyncio
+import io
+import unittest
+
+import aiohttp
+
+from src.io.io_interfaces import OverflowPolicies, Pipeline
+from src.io.metrics_server import MetricsServer
+from src.io.writers import StreamWriter
+from src.io.snapshot_scheduler import SnapshotMetrics
+from src.metrics import LatencyHistogram, LatencyTracker, Stages
+from src.orderbook.orderbook import Orderbook
+
+
+class StubScheduler:
+    def __init__(self):
+        self.metrics = SnapshotMetrics()
+        self.metrics.attempts = 3
+        self.metrics.retries = 1
+        self.fetch_latencies = LatencyHistogram()
+        for fetch_ns in [200 * 10 ** 6, 300 * 10 ** 6]:
+            self.fetch_latencies.record(fetch_ns)
+
+
+class TestMetricsServer(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+
+    def parse_metrics(self, text):
+        samples = {}
+        for line in text.splitlines():
+            if line and not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_metrics_should_be_served_from_the_running_books(self):
+        reader = Pipeline(asyncio.Queue(2), OverflowPolicies.REBUILD)
+        writer = Pipeline(asyncio.Queue())
+        latency_tracker = LatencyTracker()
+        orderbook = Orderbook(reader, writer, None, 'BTC-EUR', 10, 10, max_batch_size=10,
+                              latencies=latency_tracker.for_product('BTC-EUR'))
+        orderbook.orderbook_from_snapshot({"sequence": 100, "bids": [["10", "1", "order_id_1"]],
+                                           "asks": [["20", "1", "order_id_2"]]})
+        events = [{"type": "open", "side": "buy", "price": "11", "remaining_size": "1", "order_id": "order_id_3",
+                   "sequence": 101},
+                  {"type": "open", "side": "sell", "price": "19", "remaining_size": "1", "order_id": "order_id_4",
+                   "sequence": 104}]
+        output_writer = StreamWriter(io.BytesIO())
+        output_writer.num_dropped = 2
+        server = MetricsServer('127.0.0.1', 0, {'BTC-EUR': orderbook}, {'BTC-EUR': reader}, writer, StubScheduler(),
+                               latency_tracker, output_writer)
+        latency_tracker.write.record(5000)
+
+        async def test_runner():
+            await server.start()
+            consume_task = asyncio.ensure_future(orderbook.consume())
+            with self.assertLogs(level='WARNING'):
+                for event in events:
+                    await reader.put(event)
+                    await asyncio.sleep(0)
+            await reader.put(Pipeline.states.CLOSING_PIPE)
+            await consume_task
+            async with aiohttp.ClientSession() as session:
+                async with session.get('http://127.0.0.1:{}/metrics'.format(server.port)) as response:
+                    self.assertEqual(200, response.status)
+                    self.assertEqual('text/plain; version=0.0.4; charset=utf-8', response.headers['Content-Type'])
+                    text = await response.text()
+            await server.close()
+            return text
+
+        text = self.loop.run_until_complete(test_runner())
+        self.assertIn('# TYPE orderbook_events_total counter', text)
+        samples = self.parse_metrics(text)
+        self.assertEqual(2, samples['orderbook_events_total{product_id="BTC-EUR"}'])
+        self.assertEqual(2, samples['orderbook_outputs_total{product_id="BTC-EUR"}'])
+        self.assertEqual(104, samples['orderbook_last_sequence{product_id="BTC-EUR"}'])
+        self.assertEqual(1, samples['orderbook_sequence_gaps_total{product_id="BTC-EUR"}'])
+        self.assertEqual(1, samples['orderbook_errors{product_id="BTC-EUR"}'])
+        self.assertEqual(0, samples['orderbook_rebuilds_total{product_id="BTC-EUR"}'])
+        # the closing marker is taken off the pipeline in a batch of its own
+        self.assertEqual(3, samples['orderbook_batch_size_bucket{product_id="BTC-EUR",le="1"}'])
+        self.assertEqual(3, samples['orderbook_batch_size_bucket{product_id="BTC-EUR",le="+Inf"}'])
+        self.assertEqual(3, samples['orderbook_batch_size_sum{product_id="BTC-EUR"}'])
+        self.assertEqual(2, samples['orderbook_pipeline_max_size{pipeline="events",product_id="BTC-EUR"}'])
+        self.assertEqual(2, samples['orderbook_pipeline_depth{pipeline="outputs"}'])
+        self.assertEqual(2, samples['orderbook_writer_dropped_total'])
+        self.assertEqual(3, samples['orderbook_snapshot_attempts_total'])
+        self.assertEqual(2, samples['orderbook_snapshot_fetch_seconds_count'])
+        self.assertAlmostEqual(0.5, samples['orderbook_snapshot_fetch_seconds_sum'])
+        self.assertLess(abs(samples['orderbook_snapshot_fetch_seconds{quantile="0.999"}'] - 0.3), 0.3 / 32)
+        self.assertEqual(2, samples['orderbook_stage_latency_seconds_count{product_id="BTC-EUR",stage="process"}'])
+        self.assertEqual(1, samples['orderbook_stage_latency_seconds_count{stage="write"}'])
+        self.assertNotIn('stage="{}"'.format(Stages.RECEIVE), text)
@@ -0,0 +1,61 @@
+import gc
+import json
+import tracemalloc
+import unittest
+from pathlib import Path
+
+from src.orderbook.metadata import OrderSides, OrderIndexes
+from src.orderbook.orderbook import Orderbook
+from src.orderbook.price_formats import FixedPointFormat
+
+
+class TestOrderMemory(unittest.TestCase):
+    resources = Path.cwd().joinpath('../resources')
+
+    def setUp(self):
+        with open(TestOrderMemory.resources.joinpath('ltc_usd/1st_snapshot.txt'), 'r') as snapshot_file:
+            self.raw_snapshot = snapshot_file.read()
+        snapshot = json.loads(self.raw_snapshot)
+        self.num_orders = len(snapshot.get(OrderSides.BID)) + len(snapshot.get(OrderSides.ASK))
+
+    def memory_per_order(self, build_book):
+        # the snapshot is parsed inside the measurement so strings the book keeps hold of are counted
+        gc.collect()
+        tracemalloc.start()
+        try:
+            start_size, _ = tracemalloc.get_traced_memory()
+            book = build_book(json.loads(self.raw_snapshot))
+            gc.collect()
+            end_size, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertIsNotNone(book)
+        return (end_size - start_size) / self.num_orders
+
+    def test_orders_should_use_less_memory_than_nested_lists(self):
+        list_bytes = self.memory_per_order(build_nested_list_book)
+        decimal_bytes = self.memory_per_order(build_orderbook)
+        fixed_point_bytes = self.memory_per_order(
+            lambda snapshot: build_orderbook(snapshot, FixedPointFormat("0.01", "0.00000001")))
+        self.assertLess(decimal_bytes, list_bytes)
+        self.assertLess(fixed_point_bytes, decimal_bytes)
+
+
+def build_orderbook(snapshot, price_format=None):
+    orderbook = Orderbook(None, None, None, 'LTC-USD', 10, 10, price_format)
+    orderbook.orderbook_from_snapshot(snapshot)
+    return orderbook
+
+
+def build_nested_list_book(snapshot):
+    # the previous representation, each order a [price, size, order_id] list of strings in a list per level
+    # with a (side, price, order) tuple indexing every order id
+    order_sides = {}
+    order_locations = {}
+    for side in [OrderSides.BID, OrderSides.ASK]:
+        levels = order_sides[side] = {}
+        for order in snapshot.get(side):
+            price = float(order[OrderIndexes.PRICE])
+            levels.setdefault(price, []).append(order)
+            order_locations[order[OrderIndexes.ORDER_ID]] = (side, price, order)
+    return order_sides, order_locations
@@ -1,9 +1,12 @@
 import asyncio
 import json
 import unittest
+from decimal import Decimal
 
 from pathlib import Path
+from src.orderbook.metadata import OrderSides, OutputModes
 from src.orderbook.orderbook import Orderbook
+from src.orderbook.price_formats import FixedPointFormat
 
 
 class TestOrderbookOutput(unittest.TestCase):
@@ -44,6 +47,76 @@ class TestOrderbookOutput(unittest.TestCase):
         self.orderbook.orderbook_from_snapshot(self.sample)
         self.assertEqual(expected_output, self.orderbook.output_formatter())
 
+    def test_l2_output_from_sample_snapshot(self):
+        expected_output = {
+            'product_id': 'BTC-USD',
+            'sequence': 111,
+            'bids': [
+                ['14038.13', '0.0003', 1],
+                ['12345.56', '150.35', 2]
+            ],
+            'asks': [
+                ['15000.00', '229.46', 2],
+                ['16000.00', '2.5', 1]
+            ]}
+        self.orderbook.output_mode = OutputModes.L2
+        self.orderbook.orderbook_from_snapshot(self.sample)
+        self.assertEqual(expected_output, self.orderbook.output_formatter())
+
+        self.orderbook.num_output_lvls = 1
+        self.assertEqual([['14038.13', '0.0003', 1]], self.orderbook.output_formatter()['bids'])
+        self.assertEqual([['15000.00', '229.46', 2]], self.orderbook.output_formatter()['asks'])
+
+    def test_l2_output_in_fixed_point(self):
+        self.orderbook = Orderbook(None, None, None, 'BTC-USD', 10, 10, FixedPointFormat('0.01', '0.00000001'),
+                                   OutputModes.L2)
+        self.orderbook.orderbook_from_snapshot(self.sample)
+        self.assertEqual([['14038.13', '0.00030000', 1], ['12345.56', '150.35000000', 2]],
+                         self.orderbook.output_formatter()['bids'])
+
+    def test_level_aggregates_after_open_match_and_done(self):
+        self.orderbook.orderbook_from_snapshot(self.sample)
+        events = [
+            {"type": "open", "side": "sell", "price": "15000.00", "order_id": "order_id_7",
+             "remaining_size": "0.54", "sequence": 112},
+            {"type": "match", "maker_order_id": "order_id_4", "side": "sell", "size": "10.24",
+             "price": "15000.00", "sequence": 113},
+            {"type": "done", "side": "sell", "order_id": "order_id_5", "reason": "canceled",
+             "price": "15000.00", "remaining_size": "199.22", "sequence": 114},
+            {"type": "done", "side": "buy", "order_id": "order_id_3", "reason": "canceled",
+             "price": "14038.13", "remaining_size": "0.0003", "sequence": 115}
+        ]
+        for event in events:
+            self.orderbook.process_event(event)
+        level = self.orderbook.order_sides.get(OrderSides.ASK)[15000.00]
+        self.assertEqual(Decimal('20.54'), level.total_size)
+        self.assertEqual(2, len(level))
+        self.assertNotIn(14038.13, self.orderbook.order_sides.get(OrderSides.BID))
+
+    def test_level_aggregates_should_match_orders_after_feed(self):
+        with open(TestOrderbookOutput.resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as snapshot_file, \
+                open(TestOrderbookOutput.resources.joinpath('btc_eur/before_2nd_snapshot_feed.txt'), 'r') as feed_file:
+            self.orderbook.orderbook_from_snapshot(json.loads(snapshot_file.read()))
+            for line in feed_file.readlines():
+                self.orderbook.process_event(json.loads(line))
+        for side in [OrderSides.BID, OrderSides.ASK]:
+            for level in self.orderbook.order_sides.get(side).values():
+                self.assertEqual(sum(order.size for order in level), level.total_size)
+
+    def test_output_boundaries_should_follow_feed(self):
+        with open(TestOrderbookOutput.resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as snapshot_file, \
+                open(TestOrderbookOutput.resources.joinpath('btc_eur/before_2nd_snapshot_feed.txt'), 'r') as feed_file:
+            self.orderbook.orderbook_from_snapshot(json.loads(snapshot_file.read()))
+            events = [json.loads(line) for line in feed_file.readlines()]
+        for event in events:
+            self.orderbook.process_event(event)
+            self.assertEqual(self.orderbook.bid_levels[-self.orderbook.num_output_lvls - 1],
+                             self.orderbook.output_boundaries.get(OrderSides.BID))
+            self.assertEqual(self.orderbook.ask_levels[self.orderbook.num_output_lvls],
+                             self.orderbook.output_boundaries.get(OrderSides.ASK))
+        self.orderbook.num_output_lvls = len(self.orderbook.ask_levels)
+        self.assertIsNone(self.orderbook.output_boundaries.get(OrderSides.ASK))
+
     def test_there_should_be_no_output(self):
         no_data = {'product_id': 'BTC-USD', 'sequence': 111, 'bids': [], 'asks': []}
         self.orderbook.orderbook_from_snapshot(no_data)
@@ -0,0 +1,61 @@
+import json
+import unittest
+from pathlib import Path
+
+from src.io.output_codecs import BinaryCodec, BinaryDecoder, OutputFormats, create_codec, decode_outputs
+from src.orderbook.metadata import OutputModes
+from src.orderbook.orderbook import Orderbook
+
+
+class TestOutputCodecs(unittest.TestCase):
+    resources = Path.cwd().joinpath('../resources')
+
+    def book_outputs(self, product_id, output_mode, num_events=200):
+        with open(self.resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as snapshot_file, \
+                open(self.resources.joinpath('btc_eur/newer_than_1st_snapshot_feed.txt'), 'r') as feed_file:
+            snapshot = json.loads(snapshot_file.read())
+            events = [json.loads(line) for line in feed_file.readlines()[:num_events]]
+        orderbook = Orderbook(None, None, None, product_id, 10, 10, output_mode=output_mode)
+        orderbook.orderbook_from_snapshot(snapshot)
+        outputs = []
+        for event in events:
+            orderbook.process_event(event)
+            output = orderbook.output_formatter()
+            if output is not None:
+                outputs.append(output)
+        return outputs
+
+    def test_binary_codec_should_round_trip_every_output_mode(self):
+        for output_mode in [OutputModes.L3, OutputModes.L2, OutputModes.L2_DELTA]:
+            outputs = self.book_outputs('BTC-EUR', output_mode)
+            codec = create_codec(OutputFormats.BINARY)
+            data = b''.join(codec.encode(output) for output in outputs)
+            self.assertEqual(outputs, decode_outputs(data))
+            json_data = b''.join(create_codec(OutputFormats.COMPACT).encode(output) for output in outputs)
+            self.assertLess(len(data), len(json_data))
+
+    def test_binary_decoder_should_decode_interleaved_products_from_any_chunks(self):
+        outputs = [output for pair in zip(self.book_outputs('BTC-EUR', OutputModes.L2, 20),
+                                          self.book_outputs('ETH-EUR', OutputModes.L2, 20)) for output in pair]
+        codec = BinaryCodec()
+        data = b''.join(codec.encode(output) for output in outputs)
+        for chunk_size in [1, 7, 4096]:
+            decoder = BinaryDecoder()
+            decoded = []
+            for start in range(0, len(data), chunk_size):
+                decoded.extend(decoder.feed(data[start:start + chunk_size]))
+            self.assertEqual(outputs, decoded)
+            self.assertEqual(b'', decoder.buffer)
+
+        # a stream started from the codec's header decodes without the product records sent before it
+        self.assertEqual(outputs[-2:], decode_outputs(codec.header() + codec.encode(outputs[-2]) +
+                                                      codec.encode(outputs[-1])))
+        with self.assertRaises(ValueError):
+            decode_outputs(codec.encode(outputs[-1]))
+
+    def test_binary_codec_should_reject_unencodable_outputs(self):
+        codec = BinaryCodec()
+        output = {"product_id": "BTC-EUR", "sequence": 1, "bids": [["10.5", "1.25", "order_id_1"]], "asks": []}
+        with self.assertRaises(ValueError):
+            codec.encode(output)
+        self.assertEqual(b'', codec.header())
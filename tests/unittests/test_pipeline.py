@@ -0,0 +1,129 @@
+import asyncio
+import unittest
+
+from src.io.dispatchers import EventDispatcher
+from src.io.io_interfaces import OverflowPolicies, Pipeline, StaticSnapshotClient
+from src.orderbook.metadata import OrderSides
+from src.orderbook.orderbook import Orderbook
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+
+    def drain(self, pipeline):
+        items = []
+        while not pipeline.pipe.empty():
+            items.append(pipeline.pipe.get_nowait())
+        return items
+
+    def test_block_policy_should_wait_for_room(self):
+        pipeline = Pipeline(asyncio.Queue(2))
+
+        async def test_runner():
+            await pipeline.put(1)
+            await pipeline.put(2)
+            with self.assertLogs(level='WARNING'):
+                put_task = asyncio.ensure_future(pipeline.put(3))
+                await asyncio.sleep(0)
+            self.assertFalse(put_task.done())
+            self.assertEqual(1, await pipeline.pipe.get())
+            await put_task
+            self.assertEqual([2, 3], self.drain(pipeline))
+            self.assertEqual(0, pipeline.dropped)
+            self.assertEqual(2, pipeline.high_water_mark)
+
+        self.loop.run_until_complete(test_runner())
+
+    def test_drop_oldest_policy_should_drop_outputs_but_not_states(self):
+        dropped = []
+        pipeline = Pipeline(asyncio.Queue(3), OverflowPolicies.DROP_OLDEST, dropped.append)
+
+        async def test_runner():
+            with self.assertLogs(level='WARNING') as cm:
+                for output in range(6):
+                    await pipeline.put(output)
+            self.assertEqual(1, len(cm.output))
+            self.assertEqual([3, 4, 5], self.drain(pipeline))
+            self.assertEqual([0, 1, 2], dropped)
+            self.assertEqual({"depth": 0, "max_size": 3, "high_water_mark": 3, "dropped": 3, "overflows": 1},
+                             pipeline.metrics())
+
+            await pipeline.pipe.put(Pipeline.states.CLOSING_PIPE)
+            await pipeline.put(6)
+            await pipeline.put(7)
+            with self.assertLogs(level='WARNING'):
+                await pipeline.put(8)
+            self.assertEqual([Pipeline.states.CLOSING_PIPE, 7, 8], self.drain(pipeline))
+            self.assertEqual([0, 1, 2, 6], dropped)
+
+        self.loop.run_until_complete(test_runner())
+
+    def test_rebuild_policy_should_drop_queued_events(self):
+        pipeline = Pipeline(asyncio.Queue(3), OverflowPolicies.REBUILD)
+        dispatcher = EventDispatcher({'BTC-EUR': pipeline})
+
+        async def test_runner():
+            with self.assertLogs(level='WARNING'):
+                for sequence in range(1, 5):
+                    await dispatcher.dispatch({'product_id': 'BTC-EUR', 'sequence': sequence})
+            self.assertEqual([Pipeline.states.STARTED, Pipeline.states.OVERFLOWED,
+                              {'product_id': 'BTC-EUR', 'sequence': 4}], self.drain(pipeline))
+            self.assertEqual(3, pipeline.dropped)
+
+        self.loop.run_until_complete(test_runner())
+
+    def test_overflowed_book_should_rebuild(self):
+        reader = Pipeline(asyncio.Queue(2), OverflowPolicies.REBUILD)
+        writer = Pipeline(asyncio.Queue())
+        snapshot = {"sequence": 103, "bids": [["10", "1", "order_id_1"], ["11", "2", "order_id_3"]],
+                    "asks": [["20", "1", "order_id_2"]]}
+        orderbook = Orderbook(reader, writer, StaticSnapshotClient({'BTC-EUR': snapshot}), 'BTC-EUR', 10, 10)
+        orderbook.orderbook_from_snapshot({"sequence": 100, "bids": [["10", "1", "order_id_1"]],
+                                           "asks": [["20", "1", "order_id_2"]]})
+        events = [
+            {"type": "open", "side": "buy", "price": "12", "order_id": "order_id_4", "remaining_size": "1",
+             "sequence": 101},
+            {"type": "open", "side": "buy", "price": "11", "order_id": "order_id_3", "remaining_size": "2",
+             "sequence": 103},
+            {"type": "open", "side": "sell", "price": "19", "order_id": "order_id_5", "remaining_size": "1",
+             "sequence": 104}
+        ]
+
+        async def test_runner():
+            with self.assertLogs(level='WARNING'):
+                for event in events:
+                    await reader.put(event)
+                self.assertEqual(2, reader.dropped)
+                consume_task = asyncio.ensure_future(orderbook.consume())
+                await reader.put(Pipeline.states.CLOSING_PIPE)
+                await consume_task
+            self.assertEqual(1, orderbook.rebuild_count)
+            self.assertEqual(104, orderbook.curr_seq_num)
+            self.assertEqual([10.0, 11.0], list(orderbook.order_sides.get(OrderSides.BID).keys()))
+            self.assertEqual([19.0, 20.0], list(orderbook.order_sides.get(OrderSides.ASK).keys()))
+
+        self.loop.run_until_complete(test_runner())
+
+    def test_overflow_at_the_end_of_a_batch_should_still_output_the_batch(self):
+        reader = Pipeline(asyncio.Queue())
+        writer = Pipeline(asyncio.Queue())
+        snapshot = {"sequence": 103, "bids": [["10", "1", "order_id_1"]], "asks": [["20", "1", "order_id_2"]]}
+        orderbook = Orderbook(reader, writer, StaticSnapshotClient({'BTC-EUR': snapshot}), 'BTC-EUR', 10, 10,
+                              max_batch_size=10)
+        orderbook.orderbook_from_snapshot({"sequence": 100, "bids": [["10", "1", "order_id_1"]],
+                                           "asks": [["20", "1", "order_id_2"]]})
+
+        async def test_runner():
+            reader.pipe.put_nowait({"type": "open", "side": "buy", "price": "12", "order_id": "order_id_3",
+                                    "remaining_size": "1", "sequence": 101})
+            reader.pipe.put_nowait(Pipeline.states.OVERFLOWED)
+            with self.assertLogs(level='WARNING'):
+                consume_task = asyncio.ensure_future(orderbook.consume())
+                await asyncio.sleep(0.01)
+                await reader.put(Pipeline.states.CLOSING_PIPE)
+                await consume_task
+            # the batch's output comes before the rebuilt book's
+            self.assertEqual([101, 103], [output["sequence"] for output in self.drain(writer)])
+
+        self.loop.run_until_complete(test_runner())
@@ -0,0 +1,77 @@
+import json
+import unittest
+from decimal import Decimal
+from pathlib import Path
+
+from src.exceptions import EventException
+from src.orderbook.metadata import OrderSides
+from src.orderbook.orderbook import Orderbook
+from src.orderbook.price_formats import FixedPointFormat, DecimalFormat, get_price_format, \
+    to_fixed_point, from_fixed_point
+
+
+class TestPriceFormats(unittest.TestCase):
+    resources = Path.cwd().joinpath('../resources')
+
+    def setUp(self):
+        self.fixed_point = FixedPointFormat("0.01", "0.00000001")
+        self.orderbook = Orderbook(None, None, None, 'BTC-EUR', 10, 10, self.fixed_point)
+
+    def test_fixed_point_conversions(self):
+        self.assertEqual(1370794, to_fixed_point("13707.94000000", 2))
+        self.assertEqual(783100, to_fixed_point("0.007831", 8))
+        self.assertEqual(14038, to_fixed_point("14038", 0))
+        self.assertEqual("13707.94", from_fixed_point(1370794, 2))
+        self.assertEqual("0.00783100", from_fixed_point(783100, 8))
+        self.assertEqual("-0.05", from_fixed_point(-5, 2))
+        with self.assertRaises(ValueError):
+            to_fixed_point("13707.945", 2)
+
+    def test_increments_must_be_powers_of_ten(self):
+        self.assertEqual(8, FixedPointFormat("0.01", "0.00000001").size_decimals)
+        with self.assertRaises(ValueError):
+            FixedPointFormat("0.05", "0.00000001")
+
+    def test_get_price_format_from_config(self):
+        config = {"BTC-EUR": {"quote_increment": "0.01", "base_increment": "0.00000001"}}
+        self.assertIsInstance(get_price_format("BTC-EUR", config), FixedPointFormat)
+        self.assertIsInstance(get_price_format("LTC-USD", config), DecimalFormat)
+
+    def test_fixed_point_book_stores_integers(self):
+        self.orderbook.orderbook_from_snapshot({"sequence": 1,
+                                                "bids": [["100.50", "0.5", "order_id_1"]],
+                                                "asks": [["101", "2", "order_id_2"]]})
+        self.orderbook.process_event({"type": "match", "maker_order_id": "order_id_1", "side": "buy",
+                                      "size": "0.2", "price": "100.50", "sequence": 2})
+        self.assertEqual([10050], list(self.orderbook.order_sides.get(OrderSides.BID).keys()))
+        self.assertEqual(30000000, self.orderbook.get_order("order_id_1").size)
+        self.assertEqual(30000000, self.orderbook.order_sides.get(OrderSides.BID)[10050].total_size)
+        self.assertEqual(200000000, self.orderbook.get_order("order_id_2").size)
+        self.assertEqual({"product_id": "BTC-EUR", "sequence": 2,
+                          "bids": [["100.50", "0.30000000", "order_id_1"]],
+                          "asks": [["101.00", "2.00000000", "order_id_2"]]}, self.orderbook.output_formatter())
+
+    def test_off_increment_event_should_raise(self):
+        self.orderbook.orderbook_from_snapshot({"sequence": 1, "bids": [], "asks": []})
+        with self.assertRaises(EventException):
+            self.orderbook.process_event({"type": "open", "side": "buy", "price": "100.505", "order_id": "order_id_1",
+                                          "remaining_size": "1", "sequence": 2})
+
+    def test_fixed_point_book_should_match_string_book(self):
+        string_orderbook = Orderbook(None, None, None, 'BTC-EUR', 10, 10)
+        with open(TestPriceFormats.resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as snapshot_file, \
+                open(TestPriceFormats.resources.joinpath('btc_eur/before_2nd_snapshot_feed.txt'), 'r') as feed_file:
+            snapshot = json.loads(snapshot_file.read())
+            events = [json.loads(line) for line in feed_file.readlines()]
+        for orderbook in [string_orderbook, self.orderbook]:
+            orderbook.orderbook_from_snapshot(json.loads(json.dumps(snapshot)))
+            for event in events:
+                orderbook.process_event(dict(event))
+        string_output = string_orderbook.output_formatter()
+        fixed_output = self.orderbook.output_formatter()
+        for side in [OrderSides.BID, OrderSides.ASK]:
+            self.assertEqual(as_decimals(string_output[side]), as_decimals(fixed_output[side]))
+
+
+def as_decimals(orders):
+    return [[Decimal(price), Decimal(size), order_id] for price, size, order_id in orders]
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import unittest
+from pathlib import Path
+
+import aiohttp
+
+from src.io.output_codecs import BinaryDecoder
+from src.io.publisher import PublicationServer, Subscriber, merge_output
+from src.orderbook.metadata import OutputModes
+from src.orderbook.orderbook import Orderbook
+
+
+class BlockedSocket:
+    """
+    Stands in for a client's websocket, sends wait until released
+    """
+    def __init__(self):
+        self.is_released = asyncio.Event()
+        self.sent = []
+
+    async def send_str(self, data):
+        await self.is_released.wait()
+        self.sent.append(json.loads(data))
+
+
+class TestPublisher(unittest.TestCase):
+    resources = Path.cwd().joinpath('../resources')
+
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+
+    def book_outputs(self, num_events):
+        # delta frames and the l2 book they should add up to after every event
+        with open(self.resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as snapshot_file, \
+                open(self.resources.joinpath('btc_eur/newer_than_1st_snapshot_feed.txt'), 'r') as feed_file:
+            snapshot = json.loads(snapshot_file.read())
+            events = [json.loads(line) for line in feed_file.readlines()[:num_events]]
+        orderbook = Orderbook(None, None, None, 'BTC-EUR', 10, 10, output_mode=OutputModes.L2_DELTA)
+        orderbook.orderbook_from_snapshot(snapshot)
+        frames, books = [orderbook.output_formatter()], [orderbook.l2_output_formatter()]
+        for event in events:
+            orderbook.process_event(event)
+            frame = orderbook.output_formatter()
+            if frame is not None:
+                frames.append(frame)
+                books.append(orderbook.l2_output_formatter())
+        return frames, books
+
+    def test_merged_frames_should_add_up_to_the_book(self):
+        frames, books = self.book_outputs(1000)
+        merged = None
+        for frame in frames:
+            merged = merge_output(merged, frame)
+        self.assertEqual((books[-1]["bids"], books[-1]["asks"]), (merged["bids"], merged["asks"]))
+        self.assertEqual(frames[-1]["frame_seq"], merged["frame_seq"])
+
+        merged_deltas = None
+        for frame in frames[1:]:
+            merged_deltas = merge_output(merged_deltas, frame)
+        self.assertEqual(merged, merge_output(frames[0], merged_deltas))
+
+    def test_slow_subscriber_should_get_the_latest_state(self):
+        frames, books = self.book_outputs(1000)
+        socket = BlockedSocket()
+        subscriber = Subscriber(socket, 1)
+        subscriber.subscribe(['BTC-EUR'])
+
+        async def test_runner():
+            send_task = asyncio.ensure_future(subscriber.send_pending())
+            for frame in frames:
+                subscriber.publish('BTC-EUR', frame)
+                subscriber.publish('ETH-EUR', frame)
+                await asyncio.sleep(0)
+            # the first frame is stuck in the socket, everything after it is one pending output
+            self.assertEqual(1, len(subscriber.pending))
+            self.assertEqual(len(frames) - 2, subscriber.num_conflated)
+            socket.is_released.set()
+            while subscriber.pending or subscriber.num_published < 2:
+                await asyncio.sleep(0)
+            send_task.cancel()
+
+        self.loop.run_until_complete(test_runner())
+        # the full frame it was stuck on then every later delta merged into one
+        self.assertEqual(['snapshot', 'l2update'], [output["type"] for output in socket.sent])
+        book = merge_output(*socket.sent)
+        self.assertEqual((books[-1]["bids"], books[-1]["asks"]), (book["bids"], book["asks"]))
+
+    def test_server_should_publish_subscribed_products_to_each_client(self):
+        server = PublicationServer('127.0.0.1', 0)
+        books = [{"product_id": product_id, "sequence": sequence,
+                  "bids": [[str(100 - level), "1.5", 1] for level in range(10)],
+                  "asks": [[str(101 + level), "2.5", 2] for level in range(10)]}
+                 for sequence in range(1, 4) for product_id in ['BTC-EUR', 'ETH-EUR']]
+
+        async def test_runner():
+            await server.start()
+            url = 'ws://127.0.0.1:{}/ws'.format(server.port)
+            server.publish(books[:2])
+            async with aiohttp.ClientSession() as session:
+                async with session.ws_connect(url) as btc_ws, session.ws_connect(url) as eth_ws:
+                    await btc_ws.send_json({"type": "subscribe", "product_ids": ["BTC-EUR"], "depth": 2})
+                    self.assertEqual({"type": "subscriptions", "product_ids": ["BTC-EUR"], "depth": 2},
+                                     await btc_ws.receive_json(timeout=5))
+                    # a new subscriber starts from the latest book
+                    self.assertEqual(1, (await btc_ws.receive_json(timeout=5))["sequence"])
+                    await eth_ws.send_json({"type": "subscribe", "product_ids": ["ETH-EUR"], "format": "binary"})
+                    await eth_ws.receive_json(timeout=5)
+                    decoder = BinaryDecoder()
+                    self.assertEqual([books[1]], decoder.feed(await eth_ws.receive_bytes(timeout=5)))
+
+                    server.publish(books[2:4])
+                    self.assertEqual(2, (await btc_ws.receive_json(timeout=5))["sequence"])
+                    self.assertEqual([books[3]], decoder.feed(await eth_ws.receive_bytes(timeout=5)))
+                    # both books are published before either client is sent anything, each gets the latest
+                    server.publish(books[4:] + books[4:])
+                    btc_output = await btc_ws.receive_json(timeout=5)
+                    self.assertEqual(3, btc_output["sequence"])
+                    self.assertEqual([["100", "1.5", 1], ["99", "1.5", 1]], btc_output["bids"])
+                    self.assertEqual([books[5]], decoder.feed(await eth_ws.receive_bytes(timeout=5)))
+
+                    # a later subscription keeps the format and depth it does not set
+                    await eth_ws.send_json({"type": "subscribe", "product_ids": ["BTC-EUR"]})
+                    self.assertEqual(["BTC-EUR", "ETH-EUR"], (await eth_ws.receive_json(timeout=5))["product_ids"])
+                    self.assertEqual([books[4]], decoder.feed(await eth_ws.receive_bytes(timeout=5)))
+                    await btc_ws.send_json({"type": "subscribe", "product_ids": ["ETH-EUR"]})
+                    self.assertEqual(2, (await btc_ws.receive_json(timeout=5))["depth"])
+                    self.assertEqual(2, len((await btc_ws.receive_json(timeout=5))["bids"]))
+                    await btc_ws.send_json({"type": "subscribe", "product_ids": "ETH-EUR"})
+                    self.assertEqual("error", (await btc_ws.receive_json(timeout=5))["type"])
+
+                    await btc_ws.send_json({"type": "unsubscribe", "product_ids": ["BTC-EUR"]})
+                    self.assertEqual(["ETH-EUR"], (await btc_ws.receive_json(timeout=5))["product_ids"])
+                    await btc_ws.send_json({"type": "subscribe", "depth": 0})
+                    self.assertEqual("error", (await btc_ws.receive_json(timeout=5))["type"])
+                    self.assertEqual(2, len(server.subscribers))
+            await server.close()
+
+        self.loop.run_until_complete(test_runner())
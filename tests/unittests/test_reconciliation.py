@@ -0,0 +1,224 @@
+import asyncio
+import json
+import unittest
+from decimal import Decimal
+from pathlib import Path
+
+from src.exceptions import SnapshotException
+from src.io.io_interfaces import Pipeline
+from src.orderbook.metadata import OrderSides, OrderIndexes, RebuildModes
+from src.orderbook.orderbook import Orderbook
+from tests.unittests import test_utils
+
+
+class TestReconciliation(unittest.TestCase):
+    resources = Path.cwd().joinpath('../resources')
+
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.orderbook = Orderbook(None, None, None, 'BTC-USD', 2, 10)
+        self.orderbook.orderbook_from_snapshot({
+            "sequence": 100,
+            "bids": [["10", "1", "order_id_1"], ["10", "2", "order_id_2"], ["9", "1", "order_id_3"]],
+            "asks": [["20", "1", "order_id_4"], ["21", "5", "order_id_5"]]
+        })
+
+    def test_reconcile_should_apply_and_count_differences(self):
+        level_10 = self.orderbook.order_sides.get(OrderSides.BID)[10.0]
+        with self.assertLogs(level='WARNING') as cm:
+            stats = self.orderbook.reconcile_snapshot({
+                "sequence": 101,
+                "bids": [["10", "1.00", "order_id_1"], ["10", "1.5", "order_id_2"], ["8", "3", "order_id_6"]],
+                "asks": [["20", "1", "order_id_4"], ["22", "5", "order_id_5"]]
+            })
+        self.assertEqual(1, stats.phantom_orders)
+        self.assertEqual(1, stats.missing_orders)
+        self.assertEqual(1, stats.moved_orders)
+        self.assertEqual(1, stats.size_mismatches)
+        self.assertEqual({(OrderSides.BID, 10.0), (OrderSides.BID, 9.0), (OrderSides.BID, 8.0),
+                          (OrderSides.ASK, 21.0), (OrderSides.ASK, 22.0)}, stats.changed_levels)
+        self.assertTrue(cm.output[0].startswith('WARNING:root:BTC-USD reconciled against snapshot 101'))
+
+        self.assertIs(level_10, self.orderbook.order_sides.get(OrderSides.BID)[10.0])
+        self.assertEqual(Decimal('2.5'), level_10.total_size)
+        self.assertEqual([8.0, 10.0], list(self.orderbook.order_sides.get(OrderSides.BID).keys()))
+        self.assertEqual([20.0, 22.0], list(self.orderbook.order_sides.get(OrderSides.ASK).keys()))
+        self.assertIsNone(self.orderbook.get_order("order_id_3"))
+        self.assertEqual(101, self.orderbook.curr_seq_num)
+        self.assertEqual(101, self.orderbook.book_snapshot_seq_num)
+
+    def test_reconcile_identical_snapshot_should_change_nothing(self):
+        stats = self.orderbook.reconcile_snapshot({
+            "sequence": 101,
+            "bids": [["10", "1", "order_id_1"], ["10", "2", "order_id_2"], ["9", "1", "order_id_3"]],
+            "asks": [["20", "1", "order_id_4"], ["21", "5", "order_id_5"]]
+        })
+        self.assertFalse(stats.has_drift())
+        self.assertEqual(set(), stats.changed_levels)
+
+    def test_reconcile_stale_snapshot_should_raise(self):
+        with self.assertRaises(SnapshotException):
+            self.orderbook.reconcile_snapshot({"sequence": 100, "bids": [], "asks": []})
+
+    def test_reconcile_should_replay_newer_events(self):
+        events = [{"type": "open", "side": "buy", "price": "11", "order_id": "order_id_7", "remaining_size": "1",
+                   "sequence": 101},
+                  {"type": "open", "side": "sell", "price": "19", "order_id": "order_id_8", "remaining_size": "1",
+                   "sequence": 102}]
+        for event in events:
+            self.orderbook.process_event(event)
+        stats = self.orderbook.reconcile_snapshot({
+            "sequence": 101,
+            "bids": [["11", "1", "order_id_7"], ["10", "1", "order_id_1"], ["10", "2", "order_id_2"],
+                     ["9", "1", "order_id_3"]],
+            "asks": [["20", "1", "order_id_4"], ["21", "5", "order_id_5"]]
+        }, events)
+        self.assertFalse(stats.has_drift())
+        self.assertEqual(102, self.orderbook.curr_seq_num)
+        self.assertEqual(101, self.orderbook.book_snapshot_seq_num)
+
+    def test_reconcile_should_apply_newer_events_to_touched_orders_only(self):
+        events = [{"type": "match", "side": "buy", "price": "10", "maker_order_id": "order_id_2", "size": "0.5",
+                   "sequence": 102},
+                  {"type": "open", "side": "sell", "price": "19", "order_id": "order_id_8", "remaining_size": "1",
+                   "sequence": 103},
+                  {"type": "done", "side": "sell", "price": "20", "order_id": "order_id_4", "reason": "canceled",
+                   "remaining_size": "1", "sequence": 104}]
+        with self.assertLogs(level='WARNING'):
+            for event in events:
+                self.orderbook.process_event(event)
+        # as in a rebuild, which resets the error count before reconciling
+        self.orderbook.error_count = 0
+        # the live book is diffed in place, no book is rebuilt from the snapshot
+        self.orderbook.replay_onto_snapshot = None
+        # the snapshot differs from the live book on order_id_2, which the events touch, and on order_id_5
+        with self.assertLogs(level='WARNING'):
+            stats = self.orderbook.reconcile_snapshot({
+                "sequence": 101,
+                "bids": [["10", "1", "order_id_1"], ["10", "3", "order_id_2"], ["9", "1", "order_id_3"]],
+                "asks": [["20", "1", "order_id_4"], ["21", "4", "order_id_5"]]
+            }, events)
+        self.assertEqual(2, stats.size_mismatches)
+        self.assertEqual(0, stats.phantom_orders + stats.missing_orders + stats.moved_orders)
+        self.assertEqual(Decimal('2.5'), self.orderbook.get_order("order_id_2").size)
+        self.assertEqual(Decimal('4'), self.orderbook.get_order("order_id_5").size)
+        self.assertEqual(Decimal('3.5'), self.orderbook.order_sides.get(OrderSides.BID)[10.0].total_size)
+        self.assertIsNone(self.orderbook.get_order("order_id_4"))
+        self.assertIsNotNone(self.orderbook.get_order("order_id_8"))
+        self.assertEqual(104, self.orderbook.curr_seq_num)
+        self.assertEqual(101, self.orderbook.book_snapshot_seq_num)
+        self.assertEqual(0, self.orderbook.error_count)
+
+    def test_reconciled_book_should_equal_reloaded_book(self):
+        with open(TestReconciliation.resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as first_snapshot_file, \
+                open(TestReconciliation.resources.joinpath('btc_eur/2nd_snapshot.txt'), 'r') as second_snapshot_file:
+            first_snapshot = json.loads(first_snapshot_file.read())
+            second_snapshot = json.loads(second_snapshot_file.read())
+        orderbook = Orderbook(None, None, None, 'BTC-EUR', 10, 10)
+        orderbook.orderbook_from_snapshot(first_snapshot)
+        with self.assertLogs(level='WARNING'):
+            stats = orderbook.reconcile_snapshot(second_snapshot)
+        self.assertTrue(stats.has_drift())
+
+        unpacked_snapshot = test_utils.unpack_snapshot(second_snapshot)
+        self.assertEqual(unpacked_snapshot.bid_levels, orderbook.order_sides.get(OrderSides.BID).keys())
+        self.assertEqual(unpacked_snapshot.ask_levels, orderbook.order_sides.get(OrderSides.ASK).keys())
+        self.assertEqual(sorted(unpacked_snapshot.cmp_bids, key=lambda order: order[OrderIndexes.ORDER_ID]),
+                         sorted(test_utils.get_all_orders_from_book(orderbook).cmp_bids,
+                                key=lambda order: order[OrderIndexes.ORDER_ID]))
+        for side in [OrderSides.BID, OrderSides.ASK]:
+            for level in orderbook.order_sides.get(side).values():
+                self.assertEqual(sum(order.size for order in level), level.total_size)
+
+    def test_reconcile_rebuild_only_outputs_visible_changes(self):
+        reader = Pipeline(asyncio.Queue())
+        writer = Pipeline(asyncio.Queue())
+        orderbook = Orderbook(reader, writer, SnapshotMock({
+            "sequence": 102,
+            "bids": [["10", "1", "order_id_1"], ["9", "2", "order_id_2"], ["7", "1", "order_id_3"]],
+            "asks": [["20", "1", "order_id_4"], ["21", "5", "order_id_5"]]
+        }), 'BTC-USD', 1, 0, rebuild_mode=RebuildModes.RECONCILE)
+        orderbook.orderbook_from_snapshot({
+            "sequence": 100,
+            "bids": [["10", "1", "order_id_1"], ["9", "2", "order_id_2"], ["8", "1", "order_id_3"]],
+            "asks": [["20", "1", "order_id_4"], ["21", "5", "order_id_5"]]
+        })
+        orderbook.error_threshold = 0
+
+        async def test_runner():
+            with self.assertLogs(level='WARNING'):
+                await reader.pipe.put({"type": "done", "side": "buy", "order_id": "order_id_9", "reason": "canceled",
+                                       "price": "9", "sequence": 101})
+                await reader.pipe.put(Pipeline.states.CLOSING_PIPE)
+                await orderbook.consume()
+            self.assertEqual(1, orderbook.rebuild_count)
+            self.assertEqual(1, orderbook.last_reconcile_stats.moved_orders)
+            self.assertTrue(writer.pipe.empty())
+
+        self.loop.run_until_complete(test_runner())
+
+    def test_reconcile_rebuild_should_skip_malformed_and_duplicate_orders(self):
+        reader = Pipeline(asyncio.Queue())
+        orderbook = Orderbook(reader, Pipeline(asyncio.Queue()), SnapshotMock({
+            "sequence": 102,
+            "bids": [["10", "1", "order_id_1"], ["9", "abc", "order_id_2"], ["8", "1", "order_id_3"]],
+            "asks": [["20", "1", "order_id_4"], ["21", "5", "order_id_5"], ["22", "1", "order_id_1"]]
+        }), 'BTC-USD', 1, 0, rebuild_mode=RebuildModes.RECONCILE)
+        orderbook.orderbook_from_snapshot({
+            "sequence": 100,
+            "bids": [["10", "1", "order_id_1"], ["9", "2", "order_id_2"], ["8", "1", "order_id_3"]],
+            "asks": [["20", "1", "order_id_4"], ["21", "5", "order_id_5"]]
+        })
+        orderbook.error_threshold = 0
+
+        async def test_runner():
+            with self.assertLogs(level='WARNING') as cm:
+                await reader.pipe.put({"type": "done", "side": "buy", "order_id": "order_id_9", "reason": "canceled",
+                                       "price": "9", "sequence": 101})
+                await reader.pipe.put(Pipeline.states.CLOSING_PIPE)
+                await orderbook.consume()
+            self.assertTrue(any('order 1 is invalid' in line for line in cm.output))
+            self.assertTrue(any('duplicate of order id order_id_1' in line for line in cm.output))
+
+        self.loop.run_until_complete(test_runner())
+        self.assertEqual(1, orderbook.rebuild_count)
+        self.assertEqual((1, 0, 0), (orderbook.last_reconcile_stats.phantom_orders,
+                                     orderbook.last_reconcile_stats.moved_orders,
+                                     orderbook.last_reconcile_stats.missing_orders))
+        self.assertIsNone(orderbook.get_order("order_id_2"))
+        self.assertIn(orderbook.get_order("order_id_1"), list(orderbook.order_sides.get(OrderSides.BID)[10.0]))
+        self.assertEqual([20.0, 21.0], list(orderbook.order_sides.get(OrderSides.ASK).keys()))
+
+    def test_failed_reconcile_should_keep_the_live_book(self):
+        reader = Pipeline(asyncio.Queue())
+        orderbook = Orderbook(reader, Pipeline(asyncio.Queue()), SnapshotMock({"sequence": 102, "bids": [],
+                                                                               "asks": []}),
+                              'BTC-USD', 1, 0, rebuild_mode=RebuildModes.RECONCILE)
+        orderbook.orderbook_from_snapshot({"sequence": 100, "bids": [["10", "1", "order_id_1"]], "asks": []})
+        orderbook.error_threshold = 0
+
+        def reconcile_snapshot(book_snapshot, events=None):
+            raise ValueError("unexpected snapshot")
+        orderbook.reconcile_snapshot = reconcile_snapshot
+
+        async def test_runner():
+            with self.assertLogs(level='ERROR') as cm:
+                await reader.pipe.put({"type": "done", "side": "buy", "order_id": "order_id_9", "reason": "canceled",
+                                       "price": "9", "sequence": 101})
+                await reader.pipe.put(Pipeline.states.CLOSING_PIPE)
+                await orderbook.consume()
+            self.assertTrue(any('Failed to rebuild product BTC-USD' in line for line in cm.output))
+
+        self.loop.run_until_complete(test_runner())
+        self.assertEqual(0, orderbook.rebuild_count)
+        self.assertIsNotNone(orderbook.get_order("order_id_1"))
+        self.assertEqual(101, orderbook.curr_seq_num)
+
+
+class SnapshotMock:
+    def __init__(self, resp):
+        self.resp = resp
+
+    async def get_orderbook_snapshot(self, product_id, http_timeout, price_format=None):
+        await asyncio.sleep(0)
+        return self.resp
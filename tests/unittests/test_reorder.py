@@ -0,0 +1,118 @@
+import asyncio
+import json
+import random
+import unittest
+from pathlib import Path
+
+from src.io.io_interfaces import Pipeline
+from src.orderbook.orderbook import Orderbook
+from src.orderbook.reorder import ReorderBuffer
+
+
+class TestReorder(unittest.TestCase):
+    resources = Path.cwd().joinpath('../resources')
+
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.reader = Pipeline(asyncio.Queue())
+        self.writer = Pipeline(asyncio.Queue())
+        with open(TestReorder.resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as snapshot_file, \
+                open(TestReorder.resources.joinpath('btc_eur/before_2nd_snapshot_feed.txt'), 'r') as feed_file:
+            self.snapshot = json.loads(snapshot_file.read())
+            self.event_feed = [json.loads(line) for line in feed_file.readlines()]
+
+    def create_orderbook(self, reorder_max_size=None, reorder_max_wait=None, max_batch_size=None):
+        orderbook = Orderbook(self.reader, self.writer, None, 'BTC-EUR', 10, 10, max_batch_size=max_batch_size,
+                              reorder_max_size=reorder_max_size, reorder_max_wait=reorder_max_wait)
+        orderbook.orderbook_from_snapshot(self.snapshot)
+        return orderbook
+
+    def consume_feed(self, orderbook, events):
+        async def test_runner():
+            for event in events:
+                await self.reader.pipe.put(event)
+            await self.reader.pipe.put(Pipeline.states.CLOSING_PIPE)
+            await orderbook.consume()
+
+        self.loop.run_until_complete(test_runner())
+
+    def test_buffer_should_release_events_in_sequence_order(self):
+        reorder_buffer = ReorderBuffer(10, 1)
+        events = [{"sequence": seq_num} for seq_num in [1, 3, 4, 2, 6, 5]]
+        released = reorder_buffer.reorder(events, 0)
+        self.assertEqual(list(range(1, 7)), [event["sequence"] for event in released])
+        self.assertEqual((2, 0), (reorder_buffer.healed_gaps, reorder_buffer.escalated_gaps))
+        self.assertIsNone(reorder_buffer.time_left())
+
+    def test_buffer_without_max_wait_should_only_escalate_on_size(self):
+        for max_wait in [None, 0]:
+            reorder_buffer = ReorderBuffer(2, max_wait)
+            self.assertEqual([], reorder_buffer.reorder([{"sequence": 3}, {"sequence": 4}], 1))
+            self.assertIsNone(reorder_buffer.time_left())
+            released = reorder_buffer.reorder([{"sequence": 5}], 1)
+            self.assertEqual([3, 4, 5], [event["sequence"] for event in released])
+            self.assertEqual((0, 1), (reorder_buffer.healed_gaps, reorder_buffer.escalated_gaps))
+
+    def test_gap_closed_by_a_rebuild_should_not_count_as_healed(self):
+        reorder_buffer = ReorderBuffer(10, 1)
+        self.assertEqual([], reorder_buffer.reorder([{"sequence": 3}, {"sequence": 5}], 1))
+        # a rebuild moved the book to 3, 4 is still missing
+        self.assertEqual([], reorder_buffer.reorder([], 3))
+        self.assertEqual([5], list(reorder_buffer.held))
+        released = reorder_buffer.reorder([{"sequence": 4}], 3)
+        self.assertEqual([4, 5], [event["sequence"] for event in released])
+        self.assertEqual((1, 0, 1), (reorder_buffer.healed_gaps, reorder_buffer.escalated_gaps,
+                                     reorder_buffer.rebuilt_gaps))
+
+    def test_shuffled_feed_should_build_the_same_book_without_errors(self):
+        in_order_book = self.create_orderbook()
+        self.consume_feed(in_order_book, self.event_feed)
+
+        shuffled_feed = []
+        shuffler = random.Random(7)
+        for index in range(0, len(self.event_feed), 5):
+            window = self.event_feed[index:index + 5]
+            shuffler.shuffle(window)
+            shuffled_feed.extend(window)
+        orderbook = self.create_orderbook(reorder_max_size=10, reorder_max_wait=1)
+        self.consume_feed(orderbook, shuffled_feed)
+        self.assertEqual(in_order_book.l3_output_formatter(), orderbook.l3_output_formatter())
+        self.assertEqual((0, 0), (orderbook.error_count, orderbook.sequence_gaps))
+        self.assertGreater(orderbook.reorder_buffer.healed_gaps, 0)
+        self.assertEqual(0, orderbook.reorder_buffer.escalated_gaps)
+
+    def test_gap_over_max_size_should_be_escalated(self):
+        start_index = next(index for index, event in enumerate(self.event_feed)
+                           if event["sequence"] == self.snapshot["sequence"] + 1)
+        feed = self.event_feed[start_index:start_index + 20]
+        orderbook = self.create_orderbook(reorder_max_size=5, reorder_max_wait=10, max_batch_size=100)
+        with self.assertLogs(level='WARNING'):
+            self.consume_feed(orderbook, feed[:2] + feed[3:])
+        self.assertEqual(1, orderbook.reorder_buffer.escalated_gaps)
+        self.assertEqual((1, 1), (orderbook.error_count, orderbook.sequence_gaps))
+        self.assertEqual(feed[-1]["sequence"], orderbook.curr_seq_num)
+
+    def test_gap_on_quiet_feed_should_be_escalated_after_max_wait(self):
+        start_index = next(index for index, event in enumerate(self.event_feed)
+                           if event["sequence"] == self.snapshot["sequence"] + 1)
+        feed = self.event_feed[start_index:start_index + 4]
+        orderbook = self.create_orderbook(reorder_max_size=10, reorder_max_wait=0.05)
+
+        async def test_runner():
+            consume_task = asyncio.ensure_future(orderbook.consume())
+            for event in feed[:1] + feed[2:]:
+                await self.reader.pipe.put(event)
+            await asyncio.sleep(0.01)
+            self.assertEqual(feed[0]["sequence"], orderbook.curr_seq_num)
+            self.assertEqual(2, len(orderbook.reorder_buffer.held))
+            with self.assertLogs(level='WARNING'):
+                await asyncio.sleep(0.1)
+            self.assertEqual(feed[-1]["sequence"], orderbook.curr_seq_num)
+            # the missing event turning up late is stale
+            await self.reader.pipe.put(feed[1])
+            await self.reader.pipe.put(Pipeline.states.CLOSING_PIPE)
+            await consume_task
+
+        self.loop.run_until_complete(test_runner())
+        self.assertEqual((1, 0), (orderbook.reorder_buffer.escalated_gaps, orderbook.reorder_buffer.healed_gaps))
+        self.assertEqual(1, orderbook.sequence_gaps)
@@ -0,0 +1,90 @@
+import asyncio
+import io
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from src import app_config
+from src.io.io_interfaces import Pipeline
+from src.io.writers import StreamWriter
+from src.orderbook.metadata import OutputModes
+from src.orderbook.orderbook import Orderbook
+from src.replay import Pacings, replay, read_feed, get_product_id, main
+
+
+class TestReplay(unittest.TestCase):
+    resources = Path.cwd().joinpath('../resources')
+
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.feed_path = TestReplay.resources.joinpath('btc_eur/newer_than_1st_snapshot_feed.txt')
+        with open(TestReplay.resources.joinpath('btc_eur/1st_snapshot.txt'), 'r') as snapshot_file:
+            self.snapshot = json.loads(snapshot_file.read())
+
+    def test_fast_replay_should_match_consumed_book(self):
+        output_file = io.BytesIO()
+        with open(self.feed_path, 'r') as feed_file:
+            replay_stats = self.loop.run_until_complete(
+                replay(json.loads(json.dumps(self.snapshot)), read_feed(feed_file), StreamWriter(output_file),
+                       'BTC-EUR'))
+        outputs = [json.loads(line) for line in output_file.getvalue().splitlines()]
+        self.assertEqual(replay_stats.num_outputs, len(outputs))
+
+        reader = Pipeline(asyncio.Queue())
+        writer = Pipeline(asyncio.Queue())
+        orderbook = Orderbook(reader, writer, None, 'BTC-EUR', 25, 10)
+        orderbook.orderbook_from_snapshot(self.snapshot)
+
+        async def consume_feed():
+            with open(self.feed_path, 'r') as feed_file:
+                for event in read_feed(feed_file):
+                    await reader.pipe.put(event)
+            await reader.pipe.put(Pipeline.states.CLOSING_PIPE)
+            await orderbook.consume()
+
+        self.loop.run_until_complete(consume_feed())
+        self.assertEqual(writer.pipe.qsize(), len(outputs))
+        self.assertEqual(orderbook.output_formatter(), outputs[-1])
+
+    def test_replay_should_only_count_written_outputs(self):
+        # l2_delta publishes nothing when no visible level changed, those publishes are not outputs
+        output_mode, app_config.output_mode = app_config.output_mode, OutputModes.L2_DELTA
+        output_file = io.BytesIO()
+        try:
+            with open(self.feed_path, 'r') as feed_file:
+                replay_stats = self.loop.run_until_complete(
+                    replay(json.loads(json.dumps(self.snapshot)), read_feed(feed_file), StreamWriter(output_file),
+                           'BTC-EUR'))
+        finally:
+            app_config.output_mode = output_mode
+        self.assertEqual(len(output_file.getvalue().splitlines()), replay_stats.num_outputs)
+
+    def test_realtime_replay_should_follow_event_times(self):
+        events = [{"type": "open", "side": "buy", "price": "11", "order_id": "order_id_{}".format(index),
+                   "remaining_size": "1", "sequence": 101 + index, "product_id": "BTC-USD",
+                   "time": "2018-01-22T15:14:07.{}00000Z".format(index)}
+                  for index in range(3)]
+        output_file = io.BytesIO()
+        start_time = time.monotonic()
+        replay_stats = self.loop.run_until_complete(
+            replay({"sequence": 100, "bids": [], "asks": []}, events, StreamWriter(output_file), 'BTC-USD',
+                   Pacings.REALTIME, 2))
+        self.assertGreaterEqual(time.monotonic() - start_time, 0.1)
+        self.assertEqual(3, replay_stats.num_events)
+        self.assertEqual(3, len(output_file.getvalue().splitlines()))
+
+    def test_product_id_should_come_from_feed(self):
+        self.assertEqual('BTC-EUR', get_product_id(self.feed_path))
+
+    def test_replay_should_write_a_new_output_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = Path(directory).joinpath('replay.txt')
+            args = [str(TestReplay.resources.joinpath('btc_eur/1st_snapshot.txt')), str(self.feed_path),
+                    str(output_path)]
+            main(args)
+            replay_stats = main(args)
+            outputs = [json.loads(line) for line in output_path.read_text().splitlines()]
+        self.assertEqual(replay_stats.num_outputs, len(outputs))
+        self.assertEqual('BTC-EUR', outputs[0]['product_id'])
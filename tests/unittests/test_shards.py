@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+
+from src.io.io_interfaces import Pipeline
+from src.shards import ShardPool, assign_shards
+
+
+class TestShards(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.snapshots = {
+            product: {"sequence": 100,
+                      "bids": [["10", "1", "order_id_1"], ["9", "2", "order_id_2"]],
+                      "asks": [["20", "1", "order_id_3"]]}
+            for product in ['BTC-USD', 'ETH-USD', 'LTC-USD']
+        }
+
+    def test_products_should_be_spread_over_shards(self):
+        self.assertEqual([['BTC-USD', 'LTC-USD'], ['ETH-USD']], assign_shards(['BTC-USD', 'ETH-USD', 'LTC-USD'], 2))
+        self.assertEqual([['BTC-USD'], ['ETH-USD']], assign_shards(['BTC-USD', 'ETH-USD'], 4))
+        self.assertEqual([['BTC-USD', 'ETH-USD']], assign_shards(['BTC-USD', 'ETH-USD'], 0))
+
+    def test_sharded_books_should_output_every_product(self):
+        shard_pool = ShardPool(list(self.snapshots), 2, batch_size=2, snapshots=self.snapshots)
+        l2_writer = Pipeline(asyncio.Queue())
+
+        async def test_runner():
+            shard_pool.start()
+            for product in self.snapshots:
+                await shard_pool.dispatch({"type": "open", "side": "buy", "price": "11", "order_id": "order_id_4",
+                                           "remaining_size": "1", "sequence": 101, "product_id": product})
+            await shard_pool.dispatch({"type": "open", "side": "buy", "product_id": "XRP-USD"})
+            shard_pool.close()
+            await shard_pool.merge_outputs(l2_writer)
+            shard_pool.join()
+            outputs = []
+            while not l2_writer.pipe.empty():
+                outputs.append(await l2_writer.pipe.get())
+            self.assertEqual(sorted(self.snapshots), sorted(output['product_id'] for output in outputs))
+            for output in outputs:
+                self.assertEqual(101, output['sequence'])
+                self.assertEqual(["11", "1", "order_id_4"], output['bids'][0])
+
+        with self.assertLogs(level='ERROR'):
+            self.loop.run_until_complete(test_runner())
+
+    def test_merge_should_stop_when_workers_exit_without_closing(self):
+        shard_pool = ShardPool(list(self.snapshots), 2, snapshots=self.snapshots, poll_interval=0.05)
+        l2_writer = Pipeline(asyncio.Queue())
+
+        async def test_runner():
+            shard_pool.start()
+            for process in shard_pool.processes:
+                process.kill()
+            with self.assertLogs(level='ERROR') as cm:
+                await asyncio.wait_for(shard_pool.merge_outputs(l2_writer), 10)
+            self.assertEqual(['ERROR:root:2 shard workers exited without closing'], cm.output)
+            shard_pool.join()
+
+        self.loop.run_until_complete(test_runner())
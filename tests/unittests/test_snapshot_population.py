@@ -5,6 +5,7 @@ from pathlib import Path
 from sortedcontainers import SortedDict
 from src.exceptions import SnapshotException
 from src.orderbook.orderbook import Orderbook
+from tests.unittests import test_utils
 
 
 class TestSnapshot(unittest.TestCase):
@@ -41,7 +42,7 @@ class TestSnapshot(unittest.TestCase):
             14038.0: [["14038", "0.52427801", "73fe8685-c1c4-4a23-804f-f5e5e431814a"]]})
         self.orderbook.orderbook_from_snapshot(sample_snapshot)
         self.assertEqual(4865333025, self.orderbook.book_snapshot_seq_num)
-        self.assertEqual(expected_bids_result, self.orderbook.order_sides.get('bids'))
+        self.assertEqual(expected_bids_result, test_utils.book_side_as_lists(self.orderbook, 'bids'))
 
     def test_populate_snapshot_with_no_bids(self):
         sample_snapshot = {"sequence": 4865333025,
@@ -50,7 +51,7 @@ class TestSnapshot(unittest.TestCase):
         expected_bids_result = SortedDict({14038.0: [["14038", "0.52427801", "73fe8685-c1c4-4a23-804f-f5e5e431814a"]]})
         self.orderbook.orderbook_from_snapshot(sample_snapshot)
         self.assertEqual(4865333025, self.orderbook.book_snapshot_seq_num)
-        self.assertEqual(expected_bids_result, self.orderbook.order_sides.get('asks'))
+        self.assertEqual(expected_bids_result, test_utils.book_side_as_lists(self.orderbook, 'asks'))
 
     def test_populate_ordered_orders_with_empty_asks(self):
         sample_snapshot = {"sequence": 4865333025,
@@ -59,13 +60,16 @@ class TestSnapshot(unittest.TestCase):
                                ["100.50", "0.52427801", "73fe8685-c1c4-4a23-804f-f5e5e431814a"]
                            ],
                            "asks": []}
+        # the second order reuses the first order's id and is left out
         expected_bids_result = SortedDict({
-            100.50: [["100.50", "0.52427801", "73fe8685-c1c4-4a23-804f-f5e5e431814a"]],
             14038.0: [["14038", "0.52427801", "73fe8685-c1c4-4a23-804f-f5e5e431814a"]]
         })
-        self.orderbook.orderbook_from_snapshot(sample_snapshot)
+        with self.assertLogs(level='WARNING') as cm:
+            self.orderbook.orderbook_from_snapshot(sample_snapshot)
+        self.assertEqual(['WARNING:root:4865333025, bids, order 1 is a duplicate of order id '
+                          '73fe8685-c1c4-4a23-804f-f5e5e431814a'], cm.output)
         self.assertEqual(4865333025, self.orderbook.book_snapshot_seq_num)
-        self.assertEqual(expected_bids_result, self.orderbook.order_sides.get('bids'))
+        self.assertEqual(expected_bids_result, test_utils.book_side_as_lists(self.orderbook, 'bids'))
 
     def test_populate_ordered_orders_empty_bids(self):
         sample_snapshot = {"sequence": 4865333025,
@@ -74,13 +78,29 @@ class TestSnapshot(unittest.TestCase):
                                ["14038", "0.52427801", "73fe8685-c1c4-4a23-804f-f5e5e431814a"],
                                ["100.50", "0.52427801", "73fe8685-c1c4-4a23-804f-f5e5e431814a"]
                            ]}
+        # the second order reuses the first order's id and is left out
         expected_asks_result = SortedDict({
-            100.50: [["100.50", "0.52427801", "73fe8685-c1c4-4a23-804f-f5e5e431814a"]],
             14038.0: [["14038", "0.52427801", "73fe8685-c1c4-4a23-804f-f5e5e431814a"]]
         })
-        self.orderbook.orderbook_from_snapshot(sample_snapshot)
+        with self.assertLogs(level='WARNING') as cm:
+            self.orderbook.orderbook_from_snapshot(sample_snapshot)
+        self.assertEqual(['WARNING:root:4865333025, asks, order 1 is a duplicate of order id '
+                          '73fe8685-c1c4-4a23-804f-f5e5e431814a'], cm.output)
         self.assertEqual(4865333025, self.orderbook.book_snapshot_seq_num)
-        self.assertEqual(expected_asks_result, self.orderbook.order_sides.get('asks'))
+        self.assertEqual(expected_asks_result, test_utils.book_side_as_lists(self.orderbook, 'asks'))
+
+    def test_invalid_orders_should_not_leave_empty_levels(self):
+        sample_snapshot = {"sequence": 1015,
+                           "bids": [["115.50", "abc", "order_id_1"], ["114.50", "1", "order_id_2"],
+                                    ["114.50", "abc", "order_id_3"]],
+                           "asks": [["abc", "1", "order_id_4"], ["116.50", "1", "order_id_5"]]}
+        with self.assertLogs(level='WARNING') as cm:
+            self.orderbook.orderbook_from_snapshot(sample_snapshot)
+        self.assertEqual(3, len(cm.output))
+        self.assertEqual({"bids": SortedDict({114.50: [["114.50", "1", "order_id_2"]]}),
+                          "asks": SortedDict({116.50: [["116.50", "1", "order_id_5"]]})},
+                         test_utils.book_as_lists(self.orderbook))
+        self.assertEqual({"order_id_2", "order_id_5"}, set(self.orderbook.orders_by_id))
 
     def test_populate_ordered_orders(self):
         sample_snapshot = {"sequence": 1015,
@@ -105,7 +125,7 @@ class TestSnapshot(unittest.TestCase):
             })
         }
         self.orderbook.orderbook_from_snapshot(sample_snapshot)
-        self.assertEqual(expected_orderbook_result, self.orderbook.order_sides)
+        self.assertEqual(expected_orderbook_result, test_utils.book_as_lists(self.orderbook))
 
     def test_with_sample_snapshot(self):
         with open(TestSnapshot.resources_folder.joinpath('sample_snapshot.txt'), 'r') as snapshot_file:
@@ -133,12 +153,12 @@ class TestSnapshot(unittest.TestCase):
             self.assertEqual(snapshot_ask_sides, orderbook_asks_sides)
 
             orderbook_bid_orders = []
-            for orders in reversed(self.orderbook.order_sides.get('bids').values()):
-                orderbook_bid_orders.extend(orders)
+            for level in reversed(self.orderbook.order_sides.get('bids').values()):
+                orderbook_bid_orders.extend(self.orderbook.price_format.format_level(level))
 
             orderbook_ask_orders = []
-            for orders in self.orderbook.order_sides.get('asks').values():
-                orderbook_ask_orders.extend(orders)
+            for level in self.orderbook.order_sides.get('asks').values():
+                orderbook_ask_orders.extend(self.orderbook.price_format.format_level(level))
 
             self.assertEqual(len(snapshot_bids), len(orderbook_bid_orders))
             self.assertEqual(len(snapshot_asks), len(orderbook_ask_orders))
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import unittest
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+from tenacity import RetryError
+
+from src import app_config
+from src.io.io_interfaces import SnapshotHttpClient
+from src.io.snapshot_scheduler import SnapshotScheduler
+from src.orderbook.orderbook import Orderbook
+from src.orderbook.snapshot_loader import SnapshotLoader
+from tests.unittests import test_utils
+
+
+class StubSnapshotServer:
+    """
+    Serves /products/<product_id>/book on a local port, the first num_failures requests get a 500 and every
+    request takes delay seconds. Responses are body if given, otherwise an empty snapshot
+    """
+    def __init__(self, delay=0, num_failures=0, body=None):
+        self.delay = delay
+        self.num_failures = num_failures
+        self.body = body
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.runner = None
+        self.port = None
+
+    async def handle_book(self, request):
+        product_id = request.match_info['product_id']
+        self.requests.append(product_id)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if len(self.requests) <= self.num_failures:
+            return web.Response(status=500)
+        if self.body is not None:
+            return web.Response(body=self.body, content_type='application/json')
+        return web.json_response({'sequence': len(self.requests), 'product_id': product_id, 'bids': [], 'asks': []})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/products/{product_id}/book', self.handle_book)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+class TestSnapshotScheduler(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.snapshot_endpoint = app_config.http.get('snapshot_endpoint')
+
+    def tearDown(self):
+        app_config.http['snapshot_endpoint'] = self.snapshot_endpoint
+        self.loop.close()
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+    def run_against_stub(self, server, requests, price_format=None, **scheduler_kwargs):
+        async def run_requests():
+            await server.start()
+            app_config.http['snapshot_endpoint'] = 'http://127.0.0.1:{}/products/{{}}/book'.format(server.port)
+            try:
+                async with aiohttp.ClientSession() as session:
+                    scheduler = SnapshotScheduler(SnapshotHttpClient(session), **scheduler_kwargs)
+                    results = await asyncio.gather(*[scheduler.get_orderbook_snapshot(product_id, 5, price_format)
+                                                     for product_id in requests], return_exceptions=True)
+                    return scheduler, results
+            finally:
+                await server.stop()
+
+        return self.loop.run_until_complete(run_requests())
+
+    def test_requests_for_the_same_product_should_share_one_request(self):
+        server = StubSnapshotServer(delay=0.05)
+        scheduler, results = self.run_against_stub(server, ['BTC-EUR'] * 5 + ['ETH-EUR'], rate=100, burst=10)
+        self.assertEqual(['BTC-EUR', 'ETH-EUR'], sorted(server.requests))
+        self.assertTrue(all(result == results[0] for result in results[:5]))
+        self.assertEqual(4, scheduler.metrics.deduplicated)
+        self.assertEqual({}, scheduler.in_flight)
+
+    def test_books_sharing_a_streamed_snapshot_should_not_share_orders(self):
+        with open(Path.cwd().joinpath('../resources/btc_eur/1st_snapshot.txt'), 'rb') as snapshot_file:
+            body = snapshot_file.read()
+        orderbooks = [Orderbook(None, None, None, 'BTC-EUR', 10, 10) for _ in range(2)]
+        server = StubSnapshotServer(delay=0.05, body=body)
+        scheduler, results = self.run_against_stub(server, ['BTC-EUR'] * 2, orderbooks[0].price_format, rate=100)
+        self.assertEqual(1, len(server.requests))
+        self.assertIsNot(results[0], results[1])
+        self.assertEqual(list(results[0].iter_orders()), list(results[1].iter_orders()))
+        for orderbook, result in zip(orderbooks, results):
+            orderbook.orderbook_from_snapshot(result)
+        self.assertEqual(test_utils.book_as_lists(orderbooks[0]), test_utils.book_as_lists(orderbooks[1]))
+        order_id = next(iter(orderbooks[0].orders_by_id))
+        self.assertIsNot(orderbooks[0].orders_by_id[order_id], orderbooks[1].orders_by_id[order_id])
+        orderbooks[0].remove_order(order_id)
+        self.assertIsNotNone(orderbooks[1].get_order(order_id))
+
+    def test_requests_should_be_capped_and_rate_limited(self):
+        server = StubSnapshotServer(delay=0.1)
+        products = ['P{}'.format(index) for index in range(6)]
+        start = self.loop.time()
+        scheduler, results = self.run_against_stub(server, products, max_concurrent=2, rate=50, burst=1)
+        self.assertEqual(sorted(products), sorted(server.requests))
+        self.assertLessEqual(server.max_in_flight, 2)
+        self.assertEqual(2, scheduler.metrics.max_in_flight)
+        # two requests at a time of 0.1s each, and the burst only lets one go without waiting for a token
+        self.assertGreaterEqual(self.loop.time() - start, 0.3)
+        self.assertGreater(scheduler.metrics.rate_limited_secs, 0)
+
+    def test_failed_attempts_should_be_retried(self):
+        server = StubSnapshotServer(num_failures=2)
+        with self.assertLogs(level='WARNING') as cm:
+            scheduler, results = self.run_against_stub(server, ['BTC-EUR'], rate=100, backoff_base=0.01)
+        self.assertEqual(3, results[0]['sequence'])
+        self.assertEqual(2, scheduler.metrics.retries)
+        self.assertEqual(3, scheduler.metrics.attempts)
+        self.assertEqual(1, scheduler.metrics.successes)
+        self.assertEqual(2, len(cm.output))
+
+    def test_exhausted_attempts_should_raise_retry_error(self):
+        server = StubSnapshotServer(num_failures=10)
+        with self.assertLogs(level='WARNING'):
+            scheduler, results = self.run_against_stub(server, ['BTC-EUR'], rate=100, attempts=3,
+                                                       backoff_base=0.01)
+        self.assertIsInstance(results[0], RetryError)
+        self.assertEqual(3, len(server.requests))
+        self.assertEqual(1, scheduler.metrics.failures)
+
+    def test_snapshot_body_should_be_streamed_into_the_book(self):
+        with open(Path.cwd().joinpath('../resources/btc_eur/1st_snapshot.txt'), 'rb') as snapshot_file:
+            body = snapshot_file.read()
+        expected_book = Orderbook(None, None, None, 'BTC-EUR', 10, 10)
+        expected_book.orderbook_from_snapshot(json.loads(body))
+        orderbook = Orderbook(None, None, None, 'BTC-EUR', 10, 10)
+        scheduler, results = self.run_against_stub(StubSnapshotServer(body=body), ['BTC-EUR'], orderbook.price_format,
+                                                   rate=100)
+        self.assertIsInstance(results[0], SnapshotLoader)
+        orderbook.orderbook_from_snapshot(results[0])
+        self.assertEqual(expected_book.curr_seq_num, orderbook.curr_seq_num)
+        self.assertEqual(test_utils.book_as_lists(expected_book), test_utils.book_as_lists(orderbook))
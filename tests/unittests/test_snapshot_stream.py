@@ -0,0 +1,77 @@
+import asyncio
+import json
+import unittest
+from pathlib import Path
+
+from src.io.snapshot_stream import SnapshotStreamParser, load_snapshot_stream
+from src.orderbook.orderbook import Orderbook
+from src.orderbook.price_formats import FixedPointFormat
+from tests.unittests import test_utils
+
+
+async def iter_chunks(body, chunk_size):
+    for start in range(0, len(body), chunk_size):
+        yield body[start:start + chunk_size]
+
+
+class TestSnapshotStream(unittest.TestCase):
+    resources = Path.cwd().joinpath('../resources')
+
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        with open(TestSnapshotStream.resources.joinpath('btc_eur/1st_snapshot.txt'), 'rb') as snapshot_file:
+            self.body = snapshot_file.read()
+        self.snapshot = json.loads(self.body)
+
+    def load_from_dict(self, price_format=None):
+        orderbook = Orderbook(None, None, None, 'BTC-EUR', 10, 10, price_format)
+        orderbook.orderbook_from_snapshot(json.loads(self.body))
+        return orderbook
+
+    def load_from_stream(self, body, chunk_size, price_format=None):
+        orderbook = Orderbook(None, None, None, 'BTC-EUR', 10, 10, price_format)
+        snapshot_loader = self.loop.run_until_complete(load_snapshot_stream(iter_chunks(body, chunk_size),
+                                                                            orderbook.price_format))
+        orderbook.orderbook_from_snapshot(snapshot_loader)
+        return orderbook
+
+    def test_streamed_snapshot_should_equal_parsed_snapshot(self):
+        expected_book = self.load_from_dict()
+        for chunk_size in [13, 4096, len(self.body)]:
+            orderbook = self.load_from_stream(self.body, chunk_size)
+            self.assertEqual(self.snapshot['sequence'], orderbook.curr_seq_num)
+            self.assertEqual(test_utils.book_as_lists(expected_book), test_utils.book_as_lists(orderbook))
+        price_format = FixedPointFormat('0.01', '0.00000001')
+        self.assertEqual(test_utils.book_as_lists(self.load_from_dict(price_format)),
+                         test_utils.book_as_lists(self.load_from_stream(self.body, 4096, price_format)))
+
+    def test_stream_should_accept_any_key_order_and_unicode_split_across_chunks(self):
+        reordered = {'asks': self.snapshot['asks'][:50], 'auction': {'state': 'ñ', 'open': None},
+                     'bids': self.snapshot['bids'][:50], 'sequence': self.snapshot['sequence']}
+        body = json.dumps(reordered, ensure_ascii=False, indent=1).encode('utf-8')
+        orders = []
+        parser = SnapshotStreamParser(lambda side, side_orders: orders.extend((side, order) for order in side_orders))
+        for start in range(0, len(body), 3):
+            parser.feed(body[start:start + 3])
+        parser.close()
+        self.assertEqual(self.snapshot['sequence'], parser.values['sequence'])
+        self.assertEqual({'state': 'ñ', 'open': None}, parser.values['auction'])
+        self.assertEqual([('asks', order) for order in reordered['asks']] +
+                         [('bids', order) for order in reordered['bids']], orders)
+
+    def test_truncated_stream_should_raise(self):
+        parser = SnapshotStreamParser(lambda side, orders: None)
+        parser.feed(self.body[:len(self.body) // 2])
+        with self.assertRaises(ValueError):
+            parser.close()
+        parser = SnapshotStreamParser(lambda side, orders: None)
+        with self.assertRaises(ValueError):
+            parser.feed(b'["not", "a", "snapshot"]')
+
+    def test_reconcile_should_accept_a_streamed_snapshot(self):
+        orderbook = self.load_from_dict()
+        snapshot_loader = self.loop.run_until_complete(load_snapshot_stream(iter_chunks(self.body, 4096),
+                                                                            orderbook.price_format))
+        orderbook.book_snapshot_seq_num -= 1
+        reconcile_stats = orderbook.reconcile_snapshot(snapshot_loader)
+        self.assertFalse(reconcile_stats.has_drift())
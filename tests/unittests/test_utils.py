@@ -31,7 +31,9 @@ def get_all_orders_from_book(orderbook):
 
     cmp_bids = []
     orderbook_bid_orders = []
-    for orders in reversed(orderbook.order_sides.get('bids').values()):
+    format_level = orderbook.price_format.format_level
+    for level in reversed(orderbook.order_sides.get('bids').values()):
+        orders = format_level(level)
         for order in orders:
             cmp_bids.append([Decimal(order[OrderIndexes.PRICE]),
                              Decimal(order[OrderIndexes.SIZE]), order[OrderIndexes.ORDER_ID]])
@@ -39,9 +41,23 @@ def get_all_orders_from_book(orderbook):
 
     orderbook_ask_orders = []
     cmp_asks = []
-    for orders in orderbook.order_sides.get('asks').values():
+    for level in orderbook.order_sides.get('asks').values():
+        orders = format_level(level)
         for order in orders:
             cmp_asks.append([Decimal(order[OrderIndexes.PRICE]),
                              Decimal(order[OrderIndexes.SIZE]), order[OrderIndexes.ORDER_ID]])
         orderbook_ask_orders.extend(orders)
     return FullFeedFormat(orderbook_bid_orders, cmp_bids, orderbook_ask_orders, cmp_asks)
+
+
+def book_side_as_lists(orderbook, side):
+    format_level = orderbook.price_format.format_level
+    return {price_key: format_level(level) for price_key, level in orderbook.order_sides.get(side).items()}
+
+
+def book_as_lists(orderbook):
+    return {side: book_side_as_lists(orderbook, side) for side in orderbook.order_sides}
+
+
+def get_price_and_size(order):
+    return order.level.price, order.size
@@ -0,0 +1,124 @@
+import asyncio
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.io.io_interfaces import Pipeline
+from src.io.output_codecs import OutputFormats, decode_outputs
+from src.io.writers import FileWriter, StreamWriter, write_outputs
+
+
+class FailingStream(io.BytesIO):
+    """
+    Fails every write until is_failing is unset
+    """
+    def __init__(self):
+        super().__init__()
+        self.is_failing = True
+
+    def write(self, data):
+        if self.is_failing:
+            raise OSError('No space left on device')
+        return super().write(data)
+
+
+class TestWriters(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+        self.directory = tempfile.TemporaryDirectory()
+        self.outputs = [{"product_id": "BTC-EUR", "sequence": sequence, "bids": [["10.5", "1.25", 2]], "asks": []}
+                        for sequence in range(100)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_through_pipeline(self, writer):
+        pipeline = Pipeline(asyncio.Queue())
+
+        async def test_runner():
+            writer_task = asyncio.ensure_future(write_outputs(pipeline, writer))
+            for output in self.outputs:
+                await pipeline.put(output)
+                if output["sequence"] % 10 == 0:
+                    await asyncio.sleep(0)
+            await pipeline.put(Pipeline.states.CLOSING_PIPE)
+            await writer_task
+
+        writer.start()
+        self.loop.run_until_complete(test_runner())
+        self.assertIsNone(writer.thread)
+
+    def test_stream_writer_should_write_json_lines(self):
+        for output_format, separators in [(OutputFormats.JSONL, None), (OutputFormats.COMPACT, (',', ':'))]:
+            stream = io.BytesIO()
+            writer = StreamWriter(stream, output_format)
+            self.write_through_pipeline(writer)
+            lines = stream.getvalue().decode('utf-8').splitlines()
+            self.assertEqual([json.dumps(output, separators=separators) for output in self.outputs], lines)
+            self.assertEqual(len(self.outputs), writer.num_outputs)
+            self.assertLess(writer.num_writes, len(self.outputs))
+
+    def test_file_writer_should_rotate_by_size(self):
+        path = Path(self.directory.name).joinpath('output', 'output_stream.txt')
+        writer = FileWriter(path, OutputFormats.COMPACT, rotate_size=1024)
+        self.write_through_pipeline(writer)
+        self.assertGreater(len(writer.rotated_paths), 1)
+        files = writer.rotated_paths + [path]
+        self.assertEqual(sorted(files), sorted(path.parent.iterdir()))
+        lines = [line for file in files for line in file.read_text().splitlines()]
+        self.assertEqual(self.outputs, [json.loads(line) for line in lines])
+        self.assertTrue(all(1024 <= file.stat().st_size < 1024 + 100 for file in writer.rotated_paths))
+
+    def test_file_writer_should_rotate_by_age_and_append_on_restart(self):
+        path = Path(self.directory.name).joinpath('output_stream.txt')
+        writer = FileWriter(path, rotate_interval=3600)
+        self.write_through_pipeline(writer)
+        self.assertEqual([], writer.rotated_paths)
+        writer = FileWriter(path, rotate_interval=3600)
+        self.write_through_pipeline(writer)
+        self.assertEqual(2 * len(self.outputs), len(path.read_text().splitlines()))
+
+        writer = FileWriter(path, rotate_interval=0.000001)
+        self.write_through_pipeline(writer)
+        self.assertGreaterEqual(len(writer.rotated_paths), 1)
+        self.assertEqual(2 * len(self.outputs), len(writer.rotated_paths[0].read_text().splitlines()))
+
+    def test_binary_files_should_decode_on_their_own(self):
+        path = Path(self.directory.name).joinpath('output_stream.bin')
+        self.outputs = [{"product_id": product_id, "sequence": sequence, "bids": [["10.5", "1.25", 2]], "asks": []}
+                        for sequence in range(50) for product_id in ["BTC-EUR", "ETH-EUR"]]
+        writer = FileWriter(path, OutputFormats.BINARY, rotate_size=512)
+        self.write_through_pipeline(writer)
+        self.assertGreater(len(writer.rotated_paths), 1)
+        outputs = [output for file in writer.rotated_paths + [path] for output in decode_outputs(file.read_bytes())]
+        self.assertEqual(self.outputs, outputs)
+
+    def test_failed_writes_should_be_counted_as_dropped(self):
+        stream = FailingStream()
+        writer = StreamWriter(stream, OutputFormats.COMPACT)
+        writer.start()
+        with self.assertLogs(level='ERROR'):
+            writer.write_batch(self.outputs[:10])
+            while not writer.num_dropped:
+                writer.thread.join(0.01)
+        stream.is_failing = False
+        writer.write_batch(self.outputs[10:])
+        writer.close()
+        self.assertEqual(10, writer.num_dropped)
+        self.assertEqual(len(self.outputs) - 10, writer.num_outputs)
+        self.assertEqual(self.outputs[10:], [json.loads(line) for line in stream.getvalue().splitlines()])
+
+    def test_unencodable_outputs_should_be_counted_as_dropped(self):
+        stream = io.BytesIO()
+        writer = StreamWriter(stream)
+        circular_output = {"product_id": "BTC-EUR"}
+        circular_output["self"] = circular_output
+        writer.start()
+        with self.assertLogs(level='ERROR'):
+            writer.write_batch(self.outputs[:5] + [circular_output] + self.outputs[5:10])
+        writer.close()
+        self.assertEqual(1, writer.num_dropped)
+        self.assertEqual(10, writer.num_outputs)
+        self.assertEqual(self.outputs[:10], [json.loads(line) for line in stream.getvalue().splitlines()])